@@ -0,0 +1,114 @@
+"""Compares the evaluator backends on an expression heavy script.
+
+    python -m benchmarks.backends [--lines N] [--repeat N]
+
+Every line is parsed once up front. The tree walker then evaluates the parsed
+trees, while the closure backend compiles them once and runs the compiled
+closures, which is how a script that runs the same statements many times uses it.
+The typed backend does the same with closures specialized for the inferred types,
+and the slots backend with variables kept in a list instead of a dict.
+"""
+
+import argparse
+import gc
+import random
+import time
+
+from pipeline import Pipeline
+from evaluator.evaluator import Evaluator
+from evaluator.closure import ClosureEvaluator
+from evaluator.typed import TypedEvaluator
+from evaluator.slots import SlotEvaluator
+
+
+def expression_script(lines, seed=0):
+    """Build a script of assignments with long mixed integer expressions."""
+    rng = random.Random(seed)
+    names = ["a", "b", "c", "d"]
+    script = [f"{name} = {rng.randint(1, 9)}" for name in names]
+    operators = ["+", "-", "*", "%", "/", "<", "==", "&&"]
+
+    for _ in range(lines):
+        parts = [rng.choice(names)]
+        for _ in range(rng.randint(4, 10)):
+            parts.append(rng.choice(operators))
+            parts.append(rng.choice(names + [str(rng.randint(1, 9))]))
+        # keep the values small and never divide by zero
+        script.append(f"{rng.choice(names)} = ({' '.join(parts)}) % 7 + 1")
+
+    return script
+
+
+def best_of(repeat, function):
+    # like timeit, keep the garbage collector out of the measurements
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, default=2000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args(argv)
+
+    pipeline = Pipeline()
+    trees = [pipeline.compile(line) for line in expression_script(args.lines)]
+
+    tree = Evaluator()
+
+    def walk():
+        for node in trees:
+            tree.evaluate(node)
+
+    closure = ClosureEvaluator()
+    compiled = [closure.compile(node) for node in trees]
+
+    def run_compiled():
+        environment = closure.environment
+        for statement in compiled:
+            statement(environment)
+
+    # the script only uses ints, so every operation is specialized
+    typed = TypedEvaluator()
+    specialized = [typed.compile(node) for node in trees]
+
+    def run_specialized():
+        environment = typed.environment
+        for statement in specialized:
+            statement(environment)
+
+    slot = SlotEvaluator()
+    slotted = [slot.compile(node) for node in trees]
+
+    def run_slotted():
+        values = slot.values
+        for statement in slotted:
+            statement(values)
+
+    walk_time = best_of(args.repeat, walk)
+    closure_time = best_of(args.repeat, run_compiled)
+    typed_time = best_of(args.repeat, run_specialized)
+    slot_time = best_of(args.repeat, run_slotted)
+    compile_time = best_of(args.repeat, lambda: [closure.compile(node) for node in trees])
+
+    print(f"{len(trees)} statements, best of {args.repeat}")
+    print(f"tree walker:        {walk_time * 1000:8.2f} ms")
+    print(f"closures (run):     {closure_time * 1000:8.2f} ms  ({walk_time / closure_time:.1f}x)")
+    print(f"closures (compile): {compile_time * 1000:8.2f} ms")
+    print(f"typed (run):        {typed_time * 1000:8.2f} ms  ({walk_time / typed_time:.1f}x)")
+    print(f"slots (run):        {slot_time * 1000:8.2f} ms  ({walk_time / slot_time:.1f}x)")
+
+    if not tree.environment == closure.environment == typed.environment == slot.environment:
+        raise SystemExit("backends disagree on the final environment")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measures how much memory parsed statements take in each representation.
+
+    python -m benchmarks.memory [--lines N] [--operands N]
+
+Compares the node classes as they were before they had __slots__ (a plain
+__dict__ per instance), the slotted node classes, and FlatStatements.
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+
+from pipeline import Pipeline
+from parser.flat import flatten, unflatten
+from parser.optimizer import count_nodes
+from parser.parser import BinaryOpNode, UnaryOpNode, AssignmentNode, PrintNode
+
+
+class DictNode:
+    """Stand-in for the node classes without __slots__."""
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+def without_slots(node):
+    if isinstance(node, BinaryOpNode):
+        return DictNode(left=without_slots(node.left), op=node.op, right=without_slots(node.right))
+    if isinstance(node, UnaryOpNode):
+        return DictNode(op=node.op, node=without_slots(node.node))
+    if isinstance(node, AssignmentNode):
+        value = without_slots(node.value)
+        # the old AssignmentNode also kept an unused type(value)
+        return DictNode(variable=node.variable, value=value, type=type(value))
+    if isinstance(node, PrintNode):
+        return DictNode(value=without_slots(node.value), variable=node.variable)
+    return DictNode(**{name: getattr(node, name) for name in node.__slots__})
+
+
+def script(lines, operands, seed=0):
+    rng = random.Random(seed)
+    names = [f"v{index}" for index in range(50)]
+    script = []
+    for _ in range(lines):
+        parts = [rng.choice(names)]
+        for _ in range(operands - 1):
+            parts.append(rng.choice(["+", "-", "*", "<", "&&"]))
+            parts.append(rng.choice(names + [str(rng.randint(0, 999)), "2.5"]))
+        script.append(f"{rng.choice(names)} = {' '.join(parts)}")
+    return script
+
+
+def measure(build):
+    """Bytes allocated by build() that are still alive afterwards."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, default=2000)
+    arg_parser.add_argument("--operands", type=int, default=20)
+    args = arg_parser.parse_args(argv)
+
+    pipeline = Pipeline()
+    trees = [pipeline.compile(line) for line in script(args.lines, args.operands)]
+    nodes = sum(count_nodes(tree) for tree in trees)
+
+    flat = [flatten(tree) for tree in trees]
+
+    # every copy shares the literal values and names of the original trees,
+    # so only the nodes themselves are measured
+    sizes = {
+        "__dict__ nodes": measure(lambda: [without_slots(tree) for tree in trees]),
+        "__slots__ nodes": measure(lambda: [unflatten(statement) for statement in flat]),
+        "flat statements": measure(lambda: [flatten(tree) for tree in trees]),
+    }
+
+    print(f"{len(trees)} statements, {nodes} nodes")
+    for name, size in sizes.items():
+        print(f"{name:16} {size / 1024:10.1f} KiB  {size / nodes:6.1f} bytes/node")
+
+
+if __name__ == "__main__":
+    main()
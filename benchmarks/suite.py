@@ -0,0 +1,162 @@
+"""Times every stage of SNOL on the synthetic workloads and checks for regressions.
+
+    python -m benchmarks.suite [--lines N] [--repeat N] [--seed N] [--workload NAME]
+                               [--save FILE] [--compare FILE] [--threshold FRACTION]
+
+For every workload in benchmarks.workloads the lexer, the parser and the
+evaluator are timed on their own (each stage gets the output of the one before
+it, prepared up front), followed by the whole pipeline end to end.
+--save writes the results to a JSON baseline, and --compare checks them
+against a saved baseline and exits with status 1 if any stage got slower by
+more than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import sys
+
+from benchmarks.backends import best_of
+from benchmarks.workloads import WORKLOADS, generate
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from evaluator.evaluator import Evaluator
+from pipeline import Pipeline
+
+STAGES = ["lex", "parse", "evaluate", "end_to_end"]
+
+
+def lex_all(lexer, lines):
+    for line in lines:
+        lexer.tokenize(line)
+
+
+def parse_all(parser, tokens):
+    for line_tokens in tokens:
+        parser.parse(line_tokens)
+
+
+def evaluate_all(evaluator, trees):
+    for tree in trees:
+        try:
+            evaluator.evaluate(tree)
+        except Exception:
+            pass
+
+
+def execute_all(pipeline, lines):
+    for line in lines:
+        try:
+            pipeline.execute(line)
+        except Exception:
+            pass
+
+
+def time_workload(lines, repeat):
+    """Best time in seconds of each stage over the lines of one script."""
+    lexer = Lexer()
+    parser = PrecedenceParser()
+    tokens = [lexer.tokenize(line) for line in lines]
+    trees = [parser.parse(line_tokens) for line_tokens in tokens]
+
+    return {
+        "lex": best_of(repeat, lambda: lex_all(lexer, lines)),
+        "parse": best_of(repeat, lambda: parse_all(parser, tokens)),
+        # every run starts from empty variables, like a new script would
+        "evaluate": best_of(repeat, lambda: evaluate_all(Evaluator(), trees)),
+        "end_to_end": best_of(repeat, lambda: execute_all(Pipeline(), lines)),
+    }
+
+
+def run_suite(workloads=None, lines=2000, repeat=5, seed=0):
+    """Run the named workloads (all by default) and return the results as a
+    dict that can be saved as a baseline."""
+    results = {}
+    for name in workloads or WORKLOADS:
+        script = generate(name, lines, seed)
+        results[name] = {"lines": len(script), **time_workload(script, repeat)}
+    return {
+        "settings": {"lines": lines, "repeat": repeat, "seed": seed},
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compare results against a baseline. Returns (workload, stage, ratio)
+    for every stage that both have, where ratio is the current time divided
+    by the baseline time, and the list of those slower than 1 + threshold."""
+    rows = []
+    regressions = []
+    for name, stages in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        for stage in STAGES:
+            if stage in stages and old.get(stage):
+                row = (name, stage, stages[stage] / old[stage])
+                rows.append(row)
+                if row[2] > 1 + threshold:
+                    regressions.append(row)
+    return rows, regressions
+
+
+def print_results(results):
+    print(f"{'workload':<12}" + "".join(f"{stage:>14}" for stage in STAGES))
+    for name, stages in results["results"].items():
+        # microseconds per line reads the same whatever the number of lines
+        cells = "".join(f"{stages[stage] / stages['lines'] * 1e6:>11.2f} us" for stage in STAGES)
+        print(f"{name:<12}{cells}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, default=2000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--workload", action="append", choices=sorted(WORKLOADS), help="run only this workload, may be repeated"
+    )
+    arg_parser.add_argument("--save", metavar="FILE", help="write the results to a JSON baseline")
+    arg_parser.add_argument("--compare", metavar="FILE", help="compare the results with a JSON baseline")
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression, as a fraction (default: %(default)s)",
+    )
+    args = arg_parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    results = run_suite(args.workload, args.lines, args.repeat, args.seed)
+    print(f"time per line, best of {args.repeat}")
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"saved baseline to {args.save}")
+
+    if baseline is None:
+        return 0
+
+    if baseline["settings"] != results["settings"]:
+        print(f"warning: baseline was made with {baseline['settings']}", file=sys.stderr)
+    rows, regressions = compare(baseline, results, args.threshold)
+    print(f"\ncompared with {args.compare}")
+    for name, stage, ratio in rows:
+        flag = "  REGRESSION" if (name, stage, ratio) in regressions else ""
+        print(f"{name:<12}{stage:<12}{ratio:>7.2f}x{flag}")
+    if regressions:
+        print(f"{len(regressions)} stages are more than {args.threshold:.0%} slower", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
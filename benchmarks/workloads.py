@@ -0,0 +1,114 @@
+"""Seeded generators of synthetic SNOL scripts for the benchmarks.
+
+Every generator takes the number of lines wanted and a random.Random, and
+returns the lines of a script that starts by assigning the variables it uses.
+Values are kept small with "% 7 + 1" (or "% 7.0" for floats) so that nothing
+divides by zero or grows without bound, and the same seed always gives the
+same script.
+"""
+
+import random
+
+NAMES = ["a", "b", "c", "d", "e", "f", "g", "h"]
+ARITHMETIC = ["+", "-", "*", "/", "%"]
+COMPARISONS = ["==", "!=", "<=", ">=", "<", ">"]
+BOOLEANS = ["&&", "||"]
+
+
+def setup(rng, names=NAMES, number=None):
+    number = number or (lambda: str(rng.randint(1, 9)))
+    return [f"{name} = {number()}" for name in names]
+
+
+def operand(rng, names=NAMES):
+    if rng.random() < 0.6:
+        return rng.choice(names)
+    return str(rng.randint(1, 9))
+
+
+def arithmetic(lines, rng):
+    """Long chains of integer arithmetic."""
+    script = setup(rng)
+    for _ in range(lines):
+        parts = [operand(rng)]
+        for _ in range(rng.randint(10, 30)):
+            parts += (rng.choice(ARITHMETIC), operand(rng))
+        script.append(f"{rng.choice(NAMES)} = ({' '.join(parts)}) % 7 + 1")
+    return script
+
+
+def parentheses(lines, rng):
+    """Deeply nested parentheses and unary minus."""
+    script = setup(rng)
+    for _ in range(lines):
+        expression = operand(rng)
+        for _ in range(rng.randint(10, 40)):
+            sign = "-" if rng.random() < 0.2 else ""
+            if rng.random() < 0.5:
+                expression = f"{sign}({expression} {rng.choice(['+', '-', '*'])} {operand(rng)})"
+            else:
+                expression = f"{sign}({operand(rng)} {rng.choice(['+', '-', '*'])} {expression})"
+        script.append(f"{rng.choice(NAMES)} = ({expression}) % 7 + 1")
+    return script
+
+
+def variables(lines, rng):
+    """Many short assignments over a large set of variables."""
+    names = [f"v{i}" for i in range(200)]
+    script = setup(rng, names)
+    for _ in range(lines):
+        left, right = rng.choice(names), rng.choice(names)
+        op = rng.choice(["+", "-", "*"])
+        script.append(f"{rng.choice(names)} = ({left} {op} {right}) % 97 + 1")
+    return script
+
+
+def boolean(lines, rng):
+    """Comparisons combined with &&, || and !."""
+    script = setup(rng)
+    for _ in range(lines):
+        parts = []
+        for _ in range(rng.randint(3, 8)):
+            comparison = f"{operand(rng)} {rng.choice(COMPARISONS)} {operand(rng)}"
+            if rng.random() < 0.2:
+                comparison = f"!({comparison})"
+            parts.append(comparison)
+        expression = f" {rng.choice(BOOLEANS)} ".join(parts)
+        script.append(f"{rng.choice(NAMES)} = {expression} + {rng.randint(1, 9)}")
+    return script
+
+
+def mixed(lines, rng):
+    """Separate int and float variables, with one line in ten mixing the two,
+    which fails with a type error like it would in a real script."""
+    ints = NAMES[:4]
+    floats = NAMES[4:]
+    script = setup(rng, ints) + setup(rng, floats, lambda: f"{rng.randint(1, 9)}.{rng.randint(0, 9)}")
+
+    for _ in range(lines):
+        if rng.random() < 0.5:
+            names, literal, modulus = ints, lambda: str(rng.randint(1, 9)), "7"
+        else:
+            names, literal, modulus = floats, lambda: f"{rng.randint(1, 9)}.5", "7.0"
+        parts = [rng.choice(names)]
+        for _ in range(rng.randint(4, 12)):
+            parts += (rng.choice(["+", "-", "*"]), rng.choice(names + [literal()]))
+        if rng.random() < 0.1:
+            # mix in a value of the other type
+            parts += ("+", rng.choice(floats if names is ints else ints))
+        script.append(f"{rng.choice(names)} = ({' '.join(parts)}) % {modulus} + {literal()}")
+    return script
+
+
+WORKLOADS = {
+    "arithmetic": arithmetic,
+    "parentheses": parentheses,
+    "variables": variables,
+    "boolean": boolean,
+    "mixed": mixed,
+}
+
+
+def generate(name, lines, seed=0):
+    """The lines of the named workload for a seed."""
+    return WORKLOADS[name](lines, random.Random(seed))
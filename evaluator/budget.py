@@ -0,0 +1,118 @@
+import math
+import time
+
+from evaluator.evaluator import Evaluator
+
+# how many nodes are evaluated between two looks at the clock
+CLOCK_INTERVAL = 1024
+
+# integer operators whose result can be much larger than their operands
+SIZED_OPERATORS = frozenset(["*", "**", "%"])
+
+
+class BudgetExceeded(Exception):
+    """A statement went over one of the limits of a BudgetEvaluator."""
+
+
+class StepLimitExceeded(BudgetExceeded):
+    pass
+
+
+class SizeLimitExceeded(BudgetExceeded):
+    pass
+
+
+class TimeLimitExceeded(BudgetExceeded):
+    pass
+
+
+class BudgetEvaluator(Evaluator):
+    """Evaluator that stops statements going over a budget, for running
+    commands that can't be trusted.
+
+    - max_steps caps the nodes evaluated per statement
+    - max_int_bits caps the size of the int an operator may produce, checked
+      before *, ** and % run so that "9 ** (9 ** 9)" fails without being computed
+    - time_limit caps the seconds a statement may run for
+
+    Every limit is optional. A statement that goes over one raises the
+    matching BudgetExceeded and, like any other error, changes no variable.
+
+    Every node costs one comparison against next_check, the clock is only
+    read every CLOCK_INTERVAL nodes and the size of ints is only checked for
+    the three operators that can blow them up, so normal arithmetic runs
+    almost as fast as on Evaluator."""
+
+    def __init__(self, max_steps=None, max_int_bits=None, time_limit=None):
+        super().__init__()
+        self.max_steps = max_steps
+        self.max_int_bits = max_int_bits
+        self.time_limit = time_limit
+        self.steps = None  # nodes evaluated by the current statement, None between statements
+        self.next_check = 0
+        self.deadline = None
+
+    def evaluate(self, node):
+        steps = self.steps
+        if steps is None:
+            return self.evaluate_statement(node)
+        self.steps = steps + 1
+        if steps >= self.next_check:
+            self.check(steps)
+        # Evaluator.evaluate inlined, this runs for every node
+        method = getattr(self, f"evaluate_{type(node).__name__}", self.generic_evaluate)
+        return method(node)
+
+    def evaluate_statement(self, node):
+        self.steps = 0
+        if self.time_limit is not None:
+            self.deadline = time.perf_counter() + self.time_limit
+        self.schedule(0)
+        try:
+            return self.evaluate(node)
+        finally:
+            self.steps = None
+
+    def schedule(self, steps):
+        # the next step at which check has something to look at
+        next_check = float("inf")
+        if self.max_steps is not None:
+            next_check = self.max_steps
+        if self.time_limit is not None:
+            next_check = min(next_check, steps + CLOCK_INTERVAL)
+        self.next_check = next_check
+
+    def check(self, steps):
+        if self.max_steps is not None and steps >= self.max_steps:
+            raise StepLimitExceeded(f"Error! Statement needs more than {self.max_steps} steps!")
+        if self.time_limit is not None and time.perf_counter() > self.deadline:
+            raise TimeLimitExceeded(f"Error! Statement ran for more than {self.time_limit} seconds!")
+        self.schedule(steps)
+
+    def evaluate_BinaryOpNode(self, node):
+        left = self.evaluate(node.left)
+        right = self.evaluate(node.right)
+        op = node.op
+        if (
+            op in SIZED_OPERATORS
+            and self.max_int_bits is not None
+            and type(left) is int
+            and type(right) is int
+            and result_bits(op, left, right) > self.max_int_bits
+        ):
+            raise SizeLimitExceeded(f"Error! Result of {op} would have more than {self.max_int_bits} bits!")
+        return self.binary_operation(op, left, right)
+
+
+def result_bits(op, left, right):
+    """The bits of the int left op right (at most one more for **), found without computing it."""
+    if op == "*":
+        return left.bit_length() + right.bit_length()
+    if op == "**":
+        # a negative power is a float, and 0, 1 and -1 stay small
+        if right <= 0 or abs(left) <= 1:
+            return 1
+        # capping the exponent keeps the product a float, any limit is far below it
+        return int(min(right, 1 << 64) * math.log2(abs(left))) + 1
+    # % is never larger than its divisor
+    return right.bit_length()
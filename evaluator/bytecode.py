@@ -0,0 +1,403 @@
+"""Stack bytecode for SNOL statements.
+
+Each statement compiles to a flat tuple of (opcode, argument) pairs. Constants,
+variable names and messages are kept in tables shared by a whole Program, and
+arguments index into them. A Program can be saved to a .snolc file next to
+its script, so running the script again skips lexing and parsing.
+"""
+
+import hashlib
+import marshal
+import os
+from array import array
+
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from evaluator.providers import ConsoleInput, ConsoleOutput
+from evaluator.closure import MIXED_TYPES_ERROR
+
+### OPCODES ###
+LOAD_CONST = 0  # push consts[arg]
+LOAD_NAME = 1  # push the variable names[arg]
+STORE_NAME = 2  # store the top of the stack in names[arg], leaving it on the stack
+INPUT = 3  # pop a prompt, read a number for names[arg] and push it
+PRINT = 4  # print the top of the stack after the label consts[arg]
+RAISE = 5  # raise an Exception with the message consts[arg]
+NEGATE = 6
+NOT = 7
+# binary operators, both operands are popped and the result is pushed
+ADD = 8
+SUBTRACT = 9
+MULTIPLY = 10
+DIVIDE = 11
+MODULO = 12
+POWER = 13
+EQUAL = 14
+NOT_EQUAL = 15
+LESS_EQUAL = 16
+GREATER_EQUAL = 17
+LESS = 18
+GREATER = 19
+AND = 20
+OR = 21
+
+BINARY_OPCODES = {
+    "+": ADD,
+    "-": SUBTRACT,
+    "*": MULTIPLY,
+    "/": DIVIDE,
+    "%": MODULO,
+    "**": POWER,
+    "==": EQUAL,
+    "!=": NOT_EQUAL,
+    "<=": LESS_EQUAL,
+    ">=": GREATER_EQUAL,
+    "<": LESS,
+    ">": GREATER,
+    "&&": AND,
+    "||": OR,
+}
+UNARY_OPCODES = {"-": NEGATE, "!": NOT}
+
+# bump when the opcodes or the file layout change so old .snolc files are ignored
+FORMAT_VERSION = 2
+MAGIC = "SNOLC"
+
+# scripts are hashed and read in chunks of this many bytes
+READ_CHUNK_SIZE = 1 << 16
+
+
+class Program:
+    """A compiled script: one code tuple per statement plus the shared tables.
+
+    statements holds (line number, code) pairs, so errors can still be
+    reported against the line they came from."""
+
+    def __init__(self, consts=(), names=(), statements=(), line_count=0):
+        self.consts = list(consts)
+        self.names = list(names)
+        self.statements = list(statements)
+        self.line_count = line_count  # lines in the source, including blank ones
+
+    def dumps(self, source_hash, optimized=False):
+        # all code is packed into one array using the smallest item size that
+        # fits every opcode and argument, with a second array of where each
+        # statement ends
+        line_numbers = array("I")
+        ends = array("I")
+        code = []
+        for line_number, statement in self.statements:
+            line_numbers.append(line_number)
+            code += statement
+            ends.append(len(code))
+
+        largest = max(code, default=0)
+        typecode = "B" if largest < 1 << 8 else "H" if largest < 1 << 16 else "I"
+
+        return marshal.dumps(
+            (
+                MAGIC,
+                FORMAT_VERSION,
+                source_hash,
+                optimized,
+                tuple(self.consts),
+                tuple(self.names),
+                line_numbers.tobytes(),
+                ends.tobytes(),
+                typecode,
+                array(typecode, code).tobytes(),
+                self.line_count,
+            )
+        )
+
+    @classmethod
+    def loads(cls, data, source_hash, optimized=False):
+        """Rebuild a Program, or return None if data is stale, was compiled with
+        a different optimized setting or is not a .snolc file."""
+        try:
+            (
+                magic,
+                version,
+                stored_hash,
+                stored_optimized,
+                consts,
+                names,
+                line_numbers,
+                ends,
+                typecode,
+                code,
+                line_count,
+            ) = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        if magic != MAGIC or version != FORMAT_VERSION or stored_hash != source_hash:
+            return None
+        if stored_optimized != optimized:
+            return None
+
+        code = array(typecode, code).tolist()
+        statements = []
+        start = 0
+        for line_number, end in zip(array("I", line_numbers), array("I", ends)):
+            statements.append((line_number, tuple(code[start:end])))
+            start = end
+        return cls(consts, names, statements, line_count)
+
+
+def const_key(value):
+    # the type is part of the key so that 1 and 1.0 stay separate constants,
+    # and floats are keyed by their hex so that 0.0 and -0.0 do too
+    if isinstance(value, float):
+        return (float, value.hex())
+    return (type(value), value)
+
+
+class BytecodeCompiler:
+    """Compiles abstract syntax trees into the bytecode of a Program."""
+
+    def __init__(self, program=None):
+        self.program = program if program is not None else Program()
+        self.__consts = {}
+        self.__names = {}
+        for index, value in enumerate(self.program.consts):
+            self.__consts[const_key(value)] = index
+        for index, name in enumerate(self.program.names):
+            self.__names[name] = index
+
+    def const(self, value):
+        key = const_key(value)
+        if key not in self.__consts:
+            self.__consts[key] = len(self.program.consts)
+            self.program.consts.append(value)
+        return self.__consts[key]
+
+    def name(self, variable):
+        if variable not in self.__names:
+            self.__names[variable] = len(self.program.names)
+            self.program.names.append(variable)
+        return self.__names[variable]
+
+    def compile(self, node):
+        """Compile a statement into a tuple of code."""
+        code = []
+        self.emit(node, code)
+        return tuple(code)
+
+    def compile_error(self, error):
+        """Compile a statement that raises the error when it runs."""
+        return (RAISE, self.const(str(error)))
+
+    def emit(self, node, code):
+        method_name = f"emit_{type(node).__name__}"
+        method = getattr(self, method_name, self.generic_emit)
+        method(node, code)
+
+    def generic_emit(self, node, code):
+        code += (RAISE, self.const(f"No evaluation method defined for {type(node).__name__}"))
+
+    def emit_IntegerNode(self, node, code):
+        code += (LOAD_CONST, self.const(node.value))
+
+    def emit_FloatNode(self, node, code):
+        code += (LOAD_CONST, self.const(node.value))
+
+    def emit_VariableAccessNode(self, node, code):
+        code += (LOAD_NAME, self.name(node.variable))
+
+    def emit_AssignmentNode(self, node, code):
+        self.emit(node.value, code)
+        code += (STORE_NAME, self.name(node.variable))
+
+    def emit_BinaryOpNode(self, node, code):
+        self.emit(node.left, code)
+        self.emit(node.right, code)
+        if node.op in BINARY_OPCODES:
+            code += (BINARY_OPCODES[node.op], 0)
+        else:
+            code += (RAISE, self.const(f"Invalid binary operator: {node.op}"))
+
+    def emit_UnaryOpNode(self, node, code):
+        self.emit(node.node, code)
+        if node.op in UNARY_OPCODES:
+            code += (UNARY_OPCODES[node.op], 0)
+        else:
+            code += (RAISE, self.const(f"Invalid unary operator: {node.op}"))
+
+    def emit_InputNode(self, node, code):
+        code += (LOAD_CONST, self.const(node.prompt))
+        code += (INPUT, self.name(node.variable))
+
+    def emit_PrintNode(self, node, code):
+        self.emit(node.value, code)
+        if node.variable:
+            label = f"SNOL :> [{node.variable}] = "
+        else:
+            label = "SNOL :> "
+        code += (PRINT, self.const(label))
+
+
+class VirtualMachine:
+    """Runs bytecode against an environment.
+
+    Also works as an evaluator backend: evaluate() compiles a single tree and
+    runs it straight away."""
+
+    def __init__(self):
+        self.environment = {}  # stores variables
+        self.output = ConsoleOutput()
+        self.input = ConsoleInput()
+        self.compiler = BytecodeCompiler()
+
+    def evaluate(self, node):
+        program = self.compiler.program
+        return self.execute(self.compiler.compile(node), program.consts, program.names)
+
+    def execute(self, code, consts, names):
+        env = self.environment
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        end = len(code)
+
+        while pc < end:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                name = names[arg]
+                if name not in env:
+                    raise Exception(f"Error! [{name}] is not defined!")
+                push(env[name])
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_NAME:
+                env[names[arg]] = stack[-1]
+            elif op >= ADD:
+                b = pop()
+                a = stack[-1]
+                t = type(a)
+                if t is not type(b):
+                    raise Exception(MIXED_TYPES_ERROR)
+                if op == ADD:
+                    stack[-1] = a + b
+                elif op == SUBTRACT:
+                    stack[-1] = a - b
+                elif op == MULTIPLY:
+                    stack[-1] = a * b
+                elif op == DIVIDE:
+                    # integer division since python defaults to float division
+                    stack[-1] = a // b if t is int else a / b
+                elif op == MODULO:
+                    stack[-1] = a % b
+                elif op == POWER:
+                    stack[-1] = a**b
+                elif op == EQUAL:
+                    stack[-1] = t(a == b)
+                elif op == NOT_EQUAL:
+                    stack[-1] = t(a != b)
+                elif op == LESS_EQUAL:
+                    stack[-1] = t(a <= b)
+                elif op == GREATER_EQUAL:
+                    stack[-1] = t(a >= b)
+                elif op == LESS:
+                    stack[-1] = t(a < b)
+                elif op == GREATER:
+                    stack[-1] = t(a > b)
+                elif op == AND:
+                    stack[-1] = t(1) if a and b else t(0)
+                else:
+                    stack[-1] = t(1) if a or b else t(0)
+            elif op == NEGATE:
+                stack[-1] = -stack[-1]
+            elif op == NOT:
+                number = stack[-1]
+                stack[-1] = type(number)(number == 0)
+            elif op == PRINT:
+                self.output.write(f"{consts[arg]}{stack[-1]}")
+            elif op == INPUT:
+                value = self.input.read(pop())
+                env[names[arg]] = value
+                push(value)
+            elif op == RAISE:
+                raise Exception(consts[arg])
+            else:
+                raise Exception(f"Invalid opcode: {op}")
+
+        return stack[-1] if stack else None
+
+
+def compile_script(lines, optimizer=None):
+    """Lex, parse and compile every statement of a script.
+
+    Lines that fail to lex or parse compile to a RAISE, so the error is still
+    reported when, and only if, execution reaches that line."""
+    lexer = Lexer()
+    parser = PrecedenceParser()
+    compiler = BytecodeCompiler()
+    program = compiler.program
+
+    for line_number, line in enumerate(lines, 1):
+        program.line_count = line_number
+        line = line.strip()
+        if line == "":
+            continue
+        if line == "EXIT!":
+            break
+
+        try:
+            tree = parser.parse(lexer.tokenize(line))
+            if optimizer is not None:
+                tree = optimizer.optimize(tree)
+            code = compiler.compile(tree)
+        except Exception as e:
+            code = compiler.compile_error(e)
+        program.statements.append((line_number, code))
+
+    return program
+
+
+def cache_path(path):
+    """Where the compiled form of a script is kept, eg. loop.snol -> loop.snolc"""
+    return os.path.splitext(path)[0] + ".snolc"
+
+
+def hash_file(path):
+    """sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_program(path, optimizer=None):
+    """Load the compiled form of a script, compiling and caching it if needed.
+
+    The .snolc file stores a hash of the source it was built from, so an
+    edited script is recompiled rather than run stale, and whether it went
+    through the optimizer, so optimized and plain code are never mixed up."""
+    source_hash = hash_file(path)
+    compiled_path = cache_path(path)
+    optimized = optimizer is not None
+
+    try:
+        with open(compiled_path, "rb") as file:
+            program = Program.loads(file.read(), source_hash, optimized)
+    except OSError:
+        program = None
+    if program is not None:
+        return program
+
+    # compiled one line at a time, the source is never held in memory as a whole
+    with open(path, encoding="utf-8", buffering=READ_CHUNK_SIZE) as file:
+        program = compile_script(file, optimizer)
+    try:
+        with open(compiled_path, "wb") as file:
+            file.write(program.dumps(source_hash, optimized))
+    except OSError:
+        # the cache is only an optimization, eg. the directory may be read only
+        pass
+    return program
@@ -0,0 +1,303 @@
+from collections import OrderedDict
+
+from evaluator.providers import ConsoleInput, ConsoleOutput
+
+MIXED_TYPES_ERROR = "Error! Operands must be of the same type in an arithmetic operation!"
+
+
+class Console:
+    """The providers of a ClosureCompiler that is not given an evaluator."""
+
+    def __init__(self):
+        self.output = ConsoleOutput()
+        self.input = ConsoleInput()
+
+
+class ClosureCompiler:
+    """Compiles an abstract syntax tree into nested Python closures.
+
+    Every closure takes the environment dict and returns the value of its node.
+    The node type, the operator and the PRINT label are all looked up once at
+    compile time, so running a compiled tree again only does the arithmetic.
+    Errors are raised at run time with the same messages, and in the same
+    order, as the tree walking Evaluator.
+
+    PRINT and BEG use the output and input providers of io, usually the
+    evaluator, looked up every time they run so that replacing them also
+    affects what was compiled before."""
+
+    def __init__(self, io=None):
+        self.io = io if io is not None else Console()
+
+    def compile(self, node):
+        method_name = f"compile_{type(node).__name__}"
+        method = getattr(self, method_name, self.generic_compile)
+        return method(node)
+
+    def generic_compile(self, node):
+        # raised when the node runs rather than now, so that errors from
+        # operands evaluated before it still come first
+        message = f"No evaluation method defined for {type(node).__name__}"
+
+        def unknown(env):
+            raise Exception(message)
+
+        return unknown
+
+    ### DATA TYPES ###
+    def compile_IntegerNode(self, node):
+        value = node.value
+        return lambda env: value
+
+    def compile_FloatNode(self, node):
+        value = node.value
+        return lambda env: value
+
+    ### VARIABLES ###
+    def compile_VariableAccessNode(self, node):
+        variable = node.variable
+
+        def load(env):
+            try:
+                return env[variable]
+            except KeyError:
+                raise Exception(f"Error! [{variable}] is not defined!") from None
+
+        return load
+
+    def compile_AssignmentNode(self, node):
+        variable = node.variable
+        value = self.compile(node.value)
+
+        def assign(env):
+            result = env[variable] = value(env)
+            return result
+
+        return assign
+
+    ### OPERATIONS ###
+    def compile_BinaryOpNode(self, node):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+
+        match node.op:
+            case "+":
+                def add(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return a + b
+                return add
+            case "-":
+                def subtract(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return a - b
+                return subtract
+            case "*":
+                def multiply(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return a * b
+                return multiply
+            case "/":
+                def divide(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    # integer division since python defaults to float division
+                    if type(a) is int:
+                        return a // b
+                    return a / b
+                return divide
+            case "%":
+                def modulo(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return a % b
+                return modulo
+            case "**":
+                def power(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return a**b
+                return power
+            case "==" | "!=" | "<=" | ">=" | "<" | ">" | "&&" | "||":
+                return self.__compile_boolean(node.op, left, right)
+            case _:
+                return self.__compile_invalid(
+                    left, right, f"Invalid binary operator: {node.op}"
+                )
+
+    def __compile_boolean(self, op, left, right):
+        # comparisons and boolean operators return 1 or 0 of the left operand's
+        # type, type(a)(True) is the same as type(a)(1)
+        match op:
+            case "==":
+                def equal(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(a == b)
+                return equal
+            case "!=":
+                def not_equal(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(a != b)
+                return not_equal
+            case "<=":
+                def less_equal(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(a <= b)
+                return less_equal
+            case ">=":
+                def greater_equal(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(a >= b)
+                return greater_equal
+            case "<":
+                def less(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(a < b)
+                return less
+            case ">":
+                def greater(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(a > b)
+                return greater
+            case "&&":
+                def and_(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(1) if a and b else type(a)(0)
+                return and_
+            case "||":
+                def or_(env):
+                    a = left(env)
+                    b = right(env)
+                    if type(a) is not type(b):
+                        raise Exception(MIXED_TYPES_ERROR)
+                    return type(a)(1) if a or b else type(a)(0)
+                return or_
+
+    def __compile_invalid(self, left, right, message):
+        def invalid(env):
+            a = left(env)
+            b = right(env)
+            if type(a) is not type(b):
+                raise Exception(MIXED_TYPES_ERROR)
+            raise Exception(message)
+
+        return invalid
+
+    def compile_UnaryOpNode(self, node):
+        operand = self.compile(node.node)
+
+        match node.op:
+            case "-":
+                return lambda env: -operand(env)
+            case "!":
+                def not_(env):
+                    number = operand(env)
+                    return type(number)(number == 0)
+                return not_
+            case _:
+                message = f"Invalid unary operator: {node.op}"
+
+                def invalid(env):
+                    operand(env)
+                    raise Exception(message)
+
+                return invalid
+
+    ### INPUT/OUTPUT ###
+    def compile_InputNode(self, node):
+        variable = node.variable
+        prompt = node.prompt
+        io = self.io
+
+        def read(env):
+            value = env[variable] = io.input.read(prompt)
+            return value
+
+        return read
+
+    def compile_PrintNode(self, node):
+        value = self.compile(node.value)
+        if node.variable:
+            label = f"SNOL :> [{node.variable}] = "
+        else:
+            label = "SNOL :> "
+        io = self.io
+
+        def print_(env):
+            result = value(env)
+            io.output.write(f"{label}{result}")
+            return result
+
+        return print_
+
+
+class ClosureEvaluator:
+    """Evaluator backend that compiles each tree to closures before running it.
+
+    Has the same interface as Evaluator. Compiling costs more than walking a
+    tree once, so evaluate() keeps the closures of up to maxsize trees, and
+    lines have to come from a ParseCache (any Pipeline with a cache_size) for
+    a repeated line to find its closure. Code that runs the same tree many
+    times can also call compile() once and then call the result with
+    evaluator.environment."""
+
+    def __init__(self, maxsize=1024):
+        self.environment = {}  # stores variables
+        self.output = ConsoleOutput()
+        self.input = ConsoleInput()
+        self.compiler = ClosureCompiler(self)
+        self.maxsize = maxsize
+        self.closures = OrderedDict()  # tree -> its closure
+
+    def compile(self, node):
+        return self.compiler.compile(node)
+
+    def compiled(self, node):
+        """The closure of node, compiled the first time it is evaluated."""
+        closures = self.closures
+        closure = closures.get(node)
+        if closure is None:
+            closure = closures[node] = self.compile(node)
+            if len(closures) > self.maxsize:
+                closures.popitem(last=False)
+        else:
+            closures.move_to_end(node)
+        return closure
+
+    def evaluate(self, node):
+        return self.compiled(node)(self.environment)
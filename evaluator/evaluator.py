@@ -1,11 +1,16 @@
-import re
+from evaluator.providers import ConsoleInput, ConsoleOutput
 
 
 class Evaluator:
-    """Evaluates the abstract syntax tree generated by the parser."""
+    """Evaluates the abstract syntax tree generated by the parser.
+
+    PRINT writes to self.output and BEG reads from self.input, see
+    evaluator.providers."""
 
     def __init__(self):
         self.environment = {}  # stores variables
+        self.output = ConsoleOutput()
+        self.input = ConsoleInput()
 
     def evaluate(self, node):
         method_name = f"evaluate_{type(node).__name__}"
@@ -37,7 +42,9 @@ class Evaluator:
     def evaluate_BinaryOpNode(self, node):
         left = self.evaluate(node.left)
         right = self.evaluate(node.right)
+        return self.binary_operation(node.op, left, right)
 
+    def binary_operation(self, op, left, right):
         true = type(left)(1)
         false = type(left)(0)
 
@@ -48,7 +55,7 @@ class Evaluator:
 
         # ALGEBRAIC OPERATORS
 
-        match node.op:
+        match op:
             case "+":
               return left + right
             case "-":
@@ -81,39 +88,33 @@ class Evaluator:
             case "||":
                 return true if left or right else false
             case _:
-                raise Exception(f"Invalid binary operator: {node.op}")
+                raise Exception(f"Invalid binary operator: {op}")
 
         # //, **, <, >, <=, >=, ==, !=, ||, &&
 
     def evaluate_UnaryOpNode(self, node):
         number = self.evaluate(node.node)
+        return self.unary_operation(node.op, number)
 
-        match node.op:
+    def unary_operation(self, op, number):
+        match op:
             case "-":
                 return -number
             case "!":
                 return type(number)(1) if number == 0 else type(number)(0)
             case _:
-                raise Exception(f"Invalid unary operator: {node.op}")
+                raise Exception(f"Invalid unary operator: {op}")
 
     ### INPUT/OUTPUT ###
     def evaluate_InputNode(self, node):
-        value = input(node.prompt)
-
-        if re.match(r"^-?\d+$", value):
-            value = int(value)
-        elif re.match(r"^-?\d+\.(\d*)?$", value):
-            value = float(value)
-        else:
-            raise Exception(f"ERROR: Invalid input {value}")
-
+        value = self.input.read(node.prompt)
         self.environment[node.variable] = value
         return value
 
     def evaluate_PrintNode(self, node):
         value = self.evaluate(node.value)
         if node.variable:
-            print(f"SNOL :> [{node.variable}] = {value}")
+            self.output.write(f"SNOL :> [{node.variable}] = {value}")
         else:
-            print(f"SNOL :> {value}")
-        return value
\ No newline at end of file
+            self.output.write(f"SNOL :> {value}")
+        return value
@@ -0,0 +1,64 @@
+from evaluator.evaluator import Evaluator
+from parser.parser import (
+    BinaryOpNode,
+    UnaryOpNode,
+    IntegerNode,
+    FloatNode,
+    VariableAccessNode,
+)
+
+
+class IterativeEvaluator(Evaluator):
+    """Evaluator that walks expressions with an explicit stack.
+
+    Evaluator.evaluate recurses once per node, so an expression nested a few
+    thousand levels deep raises RecursionError. This evaluator visits
+    operands in the same order and uses the same operations, so results and
+    errors are identical, but its depth is only limited by memory.
+
+    Statements (assignment, input, print) are handled by Evaluator, and call
+    back into evaluate() for their value."""
+
+    def evaluate(self, node):
+        kind = type(node)
+        if kind is not BinaryOpNode and kind is not UnaryOpNode:
+            return super().evaluate(node)
+
+        environment = self.environment
+        binary_operation = self.binary_operation
+        unary_operation = self.unary_operation
+
+        values = []
+        # nodes still to visit; an operator node appears a second time as
+        # the tuple (node,) once its operands are on the values stack
+        stack = [node]
+        push = stack.append
+
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+
+            if kind is tuple:
+                (node,) = node
+                if type(node) is BinaryOpNode:
+                    right = values.pop()
+                    values[-1] = binary_operation(node.op, values[-1], right)
+                else:
+                    values[-1] = unary_operation(node.op, values[-1])
+            elif kind is BinaryOpNode:
+                push((node,))
+                push(node.right)
+                push(node.left)
+            elif kind is UnaryOpNode:
+                push((node,))
+                push(node.node)
+            elif kind is IntegerNode or kind is FloatNode:
+                values.append(node.value)
+            elif kind is VariableAccessNode:
+                if node.variable not in environment:
+                    raise Exception(f"Error! [{node.variable}] is not defined!")
+                values.append(environment[node.variable])
+            else:
+                values.append(super().evaluate(node))
+
+        return values[-1]
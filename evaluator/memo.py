@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from itertools import count
+
+from evaluator.evaluator import Evaluator
+from evaluator.reactive import read_variables
+
+# an operation is only worth remembering when an operand or its result has
+# more bits than this, below it computing again is cheaper than looking up
+MEMO_MIN_BITS = 256
+
+
+class MemoEvaluator(Evaluator):
+    """Evaluator that remembers the results of expensive operations, so a
+    line that runs again skips them while the variables they read are
+    unchanged.
+
+    Every variable has a version, stamped from a counter each time an
+    assignment or BEG changes it. A result is kept with the versions of the
+    variables its subtree reads, and is reused only while those are the same.
+    Results are looked up by the node itself, so lines have to come from a
+    ParseCache (any Pipeline with a cache_size) for a repeated line to find
+    them.
+
+    Only binary operations on ints with more than MEMO_MIN_BITS bits are
+    kept, eg. big ** powers and the products and remainders of their results.
+    At most maxsize results are kept, the least recently used is dropped
+    first. The kept results also hold at most max_bits bits together (32MB
+    by default), a result bigger than that on its own is not kept at all.
+    Operations that raise are never kept, so they raise again.
+
+    Variables have to change through the evaluator, code that sets them in
+    environment directly must call restored() afterwards."""
+
+    def __init__(self, maxsize=1024, max_bits=1 << 28):
+        if maxsize < 1:
+            raise ValueError("The memo must hold at least one result")
+        if max_bits < 1:
+            raise ValueError("The memo must hold at least one bit")
+        super().__init__()
+        self.maxsize = maxsize
+        self.max_bits = max_bits
+        self.bits = 0  # bits of all the kept results
+        self.memo = OrderedDict()  # node -> (variables read, their versions, value)
+        self.versions = {}  # variable -> version
+        self.clock = count(1)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return (
+            f"{len(self.memo)}/{self.maxsize} results cached ({self.bits} bits), {self.hits} hits, "
+            f"{self.misses} misses ({self.hit_rate:.1%} hit rate), {self.evictions} evictions"
+        )
+
+    def restored(self):
+        """Called after the environment has been replaced, eg. by snapshot.load."""
+        self.memo.clear()
+        self.versions.clear()
+        self.bits = 0
+
+    def evaluate_AssignmentNode(self, node):
+        value = super().evaluate_AssignmentNode(node)
+        self.versions[node.variable] = next(self.clock)
+        return value
+
+    def evaluate_InputNode(self, node):
+        value = super().evaluate_InputNode(node)
+        self.versions[node.variable] = next(self.clock)
+        return value
+
+    def evaluate_BinaryOpNode(self, node):
+        memo = self.memo
+        entry = memo.get(node)
+        if entry is not None:
+            reads, versions, value = entry
+            if versions == tuple(map(self.versions.get, reads)):
+                memo.move_to_end(node)
+                self.hits += 1
+                return value
+
+        left = self.evaluate(node.left)
+        right = self.evaluate(node.right)
+        value = self.binary_operation(node.op, left, right)
+
+        if type(value) is int and type(left) is int and (
+            value.bit_length() > MEMO_MIN_BITS
+            or left.bit_length() > MEMO_MIN_BITS
+            or right.bit_length() > MEMO_MIN_BITS
+        ):
+            self.misses += 1
+            bits = value.bit_length()
+            if entry is not None:
+                del memo[node]
+                self.bits -= entry[2].bit_length()
+            if bits > self.max_bits:
+                return value
+            reads = entry[0] if entry is not None else tuple(read_variables(node))
+            memo[node] = (reads, tuple(map(self.versions.get, reads)), value)
+            self.bits += bits
+            while len(memo) > self.maxsize or self.bits > self.max_bits:
+                self.bits -= memo.popitem(last=False)[1][2].bit_length()
+                self.evictions += 1
+        return value
@@ -0,0 +1,122 @@
+"""Where PRINT writes its lines and where BEG reads its values from.
+
+Every evaluator backend has an output provider (evaluator.output) and an
+input provider (evaluator.input), which default to the console. An output
+provider has write(line) and flush(), an input provider has read(prompt),
+which returns the number that was read.
+"""
+
+import re
+import sys
+
+INTEGER_PATTERN = re.compile(r"^-?\d+$")
+FLOAT_PATTERN = re.compile(r"^-?\d+\.(\d*)?$")
+
+
+def parse_number(value):
+    """Convert a value typed in for BEG to an int or a float.
+
+    Follows the same EBNF rules as the literals in the lexer."""
+    if INTEGER_PATTERN.match(value):
+        return int(value)
+    if FLOAT_PATTERN.match(value):
+        return float(value)
+    raise Exception(f"ERROR: Invalid input {value}")
+
+
+### OUTPUT ###
+class ConsoleOutput:
+    """Prints every line as soon as it is written."""
+
+    def write(self, line):
+        print(line)
+
+    def flush(self):
+        pass
+
+
+class BufferedOutput:
+    """Collects lines and writes them to a file in one call once max_lines
+    have been collected, or when flushed.
+
+    The file is sys.stdout at the time of the flush unless one is given.
+    Whoever writes to the same file directly must flush first, so that the
+    lines stay in order."""
+
+    def __init__(self, file=None, max_lines=1024):
+        self.file = file
+        self.max_lines = max_lines
+        self.lines = []
+
+    def write(self, line):
+        lines = self.lines
+        lines.append(line)
+        if len(lines) >= self.max_lines:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        file = self.file if self.file is not None else sys.stdout
+        file.write("\n".join(self.lines) + "\n")
+        file.flush()
+        self.lines.clear()
+
+
+class ListOutput:
+    """Keeps every line in lines, for whoever wants to send them somewhere
+    else, such as the server."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def flush(self):
+        pass
+
+
+### INPUT ###
+class ConsoleInput:
+    """Asks for every value with input().
+
+    With an output provider, its lines are flushed before the prompt is
+    shown, so buffered PRINT output still comes out above the prompt."""
+
+    def __init__(self, output=None):
+        self.output = output
+
+    def read(self, prompt):
+        if self.output is not None:
+            self.output.flush()
+        return parse_number(input(prompt))
+
+
+class ValueInput:
+    """Reads values from an iterable of numbers or strings, taking the next
+    one only when a BEG asks for it, so the iterable may be endless.
+
+    An invalid value only fails the BEG that reads it, with the same error as
+    on the console, and a BEG after the last value fails too. The prompt is
+    not shown."""
+
+    def __init__(self, values):
+        self.values = iter(values)
+
+    def read(self, prompt):
+        try:
+            value = next(self.values)
+        except StopIteration:
+            raise Exception("Error! No input left for BEG!") from None
+        if type(value) is str:
+            return parse_number(value.strip())
+        return value
+
+
+class FileInput(ValueInput):
+    """Reads values from a file, one per line or separated by any whitespace."""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as file:
+            super().__init__(file.read().split())
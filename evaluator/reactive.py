@@ -0,0 +1,118 @@
+from evaluator.evaluator import Evaluator
+from parser.parser import BinaryOpNode, UnaryOpNode, VariableAccessNode
+
+
+def read_variables(node):
+    """The variables an expression reads, in the order they are first read."""
+    names = {}
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, VariableAccessNode):
+            names[node.variable] = None
+        elif isinstance(node, BinaryOpNode):
+            stack += (node.right, node.left)
+        elif isinstance(node, UnaryOpNode):
+            stack.append(node.node)
+    return list(names)
+
+
+class ReactiveEvaluator(Evaluator):
+    """Evaluator that keeps assigned variables up to date, like the cells of a
+    spreadsheet.
+
+    Every assignment remembers its expression (its formula) and the variables
+    it reads. When a variable changes, through an assignment or BEG, only the
+    variables that depend on it are recomputed, each after everything it
+    reads, so the work done depends on what changed and not on the size of
+    the script.
+
+    - an assignment that reads its own variable, like "i = i + 1", is run once
+      as usual and leaves the variable without a formula
+    - any other circular dependency is an error and changes nothing
+    - a variable whose formula fails to recompute is left undefined until its
+      inputs change again"""
+
+    def __init__(self):
+        super().__init__()
+        self.formulas = {}  # variable -> expression it was assigned
+        self.reads = {}  # variable -> variables its formula reads
+        self.dependents = {}  # variable -> variables whose formulas read it, in order
+        self.recomputed = 0
+
+    def restored(self):
+        """Called after the environment has been replaced, eg. by snapshot.load.
+        The formulas were computed from the old variables, so they are dropped."""
+        self.formulas.clear()
+        self.reads.clear()
+        self.dependents.clear()
+
+    def evaluate_AssignmentNode(self, node):
+        name = node.variable
+        reads = read_variables(node.value)
+        if name not in reads and self.dependents.get(name):
+            downstream = set(self.affected(name))
+            for read in reads:
+                if read in downstream:
+                    raise Exception(f"Error! Circular dependency between [{name}] and [{read}]!")
+
+        value = self.evaluate(node.value)
+        self.unlink(name)
+        if reads and name not in reads:
+            self.formulas[name] = node.value
+            self.reads[name] = reads
+            for read in reads:
+                self.dependents.setdefault(read, {})[name] = None
+
+        self.environment[name] = value
+        self.update(name)
+        return value
+
+    def evaluate_InputNode(self, node):
+        value = super().evaluate_InputNode(node)
+        self.unlink(node.variable)
+        self.update(node.variable)
+        return value
+
+    def unlink(self, name):
+        """Forget the formula of a variable, keeping its current value."""
+        self.formulas.pop(name, None)
+        for read in self.reads.pop(name, ()):
+            del self.dependents[read][name]
+
+    def affected(self, name):
+        """The variables that depend on name, in an order where every variable
+        comes after all of the variables it reads."""
+        dependents = self.dependents
+        order = []
+        seen = {name}
+        # depth first search without recursion, the reverse of the order in
+        # which variables are finished is a topological order
+        stack = [(name, iter(dependents.get(name, ())))]
+        while stack:
+            variable, children = stack[-1]
+            for child in children:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append((child, iter(dependents.get(child, ()))))
+                    break
+            else:
+                stack.pop()
+                order.append(variable)
+        order.pop()  # name itself
+        order.reverse()
+        return order
+
+    def update(self, name):
+        """Recompute every variable that depends on name."""
+        error = None
+        for variable in self.affected(name):
+            self.recomputed += 1
+            try:
+                self.environment[variable] = self.evaluate(self.formulas[variable])
+            except Exception as e:
+                self.environment.pop(variable, None)
+                if error is None:
+                    error = Exception(f"Error! [{variable}] could not be updated: {e}")
+        if error is not None:
+            raise error
@@ -0,0 +1,138 @@
+from collections.abc import MutableMapping
+
+from evaluator.closure import ClosureCompiler, ClosureEvaluator
+
+# value of a slot whose variable has not been assigned yet
+UNSET = object()
+
+
+class SlotResolver:
+    """Gives every variable name a fixed slot number, the first time it is seen.
+
+    values holds the value of each slot (UNSET until it is assigned), and
+    grows as new names are resolved."""
+
+    def __init__(self):
+        self.slots = {}  # variable -> slot
+        self.names = []  # slot -> variable
+        self.values = []
+
+    def resolve(self, variable):
+        slot = self.slots.get(variable)
+        if slot is None:
+            slot = self.slots[variable] = len(self.names)
+            self.names.append(variable)
+            self.values.append(UNSET)
+        return slot
+
+
+class SlotEnvironment(MutableMapping):
+    """Dict-like view of the slots by variable name, for the REPL, tests and
+    anything else that reads or sets variables by name."""
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+
+    def __getitem__(self, variable):
+        slot = self.resolver.slots.get(variable)
+        value = UNSET if slot is None else self.resolver.values[slot]
+        if value is UNSET:
+            raise KeyError(variable)
+        return value
+
+    def __setitem__(self, variable, value):
+        self.resolver.values[self.resolver.resolve(variable)] = value
+
+    def __delitem__(self, variable):
+        self[variable]  # raises KeyError if it is not set
+        self.resolver.values[self.resolver.slots[variable]] = UNSET
+
+    def __iter__(self):
+        values = self.resolver.values
+        return (name for slot, name in enumerate(self.resolver.names) if values[slot] is not UNSET)
+
+    def __len__(self):
+        return sum(value is not UNSET for value in self.resolver.values)
+
+    def clear(self):
+        # MutableMapping.clear would find the first set slot again for every variable
+        values = self.resolver.values
+        values[:] = [UNSET] * len(values)
+
+    def update(self, variables=(), **more):
+        resolve = self.resolver.resolve
+        values = self.resolver.values
+        if hasattr(variables, "keys"):
+            variables = variables.items()
+        for pairs in (variables, more.items()):
+            for variable, value in pairs:
+                values[resolve(variable)] = value
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SlotClosureCompiler(ClosureCompiler):
+    """ClosureCompiler whose closures take the list of slot values instead of
+    the environment dict, with every variable resolved to its slot at compile
+    time."""
+
+    def __init__(self, resolver, io=None):
+        super().__init__(io)
+        self.resolver = resolver
+
+    def compile_VariableAccessNode(self, node):
+        slot = self.resolver.resolve(node.variable)
+        message = f"Error! [{node.variable}] is not defined!"
+
+        def load(values):
+            value = values[slot]
+            if value is UNSET:
+                raise Exception(message)
+            return value
+
+        return load
+
+    def compile_AssignmentNode(self, node):
+        slot = self.resolver.resolve(node.variable)
+        value = self.compile(node.value)
+
+        def assign(values):
+            result = values[slot] = value(values)
+            return result
+
+        return assign
+
+    def compile_InputNode(self, node):
+        # BEG may be the first use of a variable, it gets its slot here
+        slot = self.resolver.resolve(node.variable)
+        prompt = node.prompt
+        io = self.io
+
+        def read(values):
+            value = values[slot] = io.input.read(prompt)
+            return value
+
+        return read
+
+
+class SlotEvaluator(ClosureEvaluator):
+    """Closure backend that keeps variables in a flat list indexed by slot
+    instead of a dict keyed by name.
+
+    environment is a SlotEnvironment, so variables can still be read and set
+    by name. Compiled statements are called with evaluator.values."""
+
+    def __init__(self):
+        super().__init__()
+        self.resolver = SlotResolver()
+        self.environment = SlotEnvironment(self.resolver)
+        self.compiler = SlotClosureCompiler(self.resolver, self)
+
+    @property
+    def values(self):
+        return self.resolver.values
+
+    def evaluate(self, node):
+        # a slot never changes once it is given out, so closures stay valid
+        return self.compiled(node)(self.resolver.values)
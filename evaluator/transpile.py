@@ -0,0 +1,566 @@
+"""Translating whole SNOL scripts into Python source.
+
+A script becomes Python functions in which every SNOL variable is a local
+variable (x is v_x), compiled once with compile() so that CPython's own
+bytecode interpreter runs the script. Each function holds CHUNK_STATEMENTS
+statements, since compiling one huge function takes far too much memory.
+The code objects are marshalled to a .snolpyc file next to the script
+together with a hash of the source, so running an unchanged script again
+skips lexing, parsing, translating and compiling.
+
+The generated code keeps SNOL's semantics:
+- an operator whose operands TypeChecker knows to be both ints or both
+  floats becomes the Python operator, with / as // for ints, 0 and 1 of the
+  operand type for comparisons, ! , && and ||, and both sides of && and ||
+  always evaluated
+- every other operator calls Evaluator.binary_operation or unary_operation,
+  so mixed types fail with the same error
+- every statement runs in its own try block and reports its error with its
+  line number, an unbound variable as "Error! [x] is not defined!"
+- PRINT and BEG go through the output and input providers
+
+For "x = x + 1" on line 3, after x = 1 on line 1, the function is
+
+    def snol_script(_env, _write, _read, _error):
+        if 'x' in _env:
+            v_x = _env['x']
+        try:
+            ...
+            try:
+                v_x = (v_x + 1)
+            except Exception as _e:
+                _error(3, _translate(_e, ('x',), locals()))
+        finally:
+            _store(_env, locals())
+
+Variables start with the values of the environment the script runs
+against and are written back to it when the function returns or raises,
+which is also how they are handed from one function to the next.
+"""
+
+import importlib.util
+import io
+import marshal
+import math
+import os
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from parser.cache import ParseCache
+from parser.parser import (
+    AssignmentNode,
+    BinaryOpNode,
+    FloatNode,
+    InputNode,
+    IntegerNode,
+    PrintNode,
+    UnaryOpNode,
+    VariableAccessNode,
+)
+from parser.typecheck import UNDEFINED, TypeChecker
+from evaluator.evaluator import Evaluator
+from evaluator.reactive import read_variables
+from evaluator.bytecode import READ_CHUNK_SIZE, hash_file
+
+# bump when the generated code changes so old .snolpyc files are ignored
+FORMAT_VERSION = 3
+MAGIC = "SNOLPY"
+
+FUNCTION_NAME = "snol_script"
+
+# statements per generated function
+CHUNK_STATEMENTS = 1000
+
+# lines transpile_script keeps parsed, scripts tend to repeat the same lines
+PARSE_CACHE_SIZE = 1024
+
+# an expression nested deeper than this is split into one Python statement
+# per operator, CPython refuses to compile deeply nested expressions
+MAX_NESTING = 40
+
+# int literals with more bits than this are written in hex, which Python
+# reads without a limit on the number of digits
+HEX_BITS = 256
+
+ARITHMETIC_OPERATORS = {"+", "-", "*", "/", "%", "**"}
+COMPARISON_OPERATORS = {"==", "!=", "<=", ">=", "<", ">"}
+# arithmetic that can't raise on two ints or two floats
+SAFE_OPERATORS = {"+", "-", "*"}
+
+
+### RUNTIME ###
+def fail(message):
+    raise Exception(message)
+
+
+def translate(error, reads, variables):
+    """The SNOL error for an exception raised by a statement.
+
+    reads has the variables the statement reads, in the order it reads them,
+    and variables the locals of the script, so the first one of them that is
+    not bound is the one whose read raised a NameError."""
+    if isinstance(error, NameError):
+        for name in reads:
+            if "v_" + name not in variables:
+                return Exception(f"Error! [{name}] is not defined!")
+    return error
+
+
+def store(env, variables):
+    for name, value in variables.items():
+        if name.startswith("v_"):
+            env[name[2:]] = value
+
+
+def reraise(line_number, error):
+    raise error
+
+
+_semantics = Evaluator()
+
+# the globals every generated function runs with
+RUNTIME = {
+    "_binary": _semantics.binary_operation,
+    "_unary": _semantics.unary_operation,
+    "_fail": fail,
+    "_translate": translate,
+    "_store": store,
+}
+
+
+### TRANSLATION ###
+def literal(value):
+    if type(value) is int and value.bit_length() > HEX_BITS:
+        text = hex(value)
+    elif type(value) is float and not math.isfinite(value):
+        text = "(1e999 - 1e999)" if math.isnan(value) else "-1e999" if value < 0 else "1e999"
+    else:
+        text = repr(value)
+    return f"({text})" if text.startswith("-") else text
+
+
+class Transpiler:
+    """Translates SNOL statements into the source of Python functions, see
+    the module docstring.
+
+    Statements are added in the order they run, each one typed by a
+    TypeChecker after the ones before it. environment holds the variables
+    the script will start with, so their types are known too. Every
+    chunk_size statements the function so far is compiled, and program()
+    returns all of them.
+
+    Only statements that may fail get a try block. A statement can't fail
+    when every variable it reads is certain to be defined, every operand has
+    a known type the same as the other side's, and every operator is one that
+    can't raise on them: not **, and / or % only by a literal other than 0.
+
+    A statement that comes again, as the same tree, while the variables it
+    uses have the same types and are as certainly defined as before, reuses
+    its translation, until the current function is compiled."""
+
+    def __init__(self, environment=None, chunk_size=CHUNK_STATEMENTS):
+        self.checker = TypeChecker()
+        self.defined = set()  # variables certain to be defined
+        if environment:
+            self.checker.variables = {name: type(value) for name, value in environment.items()}
+            self.defined.update(environment)
+        self.chunk_size = chunk_size
+        self.codes = []  # code objects of the functions compiled so far
+        self.line_numbers = array("I")
+        self.body = []
+        self.names = {}  # every variable the current function reads, in order
+        self.translations = {}  # (tree, what is known of its variables) -> translation
+        self.variables = {}  # tree -> the variables it reads or sets
+        self.result = None  # (where in body, line) that keeps the last statement's value
+
+    def add(self, line_number, tree):
+        """Add a statement. tree may also be an Exception for a line that
+        failed to parse, which is raised again when its turn comes."""
+        kind = type(tree)
+        if isinstance(tree, Exception):
+            code = [f"_fail({str(tree)!r})"]
+            reads = ()
+            safe = False
+        else:
+            code, reads, safe = self.statement(tree)
+        # an expression statement keeps its own value in _r
+        result = f"v_{tree.variable}" if kind is AssignmentNode or kind is InputNode else "_v" if kind is PrintNode else None
+
+        self.names.update(dict.fromkeys(reads))
+        body = self.body
+        if safe:
+            body += ["        " + line for line in code]
+            self.result = (len(body), f"        _r = {result}") if result else None
+        else:
+            body.append("        try:")
+            body += ["            " + line for line in code]
+            self.result = (len(body), f"            _r = {result}") if result else None
+            body.append("        except Exception as _e:")
+            if reads:
+                body.append(f"            _error({line_number!r}, _translate(_e, {tuple(reads)!r}, locals()))")
+            else:
+                body.append(f"            _error({line_number!r}, _e)")
+
+        self.line_numbers.append(line_number)
+        if len(self.line_numbers) % self.chunk_size == 0:
+            self.compile()
+
+    def program(self, line_count=0):
+        """The PythonProgram of every statement added."""
+        if self.body:
+            self.compile()
+        return PythonProgram(self.codes, self.line_numbers, line_count)
+
+    def compile(self):
+        self.codes.append(compile(self.source(), "<snol>", "exec"))
+        self.body = []
+        self.names = {}
+        self.translations.clear()
+        self.variables.clear()
+        self.result = None
+
+    def source(self):
+        """Source of the function for the statements added since the last one
+        was compiled. The function returns the value of its last statement."""
+        lines = [f"def {FUNCTION_NAME}(_env, _write, _read, _error):", "    _r = None"]
+        for name in self.names:
+            lines += [f"    if {name!r} in _env:", f"        v_{name} = _env[{name!r}]"]
+        body = self.body
+        if self.result is not None:
+            position, line = self.result
+            body = body[:position] + [line] + body[position:]
+        lines.append("    try:")
+        lines += body
+        lines += ["        pass", "    finally:", "        _store(_env, locals())", "    return _r"]
+        return "\n".join(lines) + "\n"
+
+    def statement(self, tree):
+        """Python for one statement: (lines, the variables it reads in order,
+        whether it can't fail)."""
+        kind = type(tree)
+        target = tree.variable if kind is AssignmentNode or kind is InputNode else None
+        names = self.variables.get(tree)
+        if names is None:
+            names = read_variables(tree.value if kind is AssignmentNode or kind is PrintNode else tree)
+            if target is not None and target not in names:
+                names.append(target)
+            names = self.variables[tree] = tuple(names)
+        variables = self.checker.variables
+        defined = self.defined
+        key = (
+            tree,
+            tuple([variables.get(name, UNDEFINED) for name in names]),
+            tuple([name in defined for name in names]),
+        )
+
+        translation = self.translations.get(key)
+        if translation is None:
+            code, reads, safe = self.generate(tree)
+            translation = self.translations[key] = (code, reads, safe, variables.get(target))
+        else:
+            # what generate would have done to the checker
+            code, reads, safe, target_type = translation
+            if target is not None:
+                variables[target] = target_type
+        if safe and kind is AssignmentNode:
+            defined.add(target)
+        return code, reads, safe
+
+    def generate(self, tree):
+        types = self.checker.check(tree)
+        # errors are reported when the statement runs, there is no need to keep them
+        self.checker.issues.clear()
+
+        kind = type(tree)
+        if kind is AssignmentNode:
+            code, value, reads, safe = self.expression(tree.value, types)
+            code.append(f"v_{tree.variable} = {value}")
+        elif kind is PrintNode:
+            code, value, reads, _ = self.expression(tree.value, types)
+            code.append(f"_v = {value}")
+            label = f"[{tree.variable}] = " if tree.variable else ""
+            code.append(f'_write(f"SNOL :> {label}{{_v}}")')
+            # writing the line may fail
+            safe = False
+        elif kind is InputNode:
+            code = [f"v_{tree.variable} = _read({tree.prompt!r})"]
+            reads = ()
+            safe = False
+        else:
+            code, value, reads, safe = self.expression(tree, types)
+            code.append(f"_r = {value}")
+        return code, reads, safe
+
+    def expression(self, node, types, split=False):
+        """Python for an expression: (lines to run first, the expression, the
+        variables it reads in order, whether it can't fail).
+
+        Normally the lines are empty and the expression is nested like the
+        tree. With split, every operator and variable read gets a line of its
+        own that stores it in a temporary (_t0, _t1, ... by stack depth), in
+        the order the tree walker evaluates them."""
+        code = []
+        reads = {}
+        values = []  # (python, nesting, safe) of the operands waiting for their operator
+        # like TypeChecker.infer, an operator node is pushed a second time as
+        # (node,) to be translated after its operands
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            kind = type(item)
+
+            if kind is BinaryOpNode:
+                stack += ((item,), item.right, item.left)
+                continue
+            if kind is UnaryOpNode:
+                stack += ((item,), item.node)
+                continue
+
+            if kind is tuple:
+                (item,) = item
+                if type(item) is BinaryOpNode:
+                    right, right_nesting, right_safe = values.pop()
+                    left, left_nesting, left_safe = values.pop()
+                    value, safe = self.binary(item, left, right, types)
+                    safe = safe and left_safe and right_safe
+                    nesting = max(left_nesting, right_nesting) + 1
+                else:
+                    operand, nesting, safe = values.pop()
+                    value, operand_safe = self.unary(item, operand, types)
+                    safe = safe and operand_safe
+                    nesting += 1
+            elif kind is IntegerNode or kind is FloatNode:
+                values.append((literal(item.value), 0, type(item.value) in (int, float)))
+                continue
+            elif kind is VariableAccessNode:
+                reads[item.variable] = None
+                value = f"v_{item.variable}"
+                nesting = 0
+                safe = item.variable in self.defined and types[item] is not None
+            else:
+                # a missing operand, which fails as soon as it is reached
+                value = f"_fail({'No evaluation method defined for ' + kind.__name__!r})"
+                nesting = 1
+                safe = False
+
+            if split:
+                temporary = f"_t{len(values)}"
+                code.append(f"{temporary} = {value}")
+                value = temporary
+                nesting = 0
+            elif nesting > MAX_NESTING:
+                return self.expression(node, types, split=True)
+            values.append((value, nesting, safe))
+
+        value, _, safe = values[0]
+        return code, value, list(reads), safe
+
+    def binary(self, node, left, right, types):
+        """Python for a binary operator: (python, whether it can't fail on its operands)."""
+        op = node.op
+        number = types.get(node.left)
+        if (number is int or number is float) and number is types.get(node.right):
+            true, false = ("1", "0") if number is int else ("1.0", "0.0")
+            if op in ARITHMETIC_OPERATORS:
+                safe = op in SAFE_OPERATORS or (
+                    op != "**" and type(node.right) in (IntegerNode, FloatNode) and node.right.value != 0
+                )
+                if op == "/" and number is int:
+                    op = "//"
+                return f"({left} {op} {right})", safe
+            if op in COMPARISON_OPERATORS:
+                return f"({true} if {left} {op} {right} else {false})", True
+            # & and | evaluate both sides, like Evaluator
+            if op == "&&":
+                return f"({true} if ({left} != 0) & ({right} != 0) else {false})", True
+            if op == "||":
+                return f"({true} if ({left} != 0) | ({right} != 0) else {false})", True
+        return f"_binary({op!r}, {left}, {right})", False
+
+    def unary(self, node, operand, types):
+        """Python for a unary operator: (python, whether it can't fail on its operand)."""
+        op = node.op
+        number = types.get(node.node)
+        if op == "-":
+            return f"(-{operand})", True
+        if op == "!" and (number is int or number is float):
+            true, false = ("1", "0") if number is int else ("1.0", "0.0")
+            return f"({true} if {operand} == 0 else {false})", True
+        return f"_unary({op!r}, {operand})", False
+
+
+### PROGRAMS ###
+class PythonProgram:
+    """A transpiled script: the code objects of its functions and the line
+    number of every statement, in the order they run.
+
+    A program is never changed once it is built and keeps nothing of a run,
+    so one program can run on many threads at once, each against its own
+    environment and providers."""
+
+    def __init__(self, codes=(), line_numbers=(), line_count=0):
+        self.codes = tuple(codes)
+        self.line_numbers = tuple(line_numbers)
+        self.line_count = line_count  # lines in the source, including blank ones
+        namespace = dict(RUNTIME)
+        functions = []
+        for code in self.codes:
+            exec(code, namespace)
+            functions.append(namespace[FUNCTION_NAME])
+        self.functions = tuple(functions)
+
+    def run(self, environment, output, input, error):
+        """Run the script against environment. error(line number, exception)
+        is called for every statement that fails, and may raise to stop it.
+        Returns the value of the last statement."""
+        write = output.write
+        read = input.read
+        result = None
+        for function in self.functions:
+            result = function(environment, write, read, error)
+        return result
+
+    def statements_before(self, line_number):
+        """How many statements ran up to and including line_number."""
+        return bisect_right(self.line_numbers, line_number)
+
+    def dumps(self, source_hash, optimized=False):
+        # code objects only load on the Python version that made them, so the
+        # header is checked before they are read
+        header = (
+            MAGIC,
+            FORMAT_VERSION,
+            importlib.util.MAGIC_NUMBER,
+            source_hash,
+            optimized,
+            array("I", self.line_numbers).tobytes(),
+            self.line_count,
+        )
+        return marshal.dumps(header) + marshal.dumps(tuple(self.codes))
+
+    @classmethod
+    def loads(cls, data, source_hash, optimized=False):
+        """Rebuild a PythonProgram, or return None if data is stale, was
+        transpiled with a different optimized setting or is not a .snolpyc file."""
+        file = io.BytesIO(data)
+        try:
+            magic, version, python_magic, stored_hash, stored_optimized, line_numbers, line_count = marshal.load(file)
+            if (magic, version, python_magic, stored_hash, stored_optimized) != (
+                MAGIC,
+                FORMAT_VERSION,
+                importlib.util.MAGIC_NUMBER,
+                source_hash,
+                optimized,
+            ):
+                return None
+            codes = marshal.load(file)
+        except (EOFError, ValueError, TypeError):
+            return None
+        numbers = array("I")
+        numbers.frombytes(line_numbers)
+        return cls(codes, numbers, line_count)
+
+
+def transpile_statements(statements, line_count=0, environment=None):
+    """Transpile and compile a list of (line number, tree), see Transpiler.add."""
+    transpiler = Transpiler(environment)
+    for line_number, tree in statements:
+        transpiler.add(line_number, tree)
+    return transpiler.program(line_count)
+
+
+def transpile_script(lines, optimizer=None, environment=None):
+    """Lex, parse and transpile every statement of a script.
+
+    Lines that fail to lex or parse raise their error when, and only if,
+    execution reaches them."""
+    cache = ParseCache(PARSE_CACHE_SIZE, Lexer(), PrecedenceParser(), optimizer)
+    transpiler = Transpiler(environment)
+    line_count = 0
+
+    for line_number, line in enumerate(lines, 1):
+        line_count = line_number
+        line = line.strip()
+        if line == "":
+            continue
+        if line == "EXIT!":
+            break
+
+        try:
+            tree = cache.parse(line)
+        except Exception as e:
+            tree = e
+        transpiler.add(line_number, tree)
+
+    return transpiler.program(line_count)
+
+
+def cache_path(path):
+    """Where the transpiled form of a script is kept, eg. loop.snol -> loop.snolpyc"""
+    return os.path.splitext(path)[0] + ".snolpyc"
+
+
+def load_transpiled(path, optimizer=None):
+    """Load the transpiled form of a script, transpiling and caching it if needed.
+
+    The code is compiled for variables that start out undefined, so it must
+    run against an empty environment. Like a .snolc file, the .snolpyc file
+    records whether the script went through the optimizer."""
+    source_hash = hash_file(path)
+    compiled_path = cache_path(path)
+    optimized = optimizer is not None
+
+    try:
+        with open(compiled_path, "rb") as file:
+            program = PythonProgram.loads(file.read(), source_hash, optimized)
+    except OSError:
+        program = None
+    if program is not None:
+        return program
+
+    with open(path, encoding="utf-8", buffering=READ_CHUNK_SIZE) as file:
+        program = transpile_script(file, optimizer)
+    try:
+        with open(compiled_path, "wb") as file:
+            file.write(program.dumps(source_hash, optimized))
+    except OSError:
+        # the cache is only an optimization, eg. the directory may be read only
+        pass
+    return program
+
+
+class PythonEvaluator(Evaluator):
+    """Backend that runs SNOL as transpiled Python.
+
+    A Runner transpiles a whole script at once, see PythonProgram.
+    evaluate() transpiles a single statement for the types its variables
+    have at that moment, which costs a compile(), so the programs of up to
+    maxsize trees are kept, and lines have to come from a ParseCache (any
+    Pipeline with a cache_size) for a repeated line to find its program."""
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        self.maxsize = maxsize
+        self.programs = OrderedDict()  # tree -> (variables it reads, {their types: PythonProgram})
+
+    def evaluate(self, node):
+        environment = self.environment
+        entry = self.programs.get(node)
+        if entry is None:
+            value = node.value if type(node) in (AssignmentNode, PrintNode) else node
+            reads = () if type(node) is InputNode else tuple(read_variables(value))
+            entry = self.programs[node] = (reads, {})
+            if len(self.programs) > self.maxsize:
+                self.programs.popitem(last=False)
+        else:
+            self.programs.move_to_end(node)
+
+        reads, programs = entry
+        signature = tuple(type(environment[name]) if name in environment else None for name in reads)
+        program = programs.get(signature)
+        if program is None:
+            program = programs[signature] = transpile_statements([(0, node)], environment=environment)
+        return program.run(environment, self.output, self.input, reraise)
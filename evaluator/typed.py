@@ -0,0 +1,144 @@
+from parser.parser import AssignmentNode, InputNode, PrintNode
+from parser.typecheck import UNDEFINED, TypeChecker
+from evaluator.closure import ClosureCompiler, ClosureEvaluator
+from evaluator.reactive import read_variables
+
+
+class TypedClosureCompiler(ClosureCompiler):
+    """ClosureCompiler that uses the types inferred by a TypeChecker.
+
+    An operator whose operands are both known to be ints, or both floats,
+    compiles to a closure without the type check, with / already resolved to
+    // or / and with 0 and 1 of the right type for the boolean operators.
+    Everything else compiles exactly like in ClosureCompiler, so errors stay
+    the same."""
+
+    def __init__(self, io=None):
+        super().__init__(io)
+        self.types = {}
+
+    def compile_typed(self, node, types):
+        """Compile a statement with the types TypeChecker.check returned for it."""
+        self.types = types
+        try:
+            return self.compile(node)
+        finally:
+            self.types = {}
+
+    def compile_BinaryOpNode(self, node):
+        number = self.types.get(node.left)
+        if number is None or number is not self.types.get(node.right):
+            return super().compile_BinaryOpNode(node)
+
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        true = number(1)
+        false = number(0)
+
+        # Python evaluates left(env) before right(env) in every one of these
+        match node.op:
+            case "+":
+                return lambda env: left(env) + right(env)
+            case "-":
+                return lambda env: left(env) - right(env)
+            case "*":
+                return lambda env: left(env) * right(env)
+            case "/" if number is int:
+                return lambda env: left(env) // right(env)
+            case "/":
+                return lambda env: left(env) / right(env)
+            case "%":
+                return lambda env: left(env) % right(env)
+            case "**":
+                return lambda env: left(env) ** right(env)
+            case "==":
+                return lambda env: true if left(env) == right(env) else false
+            case "!=":
+                return lambda env: true if left(env) != right(env) else false
+            case "<=":
+                return lambda env: true if left(env) <= right(env) else false
+            case ">=":
+                return lambda env: true if left(env) >= right(env) else false
+            case "<":
+                return lambda env: true if left(env) < right(env) else false
+            case ">":
+                return lambda env: true if left(env) > right(env) else false
+            case "&&":
+                def and_(env):
+                    # both sides always run, like in Evaluator
+                    a = left(env)
+                    b = right(env)
+                    return true if a and b else false
+                return and_
+            case "||":
+                def or_(env):
+                    a = left(env)
+                    b = right(env)
+                    return true if a or b else false
+                return or_
+            case _:
+                return super().compile_BinaryOpNode(node)
+
+    def compile_UnaryOpNode(self, node):
+        number = self.types.get(node.node)
+        if number is None or node.op != "!":
+            return super().compile_UnaryOpNode(node)
+
+        operand = self.compile(node.node)
+        true = number(1)
+        false = number(0)
+        return lambda env: true if operand(env) == 0 else false
+
+
+class TypedEvaluator(ClosureEvaluator):
+    """Closure backend that infers types as statements come in and compiles
+    them with TypedClosureCompiler.
+
+    Statements must run in the order they are evaluated or compiled, since
+    each one is specialized for the types left by the ones before it. The
+    closures evaluate() compiles are kept per tree and per inferred type of
+    the variables the statement reads and assigns."""
+
+    def __init__(self):
+        super().__init__()
+        self.checker = TypeChecker()
+        self.compiler = TypedClosureCompiler(self)
+
+    def restored(self):
+        """Called after the environment has been replaced, eg. by snapshot.load."""
+        self.checker.variables = {name: type(value) for name, value in self.environment.items()}
+
+    def compile(self, node):
+        types = self.checker.check(node)
+        # errors are reported when the statement runs, there is no need to keep them
+        self.checker.issues.clear()
+        return self.compiler.compile_typed(node, types)
+
+    def compiled(self, node):
+        closures = self.closures
+        entry = closures.get(node)
+        if entry is None:
+            kind = type(node)
+            target = node.variable if kind is AssignmentNode or kind is InputNode else None
+            names = [] if kind is InputNode else read_variables(node.value if kind is AssignmentNode or kind is PrintNode else node)
+            if target is not None and target not in names:
+                names.append(target)
+            entry = closures[node] = (tuple(names), target, {})
+            if len(closures) > self.maxsize:
+                closures.popitem(last=False)
+        else:
+            closures.move_to_end(node)
+
+        names, target, specialized = entry
+        variables = self.checker.variables
+        signature = tuple([variables.get(name, UNDEFINED) for name in names])
+        found = specialized.get(signature)
+        if found is None:
+            closure = self.compile(node)
+            specialized[signature] = (closure, variables.get(target))
+        else:
+            # what compile would have done to the checker
+            closure, number = found
+            if target is not None:
+                variables[target] = number
+        return closure
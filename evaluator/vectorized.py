@@ -0,0 +1,154 @@
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from evaluator.evaluator import Evaluator
+from evaluator.closure import MIXED_TYPES_ERROR
+
+# NumPy is optional, it is only needed for vectorized evaluation
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def kind(value):
+    """The SNOL type of a value: int or float for scalars, and for arrays
+    depending on their dtype."""
+    if np is not None and isinstance(value, (np.ndarray, np.generic)):
+        if value.dtype.kind in "iu":
+            return int
+        if value.dtype.kind == "f":
+            return float
+        raise Exception(f"Error! Unsupported column type {value.dtype}")
+    return type(value)
+
+
+class VectorizedEvaluator(Evaluator):
+    """Evaluates a tree once over whole NumPy columns instead of once per row.
+
+    Variables are bound to 1-d arrays (or left as plain numbers), and every
+    operator works on all rows at once while keeping SNOL's rules:
+    - integer columns only combine with integer columns or numbers, and float
+      with float, checked on the dtype rather than per row
+    - / is floor division between integers
+    - comparisons, &&, || and ! give 0 or 1 of the operands' type
+    - division or modulo by zero in any row raises the same error Python would
+
+    Integer columns use the fixed size integers of their dtype, so unlike SNOL's
+    own ints they can overflow. Unsigned columns are bound as int64, since
+    NumPy turns uint64 mixed with a signed int into float64. Results that would mix ints and floats across
+    rows, such as an int column to a negative power, raise an error, as does
+    BEG, since there is no row to read a value for."""
+
+    def __init__(self, columns=None):
+        if np is None:
+            raise Exception("Error! Vectorized evaluation needs NumPy to be installed")
+        super().__init__()
+        if columns:
+            self.bind(columns)
+
+    def bind(self, columns):
+        """Bind variables to columns, eg. bind({"price": prices, "qty": quantities})"""
+        for name, column in columns.items():
+            column = np.asarray(column)
+            if kind(column) is int and column.dtype.kind == "u":
+                if column.size and column.max() > np.iinfo(np.int64).max:
+                    raise Exception(f"Error! Column {name} has values too big for int64")
+                column = column.astype(np.int64)
+            self.environment[name] = column
+
+    def binary_operation(self, op, left, right):
+        left_is_array = isinstance(left, np.ndarray)
+        right_is_array = isinstance(right, np.ndarray)
+        if not left_is_array and not right_is_array:
+            return super().binary_operation(op, left, right)
+
+        number = kind(left)
+        if number is not kind(right):
+            raise Exception(MIXED_TYPES_ERROR)
+        # dtype of 0/1 results, taken from the column like type(left)(1) is
+        dtype = left.dtype if left_is_array else right.dtype
+
+        match op:
+            case "+":
+                return left + right
+            case "-":
+                return left - right
+            case "*":
+                return left * right
+            case "/":
+                if number is int:
+                    self.check_divisor(right, "integer division or modulo by zero")
+                    return np.floor_divide(left, right)
+                self.check_divisor(right, "float division by zero")
+                return np.true_divide(left, right)
+            case "%":
+                if number is int:
+                    self.check_divisor(right, "integer modulo by zero")
+                else:
+                    self.check_divisor(right, "float modulo")
+                # np.mod follows Python in taking the sign of the divisor
+                return np.mod(left, right)
+            case "**":
+                return self.power(number, left, right)
+            case "==":
+                return (left == right).astype(dtype)
+            case "!=":
+                return (left != right).astype(dtype)
+            case "<=":
+                return (left <= right).astype(dtype)
+            case ">=":
+                return (left >= right).astype(dtype)
+            case "<":
+                return (left < right).astype(dtype)
+            case ">":
+                return (left > right).astype(dtype)
+            case "&&":
+                return np.logical_and(left, right).astype(dtype)
+            case "||":
+                return np.logical_or(left, right).astype(dtype)
+            case _:
+                raise Exception(f"Invalid binary operator: {op}")
+
+    def check_divisor(self, divisor, message):
+        if np.any(np.equal(divisor, 0)):
+            raise ZeroDivisionError(message)
+
+    def power(self, number, base, exponent):
+        if number is int:
+            # Python gives a float for these rows, which an int column can't hold
+            if np.any(np.less(exponent, 0)):
+                raise Exception(
+                    "Error! Negative integer powers are not supported for integer columns"
+                )
+            return np.power(base, exponent)
+
+        # Python gives a complex number for these rows and raises on overflow
+        if np.any(np.less(base, 0) & np.not_equal(exponent, np.floor(exponent))):
+            raise Exception("Error! Fractional powers of negative numbers are not supported")
+        with np.errstate(over="raise"):
+            try:
+                return np.power(base, exponent)
+            except FloatingPointError:
+                raise OverflowError("(34, 'Numerical result out of range')") from None
+
+    def unary_operation(self, op, number):
+        if not isinstance(number, np.ndarray):
+            return super().unary_operation(op, number)
+
+        match op:
+            case "-":
+                return np.negative(number)
+            case "!":
+                return (number == 0).astype(number.dtype)
+            case _:
+                raise Exception(f"Invalid unary operator: {op}")
+
+    def evaluate_InputNode(self, node):
+        raise Exception("Error! BEG is not supported in vectorized evaluation")
+
+
+def evaluate_formula(line, columns):
+    """Evaluate one line of SNOL over a dict of columns and return the result,
+    eg. evaluate_formula("total = price * qty", {"price": ..., "qty": ...})"""
+    tree = PrecedenceParser().parse(Lexer().tokenize(line))
+    return VectorizedEvaluator(columns).evaluate(tree)
@@ -2,94 +2,103 @@ import re
 from lexer.token import Token
 
 
+# token types
+# "PLUS", "MINUS", "MULTIPLY", "DIVIDE", "LPAREN", "RPAREN", "ASSIGN"
+# //, **, <, >, <=, >=, ==, !=, ||, &&, and !
+# "INTEGER", "FLOAT", "VARIABLE"
+# "INPUT", "OUTPUT"
+
+# reserved words
+RESERVED_WORDS = {
+    "BEG": "INPUT",
+    "PRINT": "PRINT",
+}
+
+# Every token is typed by the named group that matched it, so a single scan over
+# the line both splits and classifies it. The order of the alternatives matters:
+# - numbers come before words, so words never start with a digit
+#   INTEGER = [-]digit{digit}, FLOAT = [-]digit{digit}.{digit}
+#   (the sign is lexed as its own operator and applied by the parser)
+# - KEYWORD and VARIABLE (VARIABLE = letter{(letter|digit)}) only match whole
+#   words, anything else made of word characters (eg. "x1é") falls through to
+#   WORD and is rejected as a whole
+# - two character operators come before the one character operators they start with
+# - UNKNOWN catches any other single character
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<FLOAT>\d+\.\d*)
+    |(?P<INTEGER>\d+)
+    |(?P<KEYWORD>(?:BEG|PRINT)(?![^_\W]))
+    |(?P<VARIABLE>[A-Za-z][A-Za-z0-9]*(?![^_\W]))
+    |(?P<WORD>[^_\W]+)
+    |(?P<PRED_7>\*\*)
+    |(?P<PRED_6>[*/%])
+    |(?P<PRED_5>[+\-])
+    |(?P<PRED_4>==|!=|<=?|>=?)
+    |(?P<PRED_3>!)
+    |(?P<PRED_2>&&)
+    |(?P<PRED_1>\|\|)
+    |(?P<LPAREN>\()
+    |(?P<RPAREN>\))
+    |(?P<ASSIGN>=)
+    |(?P<UNKNOWN>\S)
+    """,
+    re.VERBOSE,
+)
+
+
+def _unrecognized(value):
+    raise Exception(f"ERROR: Unrecognized token {value}")
+
+
+# converts the matched text of a token type into the token's value
+# types not listed here keep the matched text as their value
+CONVERTERS = {
+    "INTEGER": int,
+    "FLOAT": float,
+    "KEYWORD": RESERVED_WORDS.__getitem__,
+    "WORD": _unrecognized,
+    "UNKNOWN": _unrecognized,
+}
+
+
 class Lexer:
     """A class to represent a lexer.
 
-    A lexer takes a line of code and tokenizes it."""
-
-    def __init__(self):
-        self.tokens = []
-
-    def __make_token(self, value):
-        """Create a token with the given value."""
-
-        # token types
-        # "PLUS", "MINUS", "MULTIPLY", "DIVIDE", "LPAREN", "RPAREN", "ASSIGN"
-        # //, **, <, >, <=, >=, ==, !=, ||, &&, and !
-        # "INTEGER", "FLOAT", "VARIABLE"
-        # "INPUT", "OUTPUT"
-        
-        operators = {
-            "**": "PRED_7",
-            "*": "PRED_6",
-            "/": "PRED_6",
-            "%": "PRED_6",
-            "+": "PRED_5",
-            "-": "PRED_5",
-            "==": "PRED_4",
-            "!=": "PRED_4",
-            "<=": "PRED_4",
-            ">=": "PRED_4",
-            "<": "PRED_4",
-            ">": "PRED_4",
-            "!": "PRED_3",
-            "&&": "PRED_2",
-            "||": "PRED_1",
-            "(": "LPAREN",
-            ")": "RPAREN",
-            "=": "ASSIGN",
-        }
-
-        # reserved words
-        reservedWords = {
-            "BEG": "INPUT",
-            "PRINT": "PRINT",
-        }
-
-        # check if the value is an OPERATOR
-        if value in operators:
-            return Token(operators[value], value)
-
-        # check if the value is a RESERVED WORD
-        if value in reservedWords:
-            return Token("KEYWORD", reservedWords[value])
-
-        # check if the value is an INTEGER or a FLOAT
-        # follows the EBNF rules:
-        # INTEGER = [-]digit{digit}
-        # FLOAT = [-]digit{digit}.{digit}
-        if re.match(r"^-?\d+$", value):
-            return Token("INTEGER", int(value))
-        if re.match(r"^-?\d+\.(\d*)?$", value):
-            return Token("FLOAT", float(value))
-
-        # check if the value is a VARIABLE
-        # follows the EBNF rule VARIABLE = letter{(letter|digit)}
-        if re.match(r"^[A-Za-z][A-Za-z0-9]*$", value):
-            return Token("VARIABLE", value)
-
-        # TODO: test that this works
-        # if the value is not any of the above, raise an exception
-        raise Exception(f"ERROR: Unrecognized token {value}")
+    A lexer takes a line of code and tokenizes it. It keeps no state between
+    calls, so one lexer can be shared by any number of threads."""
 
     def tokenize(self, line):
         # This function will take a line of code and return a list of tokens
-        # The tokens will be in the form of a list of tuples (type, value)
-        # For example, the code "1+4.5" will return [("INTEGER", 1), ("PLUS", None), ("FLOAT", 4.5)]
-        # The token types will be 'ADD', 'NUMBER', 'STRING', 'VARIABLE', 'ASSIGN', 'LPAREN', 'RPAREN', 'COMMA', 'SEMI', 'EOF'
+        # For example, the code "SUM=1.45+4" will return
+        # [Token(VARIABLE, SUM), Token(ASSIGN, =), Token(FLOAT, 1.45), Token(PRED_5, +), Token(INTEGER, 4), Token(EOF, None)]
         # The token values will be the actual values of the tokens
+        tokens = []
+        append = tokens.append
+        converters = CONVERTERS
+
+        for match in TOKEN_PATTERN.finditer(line):
+            kind = match.lastgroup
+            value = match.group()
+            if kind in converters:
+                value = converters[kind](value)
+            append(Token(kind, value))
+
+        append(Token("EOF"))
+        return tokens
+
+    def iter_tokens(self, line):
+        """Yield the tokens of a line one at a time instead of building a list.
+
+        Gives the same tokens as tokenize(), ending with EOF, but only the
+        token being worked on is held in memory."""
+        converters = CONVERTERS
+
+        for match in TOKEN_PATTERN.finditer(line):
+            kind = match.lastgroup
+            value = match.group()
+            if kind in converters:
+                value = converters[kind](value)
+            yield Token(kind, value)
 
-        # split the line into tokens by spaces eg "SUM=1.45+4" -> ["SUM", "=", "1.45", "+", "4"]
-        # \d+\.?\d* matches all numbers
-        # [^_\W]+ matches words, does not count words starting with numbers
-        # \|\||&&|\/|\*\*|<=?|>=?|==|!= matches double sign operators
-        # [+\-*/%() =!><] matches single sign operators
-        # \S+? matches all items, used to catch unrecognized tokens
-        self.tokens = re.findall(r"\d+\.?\d*|[^_\W]+|\|\||&&|\/|\*\*|<=?|>=?|==|!=|[+\-*/%()=!><]|\S+?", line)
-        
-        # iterate through the tokens and determine their type
-        self.tokens = [self.__make_token(value) for value in self.tokens] + [
-            Token("EOF")
-        ]
-
-        return self.tokens
+        yield Token("EOF")
@@ -5,6 +5,9 @@ class Token:
 
     The value is the actual value of the token, such as 2 or 'ADD'."""
 
+    # a line can lex to thousands of tokens, slots keep each one small
+    __slots__ = ("type", "value")
+
     def __init__(self, type, value=None):
         self.type = type
         self.value = value
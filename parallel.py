@@ -0,0 +1,167 @@
+"""Runs many independent SNOL scripts across a pool of worker processes.
+
+The interpreter is pure Python, so one process only ever uses one core.
+Every worker process imports the lexer, parser and evaluator once, keeps a
+warm parse cache for its whole life and runs one script after another, each
+on a fresh pipeline with fresh variables.
+
+BEG reads from the input file when one is given, every script from its
+start. Without one a BEG fails, since the workers have no console to ask.
+"""
+
+import io
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline import Pipeline
+from runner import Runner, ScriptError, script_pipeline
+from evaluator.providers import BufferedOutput, ValueInput
+
+# the options of run_script that decide how a script's pipeline is built
+PIPELINE_OPTIONS = (
+    "backend",
+    "cache_size",
+    "optimize",
+    "stream",
+    "tier_threshold",
+    "max_steps",
+    "max_int_bits",
+    "statement_time_limit",
+    "input_path",
+)
+
+
+class ScriptTimeout(BaseException):
+    """Raised inside a worker when a script runs past its time limit.
+
+    Derives from BaseException so that a continue-on-error Runner does not
+    treat it as an error in a single line."""
+
+
+class ScriptResult:
+    """What running one script produced, sent back from a worker."""
+
+    def __init__(self, path):
+        self.path = path
+        self.output = ""
+        self.lines = 0
+        self.statements = 0
+        self.errors = 0
+        self.error = None  # why the script stopped early, if it did
+        self.timed_out = False
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None and not self.errors
+
+
+# per process state of a worker, set up once by init_worker()
+worker_options = {}
+worker_cache = None
+
+
+def init_worker(options):
+    global worker_cache
+    worker_options.update(options)
+    worker_cache = Pipeline(
+        cache_size=options.get("cache_size", 0),
+        optimize=options.get("optimize", False),
+        stream=options.get("stream", False),
+    ).cache
+
+
+def on_timeout(signum, frame):
+    raise ScriptTimeout()
+
+
+def run_one(path):
+    """Run a script in a worker process and return its ScriptResult."""
+    result = ScriptResult(path)
+    options = worker_options
+    time_limit = options.get("time_limit")
+
+    # the lexer, parser and parse cache stay warm, the variables do not
+    output = io.StringIO()
+    pipeline = script_pipeline(
+        **{name: options[name] for name in PIPELINE_OPTIONS if name in options},
+        output=BufferedOutput(output),
+        input=ValueInput(()),
+        cache=worker_cache,
+    )
+    runner = Runner(
+        pipeline,
+        on_error=options.get("on_error", "continue"),
+        optimize_script=options.get("optimize_script", False),
+    )
+    # SIGALRM interrupts even a single long running line, it is only missing on Windows
+    use_alarm = time_limit and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+
+    start = time.perf_counter()
+    try:
+        stats = runner.run_file(path)
+        result.lines = stats.lines
+        result.statements = stats.statements
+        result.errors = stats.errors
+    except ScriptTimeout:
+        result.timed_out = True
+        result.error = f"Timed out after {time_limit}s"
+    except ScriptError as e:
+        result.errors = 1
+        result.error = str(e)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        result.elapsed = time.perf_counter() - start
+
+    result.output = output.getvalue()
+    return result
+
+
+def run_scripts(paths, workers=None, **options):
+    """Run scripts in parallel, yielding their ScriptResults in the order of paths.
+
+    options are passed to every worker: time_limit (seconds per script)
+    and the options of runner.run_script, except report and profile."""
+    workers = workers or os.cpu_count() or 1
+    # hand out scripts in small batches so one slow script does not hold up many
+    chunksize = max(1, len(paths) // (workers * 8))
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(options,)) as pool:
+        yield from pool.map(run_one, paths, chunksize=chunksize)
+
+
+def main(paths, workers=None, report=True, **options):
+    """Run scripts in parallel and print their output in order, followed by a
+    summary on stderr. Returns the exit status to use for the process."""
+    scripts = lines = errors = failed = 0
+    start = time.perf_counter()
+
+    for result in run_scripts(paths, workers, **options):
+        scripts += 1
+        lines += result.lines
+        errors += result.errors
+        if len(paths) > 1:
+            sys.stdout.write(f"==> {result.path} <==\n")
+        sys.stdout.write(result.output)
+        if not result.ok:
+            failed += 1
+        if result.error is not None:
+            print(f"SNOL :> {result.path}: {result.error}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    if report:
+        print(
+            f"SNOL :> {scripts} scripts, {lines} lines, {errors} errors, {failed} failed "
+            f"in {elapsed:.3f}s ({lines / elapsed if elapsed else 0:.0f} lines/sec)",
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
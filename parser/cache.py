@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from parser.flat import flatten, unflatten
+from parser.stream import parse_stream
+
+
+def normalize(line):
+    """Collapse the whitespace in a line.
+
+    Whitespace only separates tokens, so lines that normalize to the same
+    text always lex and parse to the same tree."""
+    return " ".join(line.split())
+
+
+class ParseCache:
+    """Bounded LRU cache of parsed lines, sitting in front of a lexer and parser.
+
+    Lines are looked up by their normalized text, so "i = i + 1" and
+    "i=i + 1 " are different keys but "i = i + 1" and " i  =  i + 1" are not.
+    Lines that fail to lex or parse are never cached, they raise every time.
+
+    A cached tree is handed out to every caller that parses the same line, so
+    trees must be treated as immutable: evaluators and optimization passes
+    build new nodes instead of changing the ones they are given.
+
+    With an optimizer, trees are optimized once before they are cached.
+
+    With compact, lines are stored as FlatStatements, which take a fraction
+    of the memory of a tree but are rebuilt into a new tree on every hit.
+
+    With stream, lines are parsed straight from Lexer.iter_tokens without a
+    list of their tokens.
+
+    One cache can be shared by pipelines on different threads. Lookups and
+    updates hold a lock, lexing and parsing a missed line do not, so two
+    threads may both parse a line that neither found, and the last one to
+    finish is kept. The optimizer's counters are not locked."""
+
+    def __init__(
+        self, maxsize=1024, lexer=None, parser=None, optimizer=None, compact=False, stream=False
+    ):
+        if maxsize < 1:
+            raise ValueError("The cache must hold at least one line")
+        self.maxsize = maxsize
+        self.lexer = lexer if lexer is not None else Lexer()
+        self.parser = parser if parser is not None else PrecedenceParser()
+        self.optimizer = optimizer
+        self.compact = compact
+        self.stream = stream
+        self.trees = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def parse(self, line):
+        """Return the tree for a line, parsing it only if it is not cached."""
+        key = normalize(line)
+        trees = self.trees
+
+        with self.lock:
+            tree = trees.get(key)
+            if tree is not None:
+                trees.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if tree is not None:
+            return unflatten(tree) if self.compact else tree
+
+        if self.stream:
+            tree = parse_stream(self.parser, self.lexer.iter_tokens(key))
+        else:
+            tree = self.parser.parse(self.lexer.tokenize(key))
+        if tree is None:
+            # nothing worth keeping, and None is what a lookup miss returns
+            return tree
+        if self.optimizer is not None:
+            tree = self.optimizer.optimize(tree)
+
+        cached = flatten(tree) if self.compact else tree
+        with self.lock:
+            trees[key] = cached
+            trees.move_to_end(key)
+            if len(trees) > self.maxsize:
+                trees.popitem(last=False)
+                self.evictions += 1
+        return tree
+
+    def clear(self):
+        with self.lock:
+            self.trees.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self.trees)
+
+    def __str__(self):
+        return (
+            f"{len(self.trees)}/{self.maxsize} lines cached, {self.hits} hits, "
+            f"{self.misses} misses ({self.hit_rate:.1%} hit rate), {self.evictions} evictions"
+        )
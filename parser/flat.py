@@ -0,0 +1,153 @@
+"""Flat, array backed encoding of a parsed statement.
+
+A statement is stored in postfix order as two parallel arrays, one opcode byte
+and one operand per node, plus a tuple of the literal values, variable names
+and prompts the operands point into. Compared to a tree of node objects this
+is a few bytes per node, which matters for tools that keep many parsed lines
+in memory.
+
+flatten() and unflatten() are iterative, so they work on trees of any depth.
+"""
+
+from array import array
+
+from parser.parser import (
+    AssignmentNode,
+    BinaryOpNode,
+    FloatNode,
+    InputNode,
+    IntegerNode,
+    PrintNode,
+    UnaryOpNode,
+    VariableAccessNode,
+)
+
+### OPCODES ###
+INTEGER = 0  # operand: index of the value
+FLOAT = 1  # operand: index of the value
+VARIABLE = 2  # operand: index of the name
+BINARY = 3  # operand: index of the operator in OPERATORS
+UNARY = 4  # operand: index of the operator in OPERATORS
+ASSIGN = 5  # operand: index of the name
+PRINT = 6  # operand: index of the name, or NO_VARIABLE
+INPUT = 7  # operand: index of the name, the prompt is the value before it
+PROMPT = 8  # operand: index of the prompt, only ever followed by INPUT
+NONE = 9  # a missing node, which the parser leaves for some invalid lines
+
+OPERATORS = ("+", "-", "*", "/", "%", "**", "==", "!=", "<=", ">=", "<", ">", "&&", "||", "!")
+OPERATOR_INDEX = {op: index for index, op in enumerate(OPERATORS)}
+NO_VARIABLE = 0xFFFFFFFF
+
+
+class FlatStatement:
+    """A statement encoded as opcode and operand arrays."""
+
+    __slots__ = ("opcodes", "operands", "values")
+
+    def __init__(self, opcodes, operands, values):
+        self.opcodes = opcodes  # array("B")
+        self.operands = operands  # array("I")
+        self.values = values  # tuple of literals, names and prompts
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def to_node(self):
+        return unflatten(self)
+
+
+def flatten(node):
+    """Encode a tree as a FlatStatement."""
+    opcodes = array("B")
+    operands = array("I")
+    values = []
+    indexes = {}
+
+    def value_index(value):
+        # the type is part of the key so that 1 and 1.0 stay separate values,
+        # and floats are keyed by their hex so that 0.0 and -0.0 do too
+        key = (float, value.hex()) if isinstance(value, float) else (type(value), value)
+        if key not in indexes:
+            indexes[key] = len(values)
+            values.append(value)
+        return indexes[key]
+
+    # depth first, children before their parent; an entry of (None, op, operand)
+    # emits the parent once its children have been emitted
+    stack = [(node, None, None)]
+    while stack:
+        node, opcode, operand = stack.pop()
+        if opcode is not None:
+            opcodes.append(opcode)
+            operands.append(operand)
+        elif isinstance(node, BinaryOpNode):
+            stack.append((None, BINARY, OPERATOR_INDEX[node.op]))
+            stack.append((node.right, None, None))
+            stack.append((node.left, None, None))
+        elif isinstance(node, UnaryOpNode):
+            stack.append((None, UNARY, OPERATOR_INDEX[node.op]))
+            stack.append((node.node, None, None))
+        elif isinstance(node, IntegerNode):
+            opcodes.append(INTEGER)
+            operands.append(value_index(node.value))
+        elif isinstance(node, FloatNode):
+            opcodes.append(FLOAT)
+            operands.append(value_index(node.value))
+        elif isinstance(node, VariableAccessNode):
+            opcodes.append(VARIABLE)
+            operands.append(value_index(node.variable))
+        elif isinstance(node, AssignmentNode):
+            stack.append((None, ASSIGN, value_index(node.variable)))
+            stack.append((node.value, None, None))
+        elif isinstance(node, PrintNode):
+            variable = NO_VARIABLE if node.variable is None else value_index(node.variable)
+            stack.append((None, PRINT, variable))
+            stack.append((node.value, None, None))
+        elif isinstance(node, InputNode):
+            opcodes.append(PROMPT)
+            operands.append(value_index(node.prompt))
+            opcodes.append(INPUT)
+            operands.append(value_index(node.variable))
+        elif node is None:
+            opcodes.append(NONE)
+            operands.append(0)
+        else:
+            raise Exception(f"Cannot flatten {type(node).__name__}")
+
+    return FlatStatement(opcodes, operands, tuple(values))
+
+
+def unflatten(statement):
+    """Rebuild the tree of a FlatStatement."""
+    values = statement.values
+    stack = []
+    push = stack.append
+    pop = stack.pop
+
+    for opcode, operand in zip(statement.opcodes, statement.operands):
+        if opcode == VARIABLE:
+            push(VariableAccessNode(values[operand]))
+        elif opcode == INTEGER:
+            push(IntegerNode(values[operand]))
+        elif opcode == FLOAT:
+            push(FloatNode(values[operand]))
+        elif opcode == BINARY:
+            right = pop()
+            stack[-1] = BinaryOpNode(stack[-1], OPERATORS[operand], right)
+        elif opcode == UNARY:
+            stack[-1] = UnaryOpNode(OPERATORS[operand], stack[-1])
+        elif opcode == ASSIGN:
+            stack[-1] = AssignmentNode(values[operand], stack[-1])
+        elif opcode == PRINT:
+            variable = None if operand == NO_VARIABLE else values[operand]
+            stack[-1] = PrintNode(stack[-1], variable)
+        elif opcode == PROMPT:
+            push(values[operand])
+        elif opcode == INPUT:
+            stack[-1] = InputNode(values[operand], stack[-1])
+        elif opcode == NONE:
+            push(None)
+        else:
+            raise Exception(f"Invalid flat opcode: {opcode}")
+
+    return stack[-1]
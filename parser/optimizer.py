@@ -0,0 +1,237 @@
+from parser.parser import (
+    AssignmentNode,
+    BinaryOpNode,
+    FloatNode,
+    IntegerNode,
+    PrintNode,
+    UnaryOpNode,
+)
+from evaluator.evaluator import Evaluator
+
+# integer powers are only folded when the result stays below this many bits,
+# so that a line like "9 ** 9 ** 9" cannot hang the optimizer
+MAX_FOLDED_POWER_BITS = 4096
+
+# operators whose result is always 0 or 1
+BOOLEAN_OPERATORS = {"==", "!=", "<=", ">=", "<", ">", "&&", "||"}
+
+
+def count_nodes(node):
+    """Count the nodes of a tree."""
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, BinaryOpNode):
+            stack += (node.left, node.right)
+        elif isinstance(node, UnaryOpNode):
+            stack.append(node.node)
+        elif isinstance(node, (AssignmentNode, PrintNode)):
+            stack.append(node.value)
+    return count
+
+
+def static_type(node, types):
+    """The type an expression has if it evaluates without an error, or None if
+    that is not known before running it. types has the static types of its
+    operands.
+
+    Every operator except ** raises unless both operands have the same type,
+    and returns a value of that type, so one operand of a known type is enough.
+    ** is never known since an int to a negative power is a float."""
+    if isinstance(node, IntegerNode):
+        return int
+    if isinstance(node, FloatNode):
+        return float
+    if isinstance(node, UnaryOpNode):
+        return types.get(node.node)
+    if isinstance(node, BinaryOpNode) and node.op != "**":
+        left = types.get(node.left)
+        right = types.get(node.right)
+        if left is None or right is None or left is right:
+            return left or right
+    return None
+
+
+def is_constant(node):
+    return isinstance(node, (IntegerNode, FloatNode))
+
+
+def is_literal(node, value, type_):
+    return is_constant(node) and type(node.value) is type_ and node.value == value
+
+
+class Optimizer:
+    """Simplifies the trees made by the parser before they are evaluated.
+
+    - constant subtrees are folded into a single IntegerNode or FloatNode
+    - chains of unary - and ! are collapsed
+    - identities like x * 1 and x + 0 are removed where x's type is known to
+      match the literal, so the same type check could never have failed
+
+    Folding runs the real Evaluator on the constant subtree. If that raises,
+    eg. for 1 / 0 or 1 + 2.0, the subtree is left as it is so that the error
+    still happens at run time, in the same order as before.
+
+    optimize() never changes the tree it is given, so it is safe to use on
+    trees that are shared through a ParseCache. Trees are visited with a
+    stack instead of recursion, so a tree of any depth can be optimized."""
+
+    def __init__(self):
+        self.evaluator = Evaluator()
+        self.removed = 0  # nodes removed over every call to optimize()
+        self.folded = 0
+        self.simplified = 0
+
+    def __str__(self):
+        return (
+            f"{self.removed} nodes removed, {self.folded} constants folded, "
+            f"{self.simplified} operations simplified"
+        )
+
+    def optimize(self, node):
+        before = count_nodes(node)
+        node = self.visit(node)
+        self.removed += before - count_nodes(node)
+        return node
+
+    def visit(self, node):
+        """Optimize a tree, every node after its operands."""
+        results = {}  # node -> what it was optimized to
+        types = {}  # optimized node -> its static_type
+        # like ScriptOptimizer.plan, a node is pushed a second time as (node,)
+        # to be optimized once its operands have been
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            kind = type(item)
+
+            if kind is tuple:
+                (item,) = item
+                kind = type(item)
+                if kind is BinaryOpNode:
+                    result = self.visit_BinaryOpNode(item, results[item.left], results[item.right], types)
+                elif kind is UnaryOpNode:
+                    result = self.visit_UnaryOpNode(item, results[item.node])
+                elif kind is AssignmentNode:
+                    result = self.visit_AssignmentNode(item, results[item.value])
+                else:
+                    result = self.visit_PrintNode(item, results[item.value])
+            elif kind is BinaryOpNode:
+                stack += ((item,), item.right, item.left)
+                continue
+            elif kind is UnaryOpNode:
+                stack += ((item,), item.node)
+                continue
+            elif kind is AssignmentNode or kind is PrintNode:
+                stack += ((item,), item.value)
+                continue
+            else:
+                # literals, variables, input and anything the evaluator will reject
+                result = item
+
+            results[item] = result
+            if result not in types:
+                types[result] = static_type(result, types)
+        return results[node]
+
+    def visit_AssignmentNode(self, node, value):
+        if value is node.value:
+            return node
+        return AssignmentNode(node.variable, value)
+
+    def visit_PrintNode(self, node, value):
+        if value is node.value:
+            return node
+        return PrintNode(value, node.variable)
+
+    def visit_UnaryOpNode(self, node, operand):
+
+        if is_constant(operand):
+            folded = self.fold(UnaryOpNode(node.op, operand))
+            if folded is not None:
+                return folded
+
+        if isinstance(operand, UnaryOpNode) and operand.op == node.op:
+            inner = operand.node
+            # -(-x) is x
+            if node.op == "-":
+                self.simplified += 1
+                return inner
+            # !x is already 0 or 1, and !(!b) is b for any b that is 0 or 1
+            if node.op == "!" and (
+                (isinstance(inner, UnaryOpNode) and inner.op == "!")
+                or (isinstance(inner, BinaryOpNode) and inner.op in BOOLEAN_OPERATORS)
+            ):
+                self.simplified += 1
+                return inner
+
+        if operand is node.node:
+            return node
+        return UnaryOpNode(node.op, operand)
+
+    def visit_BinaryOpNode(self, node, left, right, types):
+        if is_constant(left) and is_constant(right) and self.can_fold(node.op, left, right):
+            folded = self.fold(BinaryOpNode(left, node.op, right))
+            if folded is not None:
+                return folded
+
+        simplified = self.simplify(node.op, left, right, types)
+        if simplified is not None:
+            self.simplified += 1
+            return simplified
+
+        if left is node.left and right is node.right:
+            return node
+        return BinaryOpNode(left, node.op, right)
+
+    def can_fold(self, op, left, right):
+        if op != "**" or type(left.value) is not int or type(right.value) is not int:
+            return True
+        if abs(left.value) <= 1 or right.value <= 0:
+            return True
+        return left.value.bit_length() * right.value <= MAX_FOLDED_POWER_BITS
+
+    def fold(self, node):
+        """Evaluate a constant tree, returning the literal node for its value
+        or None if it has to be left for run time."""
+        try:
+            value = self.evaluator.evaluate(node)
+        except Exception:
+            return None
+
+        # a float power can be complex, eg. -8.0 ** 0.5, which SNOL has no literal for
+        if type(value) is int:
+            self.folded += 1
+            return IntegerNode(value)
+        if type(value) is float:
+            self.folded += 1
+            return FloatNode(value)
+        return None
+
+    def simplify(self, op, left, right, types):
+        """Return the operand that an identity reduces to, or None. types has
+        the static types of the operands."""
+        # 0.0 is not the identity of float +, since -0.0 + 0.0 is 0.0
+        match op:
+            case "+":
+                if is_literal(right, 0, int) and types.get(left) is int:
+                    return left
+                if is_literal(left, 0, int) and types.get(right) is int:
+                    return right
+            case "-":
+                for type_ in (int, float):
+                    if is_literal(right, 0, type_) and types.get(left) is type_:
+                        return left
+            case "*":
+                for type_ in (int, float):
+                    if is_literal(right, 1, type_) and types.get(left) is type_:
+                        return left
+                    if is_literal(left, 1, type_) and types.get(right) is type_:
+                        return right
+            case "/" | "**":
+                for type_ in (int, float):
+                    if is_literal(right, 1, type_) and types.get(left) is type_:
+                        return left
+        return None
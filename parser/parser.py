@@ -19,21 +19,29 @@ input := BEG VARIABLE
 from lexer.token import Token
 
 ### NODES ###
+# Nodes use __slots__ rather than a per instance __dict__, long expressions
+# create a lot of them and parsed trees are kept around by caches.
+# See parser/flat.py for an even more compact encoding of a whole statement.
 
 
 class AssignmentNode:
+    __slots__ = ("variable", "value")
+
     def __init__(self, variable, value):
         self.variable = variable
         self.value = value
-        self.type = type(value)
 
 
 class VariableAccessNode:
+    __slots__ = ("variable",)
+
     def __init__(self, variable):
         self.variable = variable
 
 
 class BinaryOpNode:
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -41,22 +49,30 @@ class BinaryOpNode:
 
 
 class UnaryOpNode:
+    __slots__ = ("op", "node")
+
     def __init__(self, op, node):
         self.op = op
         self.node = node
 
 
 class IntegerNode:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
 
 class FloatNode:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
 
 class InputNode:
+    __slots__ = ("variable", "prompt")
+
     def __init__(self, variable, prompt=None):
         self.variable = variable
         if prompt is None:
@@ -66,6 +82,8 @@ class InputNode:
 
 
 class PrintNode:
+    __slots__ = ("variable", "value")
+
     def __init__(self, value, variable=None):
         self.variable = variable
         self.value = value
@@ -75,7 +93,11 @@ class PrintNode:
 
 
 class Parser:
-    """Recursive descent parser"""
+    """Recursive descent parser
+
+    parse() works on a new parser of the same class, which holds the
+    position in the tokens while that line is parsed, so one parser can be
+    shared by any number of threads."""
 
     def __init__(self):
         self.tokens = []
@@ -96,12 +118,10 @@ class Parser:
             )
 
     def parse(self, tokens):
-        self.tokens = tokens
-        self.index = 0
-        self.current_token = (
-            self.tokens[self.index] if self.tokens else Token("EOF", "")
-        )
-        return self.command()
+        parser = type(self)()
+        parser.tokens = tokens
+        parser.current_token = tokens[0] if tokens else Token("EOF", "")
+        return parser.command()
 
     def command(self):
         line_ast = None
@@ -0,0 +1,123 @@
+from parser.parser import (
+    Parser,
+    BinaryOpNode,
+    UnaryOpNode,
+    IntegerNode,
+    FloatNode,
+    VariableAccessNode,
+)
+
+# binding power of each operator token type, higher binds tighter
+# every level is left associative, like the loops in Parser
+LEVELS = {
+    "PRED_1": 1,  # ||
+    "PRED_2": 2,  # &&
+    "PRED_3": 3,  # !
+    "PRED_4": 4,  # ==, !=, <=, >=, <, >
+    "PRED_5": 5,  # +, -
+    "PRED_6": 6,  # *, /, %
+    "PRED_7": 7,  # **
+}
+NOT_LEVEL = 3
+PAREN = 0  # level of the marker left on the operator stack by "("
+
+
+class PrecedenceParser(Parser):
+    """Iterative, table driven version of the expression levels of Parser.
+
+    Parser spends one Python frame per grammar level for every operand and
+    recurses for every parenthesis and unary minus, so long or deeply nested
+    expressions hit the recursion limit. This parser uses an operand stack and
+    an operator stack instead and builds exactly the same tree, including for
+    invalid input, in time linear in the number of tokens.
+
+    Commands (assign, input, print) are still handled by Parser."""
+
+    def or_(self):
+        tokens = self.tokens
+        index = self.index
+        token = self.current_token
+
+        levels = LEVELS
+        operands = []
+        operators = []  # (level, operator) pairs and (PAREN, minus signs) markers
+
+        while True:
+            ### OPERAND ###
+            # count the unary minus signs in front of it, opening a new
+            # subexpression for every parenthesis
+            minus_signs = 0
+            while True:
+                kind = token.type
+                if kind == "INTEGER":
+                    node = IntegerNode(token.value)
+                elif kind == "FLOAT":
+                    node = FloatNode(token.value)
+                elif kind == "LPAREN":
+                    operators.append((PAREN, minus_signs))
+                    minus_signs = 0
+                    index += 1
+                    token = tokens[index]
+                    continue
+                elif token.value == "-":
+                    minus_signs += 1
+                    index += 1
+                    token = tokens[index]
+                    continue
+                elif kind == "VARIABLE":
+                    node = VariableAccessNode(token.value)
+                else:
+                    # not the start of an operand, Parser.factor returns None
+                    # here without moving past the token
+                    node = None
+                    break
+                index += 1
+                token = tokens[index]
+                break
+
+            while minus_signs:
+                node = UnaryOpNode("-", node)
+                minus_signs -= 1
+            operands.append(node)
+
+            ### OPERATOR ###
+            while True:
+                level = levels.get(token.type)
+                if level is not None:
+                    while operators and operators[-1][0] >= level:
+                        self.__reduce(operands, operators)
+                    operators.append((level, token.value))
+                    index += 1
+                    token = tokens[index]
+                    break
+
+                # the (sub)expression ends here
+                while operators and operators[-1][0] != PAREN:
+                    self.__reduce(operands, operators)
+                if not operators:
+                    self.index = index
+                    self.current_token = token
+                    return operands.pop()
+
+                _, minus_signs = operators.pop()
+                # like Parser's __eat, a missing ")" at the end of the line is allowed
+                if token.type == "RPAREN":
+                    index += 1
+                    token = tokens[index]
+                elif token.type != "EOF":
+                    raise Exception(
+                        f"Expected token type RPAREN, but got {token.type}"
+                    )
+                while minus_signs:
+                    operands[-1] = UnaryOpNode("-", operands[-1])
+                    minus_signs -= 1
+
+    @staticmethod
+    def __reduce(operands, operators):
+        level, op = operators.pop()
+        right = operands.pop()
+        if level == NOT_LEVEL:
+            # like Parser.not_, "a ! b" keeps only "!b"
+            operands[-1] = UnaryOpNode(op, right)
+        else:
+            operands[-1] = BinaryOpNode(operands[-1], op, right)
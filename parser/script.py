@@ -0,0 +1,345 @@
+"""Optimizations that need to see a whole script instead of one line.
+
+A script has no branches or loops, so what every statement reads and writes
+is known in the order the statements run. ScriptOptimizer uses that to drop
+statements whose work is never seen and to reuse results that a variable
+still holds.
+
+Only statements and expressions that can never raise are removed or
+replaced. Those are operations on operands that are certain to be defined
+and certain to have the same type, and that are not /, % or ** (which can
+divide by zero, overflow or change type). Everything else, including every
+PRINT and BEG, runs exactly as before, in the same order and with the same
+errors.
+"""
+
+from parser.parser import (
+    AssignmentNode,
+    BinaryOpNode,
+    FloatNode,
+    InputNode,
+    IntegerNode,
+    PrintNode,
+    UnaryOpNode,
+    VariableAccessNode,
+)
+from evaluator.reactive import read_variables
+
+# operators that can fail or change type even on operands of the same type
+UNSAFE_OPERATORS = {"/", "%", "**"}
+
+# the kinds of steps of a plan
+LITERAL = 0
+VARIABLE = 1
+BINARY = 2
+UNARY = 3
+OTHER = 4
+
+# how many removed line numbers str() lists
+SHOWN_LINES = 20
+
+
+class ScriptOptimizer:
+    """Removes dead stores and reuses repeated expressions across a script.
+
+    - a dead store is an assignment that is certain to be overwritten before
+      anything reads it, it is removed
+    - a redundant assignment gives a variable the value it already has, eg.
+      "y = x * 2" twice with x unchanged, it is removed
+    - an expression whose value a variable still holds, eg. "x * 2" after
+      "y = x * 2" with x and y unchanged, is replaced by that variable
+    - an expression statement that can't fail shows nothing, it is removed
+
+    Expressions are compared by value numbering, so "a = b" followed by
+    "a + 1" matches "b + 1". removed has the line number of every statement
+    that was taken out.
+
+    With stop_on_error the script is run fail-fast, so a store is only dead
+    if it is overwritten before any statement that may raise, since the
+    script would stop there with the stored value still in place."""
+
+    def __init__(self, stop_on_error=False):
+        self.stop_on_error = stop_on_error
+        self.dead_stores = 0
+        self.redundant = 0
+        self.unused = 0
+        self.reused = 0
+        self.removed = []  # line numbers
+
+    def __str__(self):
+        lines = ", ".join(str(line_number) for line_number in self.removed[:SHOWN_LINES])
+        if len(self.removed) > SHOWN_LINES:
+            lines += ", ..."
+        report = (
+            f"{self.dead_stores} dead stores, {self.redundant} redundant assignments and "
+            f"{self.unused} unused expressions removed, {self.reused} expressions reused"
+        )
+        return f"{report} (removed lines {lines})" if lines else report
+
+    def optimize(self, statements):
+        """Optimize a script given as a list of (line number, tree), in the
+        order they run. A tree may also be an Exception for a line that failed
+        to parse, which is kept as it is.
+
+        Returns a new list of (line number, tree), the trees it is given are
+        never changed."""
+        statements = self.reuse(statements)
+        kept = self.remove_dead(statements)
+        self.removed.sort()
+        return kept
+
+    ### FORWARD PASS ###
+    def reuse(self, statements):
+        """Number every expression by value, replace the ones a variable
+        already holds and drop redundant assignments.
+
+        Returns (line number, tree, pure) for the statements that are kept,
+        pure telling whether the statement can never raise."""
+        self.numbers = {}  # expression key -> value number
+        self.current = {}  # variable -> value number, for variables certain to be defined
+        self.types = {}  # variable -> int or float, for variables whose type is certain
+        self.holders = {}  # value number -> variable that was assigned it
+        self.plans = {}  # tree -> plan, see plan()
+
+        kept = []
+        for line_number, tree in statements:
+            kind = type(tree)
+            if kind is AssignmentNode:
+                name = tree.variable
+                number, value_type, pure, infos = self.number(tree.value)
+                if pure and self.current.get(name) == number:
+                    self.redundant += 1
+                    self.removed.append(line_number)
+                    continue
+                value = self.rewrite(tree.value, infos)
+                if value is not tree.value:
+                    tree = AssignmentNode(name, value)
+                self.assign(name, number, value_type, pure)
+                kept.append((line_number, tree, pure))
+            elif kind is PrintNode:
+                _, _, pure, infos = self.number(tree.value)
+                value = self.rewrite(tree.value, infos)
+                if value is not tree.value:
+                    tree = PrintNode(value, tree.variable)
+                kept.append((line_number, tree, pure))
+            elif kind is InputNode:
+                # BEG may fail and keep the old value, or read either type
+                if tree.variable in self.current:
+                    self.current[tree.variable] = self.fresh()
+                self.types.pop(tree.variable, None)
+                kept.append((line_number, tree, False))
+            elif kind in (BinaryOpNode, UnaryOpNode, VariableAccessNode, IntegerNode, FloatNode):
+                # an expression on its own line, its value is not shown
+                _, _, pure, infos = self.number(tree)
+                kept.append((line_number, self.rewrite(tree, infos), pure))
+            else:
+                # a line that failed to parse, or that the evaluator rejects
+                kept.append((line_number, tree, False))
+        self.plans.clear()
+        return kept
+
+    def assign(self, name, number, value_type, pure):
+        current = self.current
+        if pure:
+            current[name] = number
+            if value_type is None:
+                self.types.pop(name, None)
+            else:
+                self.types[name] = value_type
+            holder = self.holders.get(number)
+            if holder is None or current.get(holder) != number:
+                self.holders[number] = name
+            return
+
+        # the assignment may fail and keep the old value, or set a new one
+        if name in current:
+            current[name] = self.fresh()
+        if value_type is None or value_type is not self.types.get(name):
+            self.types.pop(name, None)
+
+    def fresh(self):
+        """A value number no expression shares."""
+        number = len(self.numbers)
+        self.numbers[("fresh", number)] = number
+        return number
+
+    def plan(self, node):
+        """The nodes of an expression in postorder, with what number() needs
+        to know about each of them.
+
+        Repeated lines usually share one tree through the ParseCache, so plans
+        are made once per tree and kept until the end of the pass."""
+        plan = self.plans.get(node)
+        if plan is not None:
+            return plan
+
+        nodes = []
+        steps = []
+        index = {}
+        # operator nodes are pushed a second time as (node,) to be planned
+        # after their operands, like in TypeChecker.infer
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            kind = type(item)
+
+            if kind is tuple:
+                (item,) = item
+                if type(item) is BinaryOpNode:
+                    steps.append((BINARY, item.op, index[item.left], index[item.right]))
+                else:
+                    steps.append((UNARY, item.op, index[item.node], None))
+            elif kind is BinaryOpNode:
+                stack += ((item,), item.right, item.left)
+                continue
+            elif kind is UnaryOpNode:
+                stack += ((item,), item.node)
+                continue
+            elif kind is IntegerNode:
+                steps.append((LITERAL, ("int", item.value), int, None))
+            elif kind is FloatNode:
+                # hex tells 0.0 and -0.0 apart
+                steps.append((LITERAL, ("float", item.value.hex()), float, None))
+            elif kind is VariableAccessNode:
+                steps.append((VARIABLE, item.variable, None, None))
+            else:
+                steps.append((OTHER, None, None, None))
+            index[item] = len(nodes)
+            nodes.append(item)
+
+        plan = self.plans[node] = (nodes, steps, index)
+        return plan
+
+    def number(self, node):
+        """Value number an expression and everything in it.
+
+        Returns (value number, type, pure, infos) for the expression, where
+        infos has the (value number, type, pure) of every node of its plan.
+        The value number is None for expressions that are never reused.
+        infos is None when no part of the expression is held by a variable,
+        so that there is nothing to rewrite."""
+        _, steps, _ = self.plan(node)
+        current = self.current
+        types = self.types
+        numbers = self.numbers
+        holders = self.holders
+        infos = []
+        reusable = False
+
+        for code, a, b, c in steps:
+            if code == VARIABLE:
+                number = current.get(a)
+                if number is None:
+                    infos.append((None, None, False))
+                else:
+                    infos.append((number, types.get(a), True))
+                continue
+            if code == LITERAL:
+                key = a
+                value_type = b
+                pure = True
+            elif code == BINARY:
+                left_number, left_type, left_pure = infos[b]
+                right_number, right_type, right_pure = infos[c]
+                same = left_type is not None and left_type is right_type
+                value_type = left_type if same and a != "**" else None
+                pure = left_pure and right_pure and same and a not in UNSAFE_OPERATORS
+                key = (a, left_number, right_number)
+            elif code == UNARY:
+                operand_number, value_type, pure = infos[b]
+                pure = pure and a in ("-", "!")
+                key = (a, operand_number)
+            else:
+                infos.append((None, None, False))
+                continue
+
+            if not pure:
+                infos.append((None, value_type, False))
+                continue
+            number = numbers.get(key)
+            if number is None:
+                number = numbers[key] = len(numbers)
+            elif code != LITERAL:
+                holder = holders.get(number)
+                if holder is not None and current.get(holder) == number:
+                    reusable = True
+            infos.append((number, value_type, True))
+
+        return infos[-1] + (infos if reusable else None,)
+
+    def rewrite(self, node, infos):
+        """Replace the largest expressions that a variable holds with that variable."""
+        if infos is None:
+            return node
+        _, _, index = self.plan(node)
+        current = self.current
+        holders = self.holders
+        results = {}
+
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            kind = type(item)
+
+            if kind is tuple:
+                (item,) = item
+                if type(item) is BinaryOpNode:
+                    left = results[item.left]
+                    right = results[item.right]
+                    if left is item.left and right is item.right:
+                        results[item] = item
+                    else:
+                        results[item] = BinaryOpNode(left, item.op, right)
+                else:
+                    operand = results[item.node]
+                    results[item] = item if operand is item.node else UnaryOpNode(item.op, operand)
+                continue
+
+            if kind is BinaryOpNode or kind is UnaryOpNode:
+                number, _, pure = infos[index[item]]
+                holder = holders.get(number) if pure else None
+                if holder is not None and current.get(holder) == number:
+                    self.reused += 1
+                    results[item] = VariableAccessNode(holder)
+                elif kind is BinaryOpNode:
+                    stack += ((item,), item.right, item.left)
+                else:
+                    stack += ((item,), item.node)
+            else:
+                results[item] = item
+
+        return results[node]
+
+    ### BACKWARD PASS ###
+    def remove_dead(self, statements):
+        """Drop pure statements whose result nothing can see: assignments that
+        are certain to be overwritten before they are read, and expressions."""
+        # variables a later pure assignment overwrites before anything reads them
+        overwritten = set()
+        kept = []
+        for line_number, tree, pure in reversed(statements):
+            kind = type(tree)
+            if pure and kind is AssignmentNode:
+                if tree.variable in overwritten:
+                    self.dead_stores += 1
+                    self.removed.append(line_number)
+                    continue
+                overwritten.add(tree.variable)
+                overwritten.difference_update(read_variables(tree.value))
+            elif pure and kind is not PrintNode:
+                self.unused += 1
+                self.removed.append(line_number)
+                continue
+            elif not pure and self.stop_on_error:
+                # the script may stop here, with every earlier store in place
+                overwritten.clear()
+            elif kind is AssignmentNode or kind is PrintNode:
+                # an assignment that may fail overwrites nothing for certain
+                overwritten.difference_update(read_variables(tree.value))
+            elif kind in (BinaryOpNode, UnaryOpNode, VariableAccessNode):
+                overwritten.difference_update(read_variables(tree))
+            kept.append((line_number, tree))
+
+        kept.reverse()
+        return kept
+
@@ -0,0 +1,51 @@
+class TokenStream:
+    """Lets the parsers read tokens straight from an iterator, such as
+    Lexer.iter_tokens, instead of from a list.
+
+    Both parsers look at most one token past the current one and never go
+    back, so only the token they are at and the next one are kept. Indexing
+    works like on the list from Lexer.tokenize as long as indexes only grow."""
+
+    __slots__ = ("tokens", "window", "start")
+
+    def __init__(self, tokens):
+        self.tokens = iter(tokens)
+        self.window = []  # the tokens read so far from index start on
+        self.start = 0
+
+    def __getitem__(self, index):
+        window = self.window
+        offset = index - self.start
+        if offset < 0:
+            raise IndexError("Tokens before the current one are no longer available")
+        while len(window) <= offset:
+            try:
+                window.append(next(self.tokens))
+            except StopIteration:
+                raise IndexError("list index out of range") from None
+        if offset:
+            # everything before index has been parsed already
+            del window[:offset]
+            self.start = index
+        return window[0]
+
+    def __bool__(self):
+        return True
+
+    def drain(self):
+        """Read the rest of the tokens, which raises if the lexer fails on them."""
+        for _ in self.tokens:
+            pass
+
+
+def parse_stream(parser, tokens):
+    """Parse a line from an iterator of tokens.
+
+    Errors are the same as for parser.parse(list(tokens)): a character the
+    lexer can't read is reported even if the parser fails earlier in the line."""
+    stream = TokenStream(tokens)
+    try:
+        return parser.parse(stream)
+    except Exception:
+        stream.drain()
+        raise
@@ -0,0 +1,152 @@
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from parser.parser import (
+    AssignmentNode,
+    BinaryOpNode,
+    FloatNode,
+    InputNode,
+    IntegerNode,
+    PrintNode,
+    UnaryOpNode,
+    VariableAccessNode,
+)
+from evaluator.closure import MIXED_TYPES_ERROR
+
+# the type of a variable that no statement has assigned yet
+UNDEFINED = object()
+
+
+class TypeChecker:
+    """Infers the type of every expression of a script, statement by statement.
+
+    SNOL has no branches or loops, so the type of every variable is tracked in
+    the order the statements run. A type is int, float or None when it could
+    be either, eg. after BEG, or after an int ** int that may be negative.
+
+    A statement that fails leaves its variable unchanged, so after
+    "x = <expression>" x only keeps the type of the expression if that is the
+    type it already had, or if x was not defined before, or if the expression
+    is a literal that cannot fail. Otherwise its type becomes None.
+
+    Errors that are certain to happen when a statement runs (operands of
+    different types, variables no statement has assigned, missing operands)
+    are added to issues
+    as (line number, message), only the first one of each statement, since
+    that is where running it stops."""
+
+    def __init__(self):
+        self.variables = {}  # variable -> int, float or None
+        self.issues = []
+
+    def check(self, node, line_number=None):
+        """Infer the types of one statement, after the ones checked before it.
+
+        Returns a dict from each expression node of the statement to its type."""
+        types = {}
+        if isinstance(node, AssignmentNode):
+            number = self.infer(node.value, types, line_number)
+            self.assign(node.variable, number, node.value)
+        elif isinstance(node, PrintNode):
+            self.infer(node.value, types, line_number)
+        elif isinstance(node, InputNode):
+            # could read either type, or fail and keep the old value
+            self.variables[node.variable] = None
+        else:
+            self.infer(node, types, line_number)
+        return types
+
+    def assign(self, variable, number, value):
+        old = self.variables.get(variable, UNDEFINED)
+        if old is UNDEFINED or old is number or isinstance(value, (IntegerNode, FloatNode)):
+            self.variables[variable] = number
+        else:
+            self.variables[variable] = None
+
+    def infer(self, node, types, line_number):
+        """Type an expression and everything in it, in evaluation order."""
+        variables = self.variables
+        reported = False
+        # like IterativeEvaluator, an operator node is pushed a second time as
+        # (node,) to be typed after its operands
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+
+            if kind is tuple:
+                (node,) = node
+                if type(node) is BinaryOpNode:
+                    left = types[node.left]
+                    right = types[node.right]
+                    if left is not None and right is not None and left is not right:
+                        if not reported:
+                            reported = True
+                            self.issues.append(
+                                (line_number, f"{MIXED_TYPES_ERROR} ({left.__name__} {node.op} {right.__name__})")
+                            )
+                        types[node] = None
+                    elif node.op == "**":
+                        types[node] = self.power_type(left or right, node.right)
+                    else:
+                        types[node] = left or right
+                else:
+                    # - and ! keep the type of their operand
+                    types[node] = types[node.node]
+            elif kind is BinaryOpNode:
+                stack += ((node,), node.right, node.left)
+            elif kind is UnaryOpNode:
+                stack += ((node,), node.node)
+            elif kind is IntegerNode:
+                types[node] = int
+            elif kind is FloatNode:
+                types[node] = float
+            elif kind is VariableAccessNode:
+                number = variables.get(node.variable, UNDEFINED)
+                if number is UNDEFINED:
+                    if not reported:
+                        reported = True
+                        self.issues.append((line_number, f"Error! [{node.variable}] is not defined!"))
+                    number = None
+                types[node] = number
+            else:
+                # None for a missing operand, which fails as soon as it is reached
+                if not reported:
+                    reported = True
+                    self.issues.append((line_number, f"No evaluation method defined for {kind.__name__}"))
+                types[node] = None
+
+        return types[node]
+
+    def power_type(self, number, exponent):
+        # an int to a negative power is a float, and a negative float to a
+        # fractional power is complex, so only literal exponents are certain
+        if number is int and isinstance(exponent, IntegerNode) and exponent.value >= 0:
+            return int
+        if number is float and isinstance(exponent, FloatNode) and exponent.value.is_integer():
+            return float
+        return None
+
+
+def check_script(lines):
+    """Check a whole script without running it.
+
+    Returns (line number, message) for every line that fails to lex or
+    parse, and for every error the TypeChecker is certain of."""
+    lexer = Lexer()
+    parser = PrecedenceParser()
+    checker = TypeChecker()
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line == "":
+            continue
+        if line == "EXIT!":
+            break
+        try:
+            tree = parser.parse(lexer.tokenize(line))
+        except Exception as e:
+            checker.issues.append((line_number, str(e)))
+            continue
+        checker.check(tree, line_number)
+
+    return checker.issues
@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict
+
+from lexer.lexer import Lexer
+from parser.precedence import PrecedenceParser
+from parser.cache import ParseCache, normalize
+from parser.stream import parse_stream
+from parser.optimizer import Optimizer
+from evaluator.evaluator import Evaluator
+from evaluator.iterative import IterativeEvaluator
+from evaluator.closure import ClosureCompiler, ClosureEvaluator
+from evaluator.bytecode import VirtualMachine
+from evaluator.reactive import ReactiveEvaluator
+from evaluator.typed import TypedEvaluator
+from evaluator.slots import SlotEvaluator
+from evaluator.memo import MemoEvaluator
+from evaluator.transpile import PythonEvaluator
+from evaluator.providers import ConsoleInput
+
+# evaluator backends that can be selected by name
+BACKENDS = {
+    "tree": Evaluator,
+    "iterative": IterativeEvaluator,
+    "closure": ClosureEvaluator,
+    "typed": TypedEvaluator,
+    "slots": SlotEvaluator,
+    "memo": MemoEvaluator,
+    "vm": VirtualMachine,
+    "reactive": ReactiveEvaluator,
+    "python": PythonEvaluator,
+}
+
+
+class Tiers:
+    """Promotes lines that run often from the tree walker to compiled closures.
+
+    Every normalized line counts its runs. Once a line has run threshold
+    times it is compiled with ClosureCompiler, which gives the same results
+    and errors as Evaluator, and later runs call the closure directly,
+    skipping lexing, parsing and tree walking. Lines that run fewer times
+    are never compiled.
+
+    time_saved is the time a line took in the tree walker (its fastest run),
+    minus the time of each compiled run, minus the time spent compiling."""
+
+    def __init__(self, threshold=20, maxsize=1024, io=None):
+        if threshold < 1:
+            raise ValueError("The tier threshold must be at least 1")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.compiler = ClosureCompiler(io)
+        self.runs = OrderedDict()  # line -> [runs, fastest seconds] for lines not compiled yet
+        self.compiled = OrderedDict()  # line -> (closure, seconds in the tree walker)
+        self.promotions = 0
+        self.compiled_runs = 0
+        self.time_saved = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.promotions} lines promoted after {self.threshold} runs, "
+            f"{self.compiled_runs} compiled runs, {self.time_saved * 1000:.1f} ms saved"
+        )
+
+    def count(self, key, tree, seconds):
+        """Record a tree walker run of a line, compiling it once it is hot.
+        Only called for lines that are not compiled yet."""
+        runs = self.runs
+        counter = runs.get(key)
+        if counter is None:
+            counter = runs[key] = [1, seconds]
+            if len(runs) > self.maxsize:
+                runs.popitem(last=False)
+        else:
+            runs.move_to_end(key)
+            counter[0] += 1
+            # the fastest run is the fairest estimate, the first run also
+            # parses the line and early runs are slowed down by cold caches
+            counter[1] = min(counter[1], seconds)
+        if counter[0] < self.threshold:
+            return
+
+        del runs[key]
+        start = time.perf_counter()
+        try:
+            closure = self.compiler.compile(tree)
+        except RecursionError:
+            # too deeply nested to compile, it stays with the tree walker
+            return
+        self.time_saved -= time.perf_counter() - start
+        self.promotions += 1
+        self.compiled[key] = (closure, counter[1])
+        if len(self.compiled) > self.maxsize:
+            self.compiled.popitem(last=False)
+
+
+class Pipeline:
+    """Runs lines of SNOL through one shared lexer, parser and evaluator.
+
+    The REPL and the batch runner both go through this class, so every line
+    of a session reuses the same three objects instead of building new ones.
+
+    Lines are parsed with PrecedenceParser, which builds the same trees as
+    Parser without its recursion limit. The evaluator is either passed in or
+    built from one of the BACKENDS.
+    With a cache_size, parsed lines are kept in a ParseCache so repeated
+    lines are only lexed and parsed once. With optimize, every tree goes
+    through the Optimizer before it is evaluated (and before it is cached).
+    With stream, the parser reads tokens as the lexer produces them instead
+    of from a list, so a huge statement is not held as tokens and as a tree
+    at the same time.
+    With a tier_threshold, lines that have run that many times are compiled
+    to closures by Tiers (the tree backend only).
+    output and input replace the evaluator's console providers, see
+    evaluator.providers. A console input flushes the output before every
+    prompt.
+
+    With a cache, lines are parsed through that ParseCache instead of a new
+    one, with its lexer, parser and optimizer. Lexers, parsers and caches can
+    be shared between threads, so a threaded program can parse every line
+    once for all of its pipelines while each thread runs its own pipeline
+    with its own evaluator."""
+
+    def __init__(
+        self,
+        evaluator=None,
+        backend="tree",
+        cache_size=0,
+        optimize=False,
+        stream=False,
+        tier_threshold=0,
+        output=None,
+        input=None,
+        cache=None,
+    ):
+        if evaluator is None:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown backend: {backend}")
+            evaluator = BACKENDS[backend]()
+        if output is not None:
+            evaluator.output = output
+        if input is not None:
+            evaluator.input = input
+        if isinstance(evaluator.input, ConsoleInput) and evaluator.input.output is None:
+            evaluator.input.output = evaluator.output
+
+        self.evaluator = evaluator
+        self.stream = stream
+        if cache is None:
+            self.lexer = Lexer()
+            self.parser = PrecedenceParser()
+            self.optimizer = Optimizer() if optimize else None
+            if cache_size:
+                cache = ParseCache(
+                    cache_size, self.lexer, self.parser, self.optimizer, stream=stream
+                )
+        else:
+            self.lexer = cache.lexer
+            self.parser = cache.parser
+            self.optimizer = cache.optimizer
+        self.cache = cache
+        self.tiers = None
+        if tier_threshold:
+            # closures only match the plain tree walker, not its subclasses
+            if type(evaluator) is not Evaluator:
+                raise ValueError("Tiered execution needs the tree backend")
+            self.tiers = Tiers(tier_threshold, io=evaluator)
+
+    def compile(self, line):
+        """Lex and parse a line, returning its AST."""
+        if self.cache is not None:
+            return self.cache.parse(line)
+        if self.stream:
+            tree = parse_stream(self.parser, self.lexer.iter_tokens(line))
+        else:
+            tree = self.parser.parse(self.lexer.tokenize(line))
+        if self.optimizer is not None:
+            tree = self.optimizer.optimize(tree)
+        return tree
+
+    def execute(self, line):
+        """Compile a line and evaluate it, returning the result."""
+        tiers = self.tiers
+        if tiers is None:
+            return self.evaluator.evaluate(self.compile(line))
+
+        key = normalize(line)
+        clock = time.perf_counter
+        compiled = tiers.compiled.get(key)
+        if compiled is not None:
+            closure, tree_seconds = compiled
+            tiers.compiled.move_to_end(key)
+            tiers.compiled_runs += 1
+            start = clock()
+            try:
+                return closure(self.evaluator.environment)
+            finally:
+                tiers.time_saved += tree_seconds - (clock() - start)
+
+        start = clock()
+        tree = self.compile(line)
+        try:
+            return self.evaluator.evaluate(tree)
+        finally:
+            tiers.count(key, tree, clock() - start)
@@ -0,0 +1,150 @@
+"""Opt-in profiling of where a SNOL session spends its time.
+
+A Profiler attaches to a Pipeline by shadowing a few of its methods with
+timing wrappers on the instances themselves: Lexer.tokenize, Parser.parse,
+Optimizer.optimize and the evaluator's evaluate, binary_operation and
+unary_operation. Detaching deletes the wrappers again, so a pipeline that is
+not being profiled runs exactly the code it always did.
+
+Evaluator.evaluate is the single dispatch point for every node, so wrapping
+it times every evaluate_* method of the tree walker. The closure backend
+compiles whole statements, so for it only the stages are timed, and scripts
+run from bytecode by the vm backend are not profiled at all.
+"""
+
+import json
+import time
+
+# counter groups, in the order they are reported
+GROUPS = ["stage", "node", "operator"]
+
+
+class Profiler:
+    """Counts calls and wall time per pipeline stage, per node type and per operator.
+
+    Stages are lex, parse, optimize and evaluate (whole statements). The time
+    of a node does not include the nodes below it, so the node times add up to
+    the evaluate stage instead of counting nested nodes twice."""
+
+    def __init__(self):
+        self.counters = {}  # (group, name) -> [calls, seconds]
+        self.pipeline = None
+        self.children = []  # time spent in child nodes, one entry per evaluate on the stack
+
+    def add(self, group, name, seconds):
+        counter = self.counters.get((group, name))
+        if counter is None:
+            counter = self.counters[(group, name)] = [0, 0.0]
+        counter[0] += 1
+        counter[1] += seconds
+
+    def reset(self):
+        self.counters.clear()
+
+    ### ATTACHING ###
+    def attach(self, pipeline):
+        """Start profiling everything that goes through a pipeline."""
+        if self.pipeline is not None:
+            self.detach()
+        self.pipeline = pipeline
+        self.children = []
+
+        pipeline.lexer.tokenize = self.timed("lex", pipeline.lexer.tokenize)
+        pipeline.parser.parse = self.timed("parse", pipeline.parser.parse)
+        if pipeline.optimizer is not None:
+            pipeline.optimizer.optimize = self.timed("optimize", pipeline.optimizer.optimize)
+
+        evaluator = pipeline.evaluator
+        evaluator.evaluate = self.timed_evaluate(evaluator.evaluate)
+        if hasattr(evaluator, "binary_operation"):
+            evaluator.binary_operation = self.timed_operator(evaluator.binary_operation)
+            evaluator.unary_operation = self.timed_operator(evaluator.unary_operation)
+
+    def detach(self):
+        """Stop profiling, putting the pipeline's own methods back."""
+        pipeline = self.pipeline
+        if pipeline is None:
+            return
+        objects = [pipeline.lexer, pipeline.parser, pipeline.optimizer, pipeline.evaluator]
+        names = ["tokenize", "parse", "optimize", "evaluate", "binary_operation", "unary_operation"]
+        for instance in objects:
+            for name in names:
+                # only the wrappers live on the instance, the originals are on the class
+                if instance is not None and name in vars(instance):
+                    delattr(instance, name)
+        self.pipeline = None
+
+    @property
+    def enabled(self):
+        return self.pipeline is not None
+
+    ### WRAPPERS ###
+    def timed(self, name, method):
+        add = self.add
+        clock = time.perf_counter
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return method(*args)
+            finally:
+                add("stage", name, clock() - start)
+
+        return wrapper
+
+    def timed_evaluate(self, evaluate):
+        add = self.add
+        clock = time.perf_counter
+        children = self.children
+
+        def wrapper(node):
+            children.append(0.0)
+            start = clock()
+            try:
+                return evaluate(node)
+            finally:
+                seconds = clock() - start
+                add("node", type(node).__name__, seconds - children.pop())
+                if children:
+                    children[-1] += seconds
+                else:
+                    # a whole statement, called by the REPL or the runner
+                    add("stage", "evaluate", seconds)
+
+        return wrapper
+
+    def timed_operator(self, operation):
+        add = self.add
+        clock = time.perf_counter
+
+        def wrapper(op, *operands):
+            start = clock()
+            try:
+                return operation(op, *operands)
+            finally:
+                add("operator", op if len(operands) == 2 else f"unary {op}", clock() - start)
+
+        return wrapper
+
+    ### REPORTING ###
+    def as_dict(self):
+        """The counters grouped as {group: {name: {"calls": ..., "seconds": ...}}}."""
+        report = {group: {} for group in GROUPS}
+        for (group, name), (calls, seconds) in sorted(self.counters.items()):
+            report[group][name] = {"calls": calls, "seconds": seconds}
+        return report
+
+    def write_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.as_dict(), file, indent=2)
+
+    def __str__(self):
+        lines = []
+        for group, entries in self.as_dict().items():
+            if not entries:
+                continue
+            lines.append(f"{group:<22}{'calls':>10}{'ms':>12}")
+            # slowest first
+            for name, entry in sorted(entries.items(), key=lambda item: -item[1]["seconds"]):
+                lines.append(f"  {name:<20}{entry['calls']:>10}{entry['seconds'] * 1000:>12.3f}")
+        return "\n".join(lines) if lines else "nothing profiled yet"
@@ -1,6 +1,6 @@
-from lexer.lexer import Lexer
-from parser.parser import Parser
-from evaluator.evaluator import Evaluator
+import snapshot
+from pipeline import Pipeline
+from profiler import Profiler
 
 # readline is a library that allows us to use the arrow keys to navigate through the command history
 # if readline is not available (non unix systems), we create a dummy class to avoid errors
@@ -22,10 +22,47 @@ except ImportError:
             pass
     readline = Readline()
 
-def main():
-    lexer = Lexer()
-    parser = Parser()
-    evaluator = Evaluator()
+def meta_command(line, pipeline, profiler):
+    """Handle the REPL's own commands, which start with ":"
+
+    - :vars shows every variable and its value
+    - :profile turns profiling on or off
+    - :stats shows what has been profiled so far
+    - :stats reset clears it and :stats save FILE writes it as JSON
+    - :save FILE writes the variables and parsed lines to a snapshot and
+      :load FILE replaces the variables with the ones in a snapshot"""
+    command, *args = line[1:].split() or [""]
+    if command == "vars":
+        for variable, value in pipeline.evaluator.environment.items():
+            print(f"SNOL :> [{variable}] = {value}")
+    elif command == "profile":
+        if profiler.enabled:
+            profiler.detach()
+            print("SNOL :> Profiling is off")
+        else:
+            profiler.attach(pipeline)
+            print("SNOL :> Profiling is on, :stats shows the results")
+    elif command == "stats" and not args:
+        print(profiler)
+    elif command == "stats" and args == ["reset"]:
+        profiler.reset()
+    elif command == "stats" and len(args) == 2 and args[0] == "save":
+        profiler.write_json(args[1])
+        print(f"SNOL :> Saved profile to {args[1]}")
+    elif command == "save" and len(args) == 1:
+        variables, statements = snapshot.save(args[0], pipeline.evaluator, pipeline.cache)
+        print(f"SNOL :> Saved {variables} variables and {statements} parsed lines to {args[0]}")
+    elif command == "load" and len(args) == 1:
+        variables, statements = snapshot.load(args[0], pipeline.evaluator, pipeline.cache)
+        print(f"SNOL :> Loaded {variables} variables and {statements} parsed lines from {args[0]}")
+    else:
+        print(f"SNOL :> Unknown command {line}")
+
+
+def main(backend="tree"):
+    # commands are often repeated, keep their parsed form around
+    pipeline = Pipeline(backend=backend, cache_size=256)
+    profiler = Profiler()
 
     print(
         "The SNOL environment is now active, you may proceed with giving your commands."
@@ -38,10 +75,11 @@ def main():
                 break
             if line.strip() == "":
                 continue
+            if line.startswith(":"):
+                meta_command(line, pipeline, profiler)
+                continue
 
-            tokens = lexer.tokenize(line)
-            ast = parser.parse(tokens)
-            result = evaluator.evaluate(ast)
+            result = pipeline.execute(line)
 
             # uncomment out to make a REPL
             # print(f"SNOL :> {result}")
@@ -0,0 +1,385 @@
+import sys
+import time
+
+from pipeline import Pipeline
+from profiler import Profiler
+from parser.typecheck import check_script
+from parser.script import ScriptOptimizer
+from evaluator.budget import BudgetEvaluator
+from evaluator.memo import MemoEvaluator
+from evaluator.reactive import ReactiveEvaluator
+from evaluator.bytecode import VirtualMachine, load_program
+from evaluator.transpile import PythonEvaluator, load_transpiled, transpile_script, transpile_statements
+from evaluator.providers import BufferedOutput, FileInput
+
+# lines of script output written to stdout at once
+OUTPUT_BUFFER_LINES = 1024
+# size of the chunks scripts are read in
+INPUT_BUFFER_SIZE = 1 << 16
+
+
+class ScriptError(Exception):
+    """Raised by a fail-fast run when a line of the script fails."""
+
+    def __init__(self, line_number, error):
+        super().__init__(f"Error on line {line_number}: {error}")
+        self.line_number = line_number
+        self.error = error
+
+
+class RunStats:
+    """Counters collected while running a script."""
+
+    def __init__(self):
+        self.lines = 0  # lines read, including blank ones
+        self.statements = 0  # lines that were executed
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def lines_per_second(self):
+        return self.lines / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.lines} lines, {self.statements} statements, {self.errors} errors "
+            f"in {self.elapsed:.3f}s ({self.lines_per_second:.0f} lines/sec)"
+        )
+
+
+class Runner:
+    """Runs whole SNOL scripts without the interactive prompt.
+
+    on_error decides what happens when a line fails:
+    - "continue" prints the error the same way the REPL does and moves on
+    - "stop" raises a ScriptError for the first failing line
+
+    Errors are written to the evaluator's output provider, between the lines
+    PRINT writes there, and the output is flushed when a run ends.
+
+    With optimize_script, the whole script is read and parsed first and goes
+    through a ScriptOptimizer before any of it runs. It can't be used with a
+    ReactiveEvaluator, where a reused expression would follow the variable it
+    was taken from, or a BudgetEvaluator, where a removed store may have been
+    the one to exceed a budget.
+
+    With the "python" backend the whole script is transpiled to one Python
+    function before any of it runs, see evaluator.transpile."""
+
+    def __init__(self, pipeline=None, on_error="continue", optimize_script=False):
+        if on_error not in ("continue", "stop"):
+            raise ValueError(f"Unknown error policy: {on_error}")
+        self.pipeline = pipeline if pipeline is not None else Pipeline()
+        self.on_error = on_error
+        self.script_optimizer = None
+        if optimize_script:
+            if isinstance(self.pipeline.evaluator, (ReactiveEvaluator, BudgetEvaluator)):
+                raise ValueError("The script optimizer can't be used with reactive or budget evaluators")
+            self.script_optimizer = ScriptOptimizer(stop_on_error=on_error == "stop")
+
+    def run(self, lines):
+        """Execute an iterable of lines (a file, stdin or a list) and return its RunStats."""
+        if self.script_optimizer is not None:
+            return self.run_optimized(lines)
+        evaluator = self.pipeline.evaluator
+        if isinstance(evaluator, PythonEvaluator):
+            start = time.perf_counter()
+            program = transpile_script(lines, self.pipeline.optimizer, evaluator.environment)
+            load_time = time.perf_counter() - start
+
+            stats = self.run_transpiled(program)
+            stats.elapsed += load_time
+            return stats
+
+        stats = RunStats()
+        execute = self.pipeline.execute
+        output = self.pipeline.evaluator.output
+        fail_fast = self.on_error == "stop"
+
+        start = time.perf_counter()
+        try:
+            for line in lines:
+                stats.lines += 1
+                line = line.strip()
+                if line == "":
+                    continue
+                if line == "EXIT!":
+                    break
+
+                stats.statements += 1
+                try:
+                    execute(line)
+                except Exception as e:
+                    stats.errors += 1
+                    if fail_fast:
+                        raise ScriptError(stats.lines, e) from e
+                    output.write(f"SNOL :> {e}")
+        finally:
+            output.flush()
+            stats.elapsed = time.perf_counter() - start
+
+        return stats
+
+    def run_optimized(self, lines):
+        """Read and parse every line, optimize the script as a whole and then
+        run it. Errors keep the line numbers of the original script."""
+        stats = RunStats()
+        compile = self.pipeline.compile
+        evaluator = self.pipeline.evaluator
+        output = evaluator.output
+        fail_fast = self.on_error == "stop"
+
+        start = time.perf_counter()
+        try:
+            statements = []
+            for line in lines:
+                stats.lines += 1
+                line = line.strip()
+                if line == "":
+                    continue
+                if line == "EXIT!":
+                    break
+                try:
+                    tree = compile(line)
+                except Exception as e:
+                    # raised again when the line's turn comes
+                    tree = e
+                statements.append((stats.lines, tree))
+            statements = self.script_optimizer.optimize(statements)
+
+            if isinstance(evaluator, PythonEvaluator):
+                program = transpile_statements(statements, stats.lines, evaluator.environment)
+                transpiled = self.run_transpiled(program)
+                stats.statements = transpiled.statements
+                stats.errors = transpiled.errors
+                stats.lines = transpiled.lines
+                return stats
+
+            for line_number, tree in statements:
+                stats.statements += 1
+                try:
+                    if isinstance(tree, Exception):
+                        raise tree
+                    evaluator.evaluate(tree)
+                except Exception as e:
+                    stats.errors += 1
+                    if fail_fast:
+                        stats.lines = line_number
+                        raise ScriptError(line_number, e) from e
+                    output.write(f"SNOL :> {e}")
+        finally:
+            output.flush()
+            stats.elapsed = time.perf_counter() - start
+
+        return stats
+
+    def run_file(self, path):
+        """Stream a script from disk, one line at a time.
+
+        With the "vm" backend the script is loaded from (or compiled into) its
+        .snolc file instead, so an unchanged script is never lexed or parsed
+        twice. The "python" backend does the same with its .snolpyc file."""
+        if isinstance(self.pipeline.evaluator, VirtualMachine) and self.script_optimizer is None:
+            start = time.perf_counter()
+            program = load_program(path, self.pipeline.optimizer)
+            load_time = time.perf_counter() - start
+
+            stats = self.run_program(program)
+            stats.elapsed += load_time
+            return stats
+
+        evaluator = self.pipeline.evaluator
+        # a cached script is compiled for an empty environment
+        if isinstance(evaluator, PythonEvaluator) and self.script_optimizer is None and not evaluator.environment:
+            start = time.perf_counter()
+            program = load_transpiled(path, self.pipeline.optimizer)
+            load_time = time.perf_counter() - start
+
+            stats = self.run_transpiled(program)
+            stats.elapsed += load_time
+            return stats
+
+        # only one line at a time is held in memory, however large the file
+        with open(path, encoding="utf-8", buffering=INPUT_BUFFER_SIZE) as file:
+            return self.run(file)
+
+    def run_program(self, program):
+        """Execute a compiled bytecode Program on the pipeline's VirtualMachine."""
+        stats = RunStats()
+        execute = self.pipeline.evaluator.execute
+        output = self.pipeline.evaluator.output
+        consts = program.consts
+        names = program.names
+        fail_fast = self.on_error == "stop"
+
+        start = time.perf_counter()
+        try:
+            for line_number, code in program.statements:
+                stats.statements += 1
+                try:
+                    execute(code, consts, names)
+                except Exception as e:
+                    stats.errors += 1
+                    if fail_fast:
+                        stats.lines = line_number
+                        raise ScriptError(line_number, e) from e
+                    output.write(f"SNOL :> {e}")
+            stats.lines = program.line_count
+        finally:
+            output.flush()
+            stats.elapsed = time.perf_counter() - start
+
+        return stats
+
+    def run_transpiled(self, program):
+        """Execute a PythonProgram on the pipeline's PythonEvaluator."""
+        stats = RunStats()
+        evaluator = self.pipeline.evaluator
+        output = evaluator.output
+        fail_fast = self.on_error == "stop"
+
+        def error(line_number, e):
+            stats.errors += 1
+            if fail_fast:
+                stats.lines = line_number
+                stats.statements = program.statements_before(line_number)
+                raise ScriptError(line_number, e) from e
+            output.write(f"SNOL :> {e}")
+
+        stats.lines = program.line_count
+        stats.statements = len(program.line_numbers)
+        start = time.perf_counter()
+        try:
+            program.run(evaluator.environment, output, evaluator.input, error)
+        finally:
+            output.flush()
+            stats.elapsed = time.perf_counter() - start
+
+        return stats
+
+
+def script_pipeline(
+    backend="tree",
+    cache_size=0,
+    optimize=False,
+    stream=False,
+    tier_threshold=0,
+    max_steps=None,
+    max_int_bits=None,
+    statement_time_limit=None,
+    input_path=None,
+    output=None,
+    input=None,
+    cache=None,
+):
+    """The Pipeline a script runs on, with the options of run_script.
+
+    The parallel workers build one for every script, with the parse cache of
+    the first one. input is used when there is no input_path."""
+    evaluator = None
+    limits = (max_steps, max_int_bits, statement_time_limit)
+    if any(limit is not None for limit in limits):
+        if backend != "tree":
+            raise ValueError("Budgets need the tree backend")
+        evaluator = BudgetEvaluator(*limits)
+    return Pipeline(
+        evaluator,
+        backend=backend,
+        cache_size=cache_size,
+        optimize=optimize,
+        stream=stream,
+        tier_threshold=tier_threshold,
+        output=output,
+        input=FileInput(input_path) if input_path is not None else input,
+        cache=cache,
+    )
+
+
+def run_script(
+    path,
+    on_error="continue",
+    report=True,
+    backend="tree",
+    cache_size=0,
+    optimize=False,
+    profile=None,
+    stream=False,
+    tier_threshold=0,
+    max_steps=None,
+    max_int_bits=None,
+    statement_time_limit=None,
+    input_path=None,
+    optimize_script=False,
+):
+    """Run a script file ("-" for stdin) with buffered output.
+
+    With profile, the time spent in every stage, node type and operator is
+    written to that file as JSON (and shown on stderr with report).
+    max_steps, max_int_bits and statement_time_limit run the script on a
+    BudgetEvaluator with those limits (the tree backend only).
+    With input_path, BEG reads its values from that file instead of stdin.
+    With optimize_script, the whole script goes through a ScriptOptimizer
+    before it runs.
+    Returns the exit status to use for the process."""
+    pipeline = script_pipeline(
+        backend,
+        cache_size,
+        optimize,
+        stream,
+        tier_threshold,
+        max_steps,
+        max_int_bits,
+        statement_time_limit,
+        input_path,
+        # PRINT on a terminal would flush every line, write in batches instead
+        output=BufferedOutput(max_lines=OUTPUT_BUFFER_LINES),
+    )
+    runner = Runner(pipeline, on_error=on_error, optimize_script=optimize_script)
+    profiler = None
+    if profile is not None:
+        profiler = Profiler()
+        profiler.attach(pipeline)
+
+    try:
+        if path == "-":
+            stats = runner.run(sys.stdin)
+        else:
+            stats = runner.run_file(path)
+    except ScriptError as e:
+        print(f"SNOL :> {e}", file=sys.stderr)
+        return 1
+    finally:
+        if profiler is not None:
+            profiler.detach()
+            profiler.write_json(profile)
+
+    if report:
+        print(f"SNOL :> {stats}", file=sys.stderr)
+        if pipeline.cache is not None:
+            print(f"SNOL :> parse cache: {pipeline.cache}", file=sys.stderr)
+        if pipeline.optimizer is not None:
+            print(f"SNOL :> optimizer: {pipeline.optimizer}", file=sys.stderr)
+        if runner.script_optimizer is not None:
+            print(f"SNOL :> script optimizer: {runner.script_optimizer}", file=sys.stderr)
+        if pipeline.tiers is not None:
+            print(f"SNOL :> tiers: {pipeline.tiers}", file=sys.stderr)
+        if isinstance(pipeline.evaluator, MemoEvaluator):
+            print(f"SNOL :> memo: {pipeline.evaluator}", file=sys.stderr)
+        if profiler is not None:
+            print(profiler, file=sys.stderr)
+    return 1 if stats.errors else 0
+
+
+def check_file(path):
+    """Report the errors a script is certain to hit, without running it.
+
+    Returns the exit status to use for the process."""
+    if path == "-":
+        issues = check_script(sys.stdin)
+    else:
+        with open(path, encoding="utf-8", buffering=INPUT_BUFFER_SIZE) as file:
+            issues = check_script(file)
+
+    for line_number, message in issues:
+        print(f"SNOL :> Line {line_number}: {message}")
+    return 1 if issues else 0
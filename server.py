@@ -0,0 +1,164 @@
+"""asyncio server that hosts many independent SNOL sessions in one process.
+
+Every connection is a session with its own variables. Clients send one
+command per line and may send many lines without waiting for the replies,
+which come back in order. BEG asks the client for the value on the same
+connection instead of reading the server's stdin.
+"""
+
+import asyncio
+
+from parser.cache import ParseCache
+from parser.parser import InputNode
+from evaluator.budget import BudgetEvaluator
+from evaluator.providers import ListOutput, parse_number
+
+WELCOME = "The SNOL environment is now active, you may proceed with giving your commands."
+GOODBYE = "Evaluator is now terminated..."
+
+# bytes a line sent by a client may have, asyncio's own default is 64 KiB
+MAX_LINE_LENGTH = 1 << 20
+
+
+class SessionEvaluator(BudgetEvaluator):
+    """Evaluator that collects PRINT output for its connection instead of
+    writing it to the server's stdout, and stops statements that go over the
+    server's budget so one session can't starve the others."""
+
+    def __init__(self, **limits):
+        super().__init__(**limits)
+        self.output = ListOutput()
+
+
+class SnolServer:
+    """Serves SNOL sessions over TCP or a Unix socket.
+
+    - max_sessions caps how many sessions are open at once, further
+      connections are told to try again later and closed
+    - idle_timeout closes a session that sends nothing for that many seconds
+    - max_steps, max_int_bits and time_limit are the BudgetEvaluator limits
+      of every statement, None turns a limit off
+    - max_line_length is the most bytes a line may have, a session that sends
+      a longer one is told so and closed, since the rest of the line can't
+      be told apart from the commands after it
+
+    The parse cache is shared by every session, since parsing does not depend
+    on a session's variables."""
+
+    def __init__(
+        self,
+        max_sessions=100,
+        idle_timeout=300.0,
+        cache_size=1024,
+        max_steps=1_000_000,
+        max_int_bits=1 << 16,
+        time_limit=1.0,
+        max_line_length=MAX_LINE_LENGTH,
+    ):
+        self.max_sessions = max_sessions
+        self.max_line_length = max_line_length
+        self.idle_timeout = idle_timeout
+        self.limits = {"max_steps": max_steps, "max_int_bits": max_int_bits, "time_limit": time_limit}
+        self.cache = ParseCache(cache_size)
+        self.sessions = 0  # sessions currently open
+        self.total_sessions = 0
+
+    async def start(self, host="127.0.0.1", port=7878, path=None):
+        """Start listening, on a Unix socket if a path is given. Returns the asyncio.Server."""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path, limit=self.max_line_length)
+        return await asyncio.start_server(self.handle, host, port, limit=self.max_line_length)
+
+    async def handle(self, reader, writer):
+        if self.sessions >= self.max_sessions:
+            writer.write(b"SNOL :> Too many sessions are open, try again later\n")
+            await self.close(writer)
+            return
+
+        self.sessions += 1
+        self.total_sessions += 1
+        try:
+            await self.session(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.sessions -= 1
+            await self.close(writer)
+
+    async def session(self, reader, writer):
+        evaluator = SessionEvaluator(**self.limits)
+        output = evaluator.output.lines
+        send(writer, [WELCOME])
+
+        while True:
+            line = await self.readline(reader, writer)
+            if line is None:
+                return
+
+            line = line.strip()
+            if line == "EXIT!":
+                send(writer, [GOODBYE])
+                await writer.drain()
+                return
+            if line == "":
+                continue
+
+            try:
+                tree = self.cache.parse(line)
+                if isinstance(tree, InputNode):
+                    writer.write(tree.prompt.encode())
+                    value = await self.readline(reader, writer)
+                    if value is None:
+                        return
+                    evaluator.environment[tree.variable] = parse_number(value.rstrip("\r\n"))
+                else:
+                    evaluator.evaluate(tree)
+            except Exception as e:
+                output.append(f"SNOL :> {e}")
+
+            if output:
+                send(writer, output)
+                output.clear()
+            # only waits when the client is not reading its replies fast enough
+            await writer.drain()
+
+    async def readline(self, reader, writer):
+        """Read a line from the client, or return None once it has gone away,
+        has been idle for too long or has sent a line that is too long."""
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            send(writer, ["SNOL :> Session closed after being idle for too long"])
+            return None
+        except ValueError:
+            # raised by readline for a line over the reader's limit
+            send(writer, [f"SNOL :> Error! Line is longer than {self.max_line_length} bytes, session closed"])
+            return None
+        if not line:
+            return None
+        return line.decode("utf-8", errors="replace")
+
+    async def close(self, writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def send(writer, lines):
+    writer.write(("\n".join(lines) + "\n").encode())
+
+
+def serve(host="127.0.0.1", port=7878, path=None, **options):
+    """Run a SnolServer until interrupted."""
+
+    async def main():
+        server = await SnolServer(**options).start(host, port, path)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,183 @@
+"""Saving a session's variables to a compact binary file and loading them back.
+
+A snapshot holds the variables of an evaluator and, optionally, the lines of
+a ParseCache so that a restored session does not parse them again. The
+layout, all little endian, is:
+
+    header      MAGIC, VERSION and the counts of variables, int64 values,
+                float values and ints that do not fit in 64 bits
+    names       every variable name, utf-8, separated by newlines, in the
+                order they were defined
+    kinds       one byte per variable: INT, FLOAT or BIG_INT
+    ints        the int64 values, in order
+    floats      the float64 values, in order
+    big ints    the larger ints, marshalled
+    statements  the cached lines as (line, opcodes, operands, values) tuples
+                of their FlatStatements, marshalled, oldest first
+
+Every section after the header starts with its size in bytes, except ints
+and floats whose sizes follow from the counts. Values are loaded with
+array.frombytes, so a session with a million variables loads in a fraction
+of a second.
+"""
+
+import marshal
+import struct
+import sys
+from array import array
+
+from parser.flat import FlatStatement, flatten, unflatten
+
+MAGIC = b"SNOLSNAP"
+VERSION = 1
+
+# the kinds of variables
+INT = 0
+FLOAT = 1
+BIG_INT = 2
+
+HEADER = struct.Struct("<8sHQQQQ")
+SIZE = struct.Struct("<Q")
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+
+def save(path, evaluator, cache=None):
+    """Write the variables of an evaluator, and the lines of a ParseCache if
+    one is given, to path. Returns (variables, statements) saved."""
+    names = []
+    kinds = array("B")
+    ints = array("q")
+    floats = array("d")
+    big_ints = []
+
+    for name, value in evaluator.environment.items():
+        kind = type(value)
+        if kind is int:
+            if INT64_MIN <= value <= INT64_MAX:
+                ints.append(value)
+                kinds.append(INT)
+            else:
+                big_ints.append(value)
+                kinds.append(BIG_INT)
+        elif kind is float:
+            floats.append(value)
+            kinds.append(FLOAT)
+        else:
+            raise Exception(f"Error! [{name}] is a {kind.__name__}, only numbers can be saved!")
+        names.append(name)
+
+    statements = []
+    if cache is not None:
+        for line, tree in cache.trees.items():
+            flat = tree if cache.compact else flatten(tree)
+            statements.append((line, flat.opcodes.tobytes(), little_endian(flat.operands), flat.values))
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(names), len(ints), len(floats), len(big_ints)))
+        write_section(file, "\n".join(names).encode())
+        write_section(file, kinds.tobytes())
+        file.write(little_endian(ints))
+        file.write(little_endian(floats))
+        write_section(file, marshal.dumps(big_ints))
+        write_section(file, marshal.dumps(statements))
+
+    return len(names), len(statements)
+
+
+def load(path, evaluator, cache=None):
+    """Replace the variables of an evaluator with the ones saved in path, and
+    add the saved lines to a ParseCache if one is given.
+    Returns (variables, statements) loaded."""
+    with open(path, "rb") as file:
+        data = memoryview(file.read())
+
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise Exception(f"Error! {path} is not a SNOL snapshot!")
+    _, version, count, int_count, float_count, big_count = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise Exception(f"Error! {path} is a version {version} snapshot, only version {VERSION} can be loaded!")
+
+    try:
+        offset = HEADER.size
+        names, offset = read_section(data, offset)
+        names = bytes(names).decode().split("\n") if count else []
+        kinds, offset = read_section(data, offset)
+        ints, offset = read_array("q", data, offset, int_count)
+        floats, offset = read_array("d", data, offset, float_count)
+        big_ints, offset = read_section(data, offset)
+        big_ints = marshal.loads(big_ints)
+        statements, offset = read_section(data, offset)
+        statements = marshal.loads(statements)
+        if len(names) != count or len(kinds) != count or len(big_ints) != big_count:
+            raise ValueError("Counts do not match the header")
+
+        if int_count == count:
+            # the usual case, and the fastest
+            variables = dict(zip(names, ints.tolist()))
+        else:
+            values = (iter(ints.tolist()), iter(floats.tolist()), iter(big_ints))
+            variables = {name: next(values[kind]) for name, kind in zip(names, kinds)}
+
+        # every statement is rebuilt before anything is replaced, so that a
+        # damaged one leaves the session as it was
+        trees = []
+        if cache is not None:
+            # the newest lines were saved last, only keep as many as fit
+            for line, opcodes, operands, values in statements[-cache.maxsize:]:
+                flat = FlatStatement(array("B", opcodes), read_array("I", operands, 0, None)[0], values)
+                tree = unflatten(flat)
+                trees.append((line, flat if cache.compact else tree))
+    except Exception:
+        # anything from a short section to an opcode unflatten does not know
+        raise Exception(f"Error! {path} is damaged!") from None
+
+    environment = evaluator.environment
+    environment.clear()
+    environment.update(variables)
+    restored = getattr(evaluator, "restored", None)
+    if restored is not None:
+        restored()
+
+    if cache is None:
+        return count, 0
+    for line, tree in trees:
+        cache.trees[line] = tree
+        cache.trees.move_to_end(line)
+    while len(cache.trees) > cache.maxsize:
+        cache.trees.popitem(last=False)
+        cache.evictions += 1
+    return count, len(trees)
+
+
+def write_section(file, data):
+    file.write(SIZE.pack(len(data)))
+    file.write(data)
+
+
+def read_section(data, offset):
+    (size,) = SIZE.unpack_from(data, offset)
+    offset += SIZE.size
+    if offset + size > len(data):
+        raise ValueError("Section runs past the end of the file")
+    return data[offset:offset + size], offset + size
+
+
+def read_array(typecode, data, offset, count):
+    """Read count values, or all of data if count is None, into an array."""
+    values = array(typecode)
+    end = len(data) if count is None else offset + values.itemsize * count
+    if end > len(data):
+        raise ValueError("Array runs past the end of the file")
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
@@ -0,0 +1,255 @@
+"""Command line entry point for SNOL.
+
+    python snol.py                      start the interactive REPL
+    python snol.py run FILE             run a script file ("-" reads stdin)
+    python snol.py check FILE           report type errors in a script without running it
+    python snol.py parallel FILE...     run many scripts across all cores
+    python snol.py serve                host SNOL sessions over TCP or a Unix socket
+"""
+
+import argparse
+import sys
+
+import parallel
+import repl
+import runner
+import server
+from pipeline import BACKENDS
+
+
+def add_script_options(command):
+    """The options of the run and parallel commands, for how scripts run."""
+    command.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="stop at the first failing line instead of printing the error and continuing",
+    )
+    command.add_argument(
+        "--backend",
+        choices=sorted(BACKENDS),
+        default="tree",
+        help="evaluator used to run the script",
+    )
+    command.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        metavar="LINES",
+        help="how many parsed lines to keep for reuse, 0 turns the cache off (default: %(default)s)",
+    )
+    command.add_argument(
+        "--optimize",
+        action="store_true",
+        help="fold constants and simplify expressions before running them",
+    )
+    command.add_argument(
+        "--optimize-script",
+        action="store_true",
+        help="read the whole script first, then remove dead stores and reuse repeated expressions",
+    )
+    command.add_argument(
+        "--tier-threshold",
+        type=int,
+        default=0,
+        metavar="RUNS",
+        help="compile lines to closures once they have run this many times, 0 never does (tree backend only)",
+    )
+    command.add_argument(
+        "--max-steps",
+        type=int,
+        metavar="NODES",
+        help="fail any statement that evaluates more than this many nodes, 0 for no limit (tree backend only)",
+    )
+    command.add_argument(
+        "--max-int-bits",
+        type=int,
+        metavar="BITS",
+        help="fail any *, ** or %% that would produce an int larger than this, 0 for no limit (tree backend only)",
+    )
+    command.add_argument(
+        "--statement-time-limit",
+        type=float,
+        metavar="SECONDS",
+        help="fail any statement that runs for longer than this, 0 for no limit (tree backend only)",
+    )
+    command.add_argument(
+        "--input",
+        metavar="FILE",
+        help="read the values for BEG from FILE (separated by whitespace)",
+    )
+    command.add_argument(
+        "--stream",
+        action="store_true",
+        help="parse tokens as they are lexed, for scripts with huge statements",
+    )
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog="snol", description=__doc__.splitlines()[0])
+    commands = arg_parser.add_subparsers(dest="command")
+
+    interactive = commands.add_parser("repl", help="start the interactive REPL (default)")
+    interactive.add_argument(
+        "--backend",
+        choices=sorted(BACKENDS),
+        default="tree",
+        help="evaluator used to run commands",
+    )
+    interactive.add_argument(
+        "--reactive",
+        action="store_true",
+        help="recompute variables whenever a variable they were computed from changes",
+    )
+
+    run = commands.add_parser("run", help="run a SNOL script without the prompt")
+    run.add_argument("file", help='script to run, "-" for stdin')
+    add_script_options(run)
+    run.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="time every stage, node type and operator and write the counters to FILE as JSON",
+    )
+    run.add_argument(
+        "--quiet", action="store_true", help="do not report lines/sec when done"
+    )
+
+    check = commands.add_parser("check", help="report type errors in a script without running it")
+    check.add_argument("file", help='script to check, "-" for stdin')
+
+    many = commands.add_parser("parallel", help="run many independent scripts across cores")
+    many.add_argument("files", nargs="+", help="scripts to run")
+    many.add_argument(
+        "--workers", type=int, help="worker processes to use (default: one per core)"
+    )
+    many.add_argument(
+        "--time-limit",
+        type=float,
+        metavar="SECONDS",
+        help="stop any script that runs for longer than this",
+    )
+    add_script_options(many)
+    many.add_argument("--quiet", action="store_true", help="do not print the summary")
+
+    serve = commands.add_parser("serve", help="host many SNOL sessions over the network")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=7878)
+    serve.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    serve.add_argument(
+        "--max-sessions",
+        type=int,
+        default=100,
+        help="sessions that may be open at once (default: %(default)s)",
+    )
+    serve.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help="close sessions that send nothing for this long (default: %(default)s)",
+    )
+    serve.add_argument(
+        "--max-steps",
+        type=int,
+        default=1_000_000,
+        metavar="NODES",
+        help="nodes a statement may evaluate, 0 for no limit (default: %(default)s)",
+    )
+    serve.add_argument(
+        "--max-int-bits",
+        type=int,
+        default=1 << 16,
+        metavar="BITS",
+        help="bits an int computed by *, ** or %% may have, 0 for no limit (default: %(default)s)",
+    )
+    serve.add_argument(
+        "--time-limit",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="seconds a statement may run for, 0 for no limit (default: %(default)s)",
+    )
+
+    return arg_parser
+
+
+def script_options(arg_parser, args):
+    """Check the options from add_script_options, returning them as the
+    keyword arguments of runner.run_script."""
+    if args.cache_size < 0:
+        arg_parser.error("--cache-size must be 0 or more")
+    # 0 is no limit, the same as for serve
+    max_steps = args.max_steps or None
+    max_int_bits = args.max_int_bits or None
+    statement_time_limit = args.statement_time_limit or None
+    budgets = any(limit is not None for limit in (max_steps, max_int_bits, statement_time_limit))
+    if budgets and args.backend != "tree":
+        arg_parser.error("--max-steps, --max-int-bits and --statement-time-limit need the tree backend")
+    if args.tier_threshold < 0:
+        arg_parser.error("--tier-threshold must be 0 or more")
+    if args.tier_threshold and (args.backend != "tree" or budgets):
+        arg_parser.error("--tier-threshold needs the tree backend without budgets")
+    if args.optimize_script and (args.backend == "reactive" or budgets):
+        arg_parser.error("--optimize-script can't be used with the reactive backend or with budgets")
+
+    return {
+        "on_error": "stop" if args.fail_fast else "continue",
+        "backend": args.backend,
+        "cache_size": args.cache_size,
+        "optimize": args.optimize,
+        "stream": args.stream,
+        "tier_threshold": args.tier_threshold,
+        "max_steps": max_steps,
+        "max_int_bits": max_int_bits,
+        "statement_time_limit": statement_time_limit,
+        "input_path": args.input,
+        "optimize_script": args.optimize_script,
+    }
+
+
+def main(argv=None):
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args(argv)
+    if args.command == "run":
+        return runner.run_script(
+            args.file,
+            report=not args.quiet,
+            profile=args.profile,
+            **script_options(arg_parser, args),
+        )
+
+    if args.command == "check":
+        return runner.check_file(args.file)
+
+    if args.command == "parallel":
+        if args.workers is not None and args.workers < 1:
+            arg_parser.error("--workers must be at least 1")
+        return parallel.main(
+            args.files,
+            args.workers,
+            report=not args.quiet,
+            time_limit=args.time_limit,
+            **script_options(arg_parser, args),
+        )
+
+    if args.command == "serve":
+        server.serve(
+            args.host,
+            args.port,
+            args.unix,
+            max_sessions=args.max_sessions,
+            idle_timeout=args.idle_timeout,
+            max_steps=args.max_steps or None,
+            max_int_bits=args.max_int_bits or None,
+            time_limit=args.time_limit or None,
+        )
+        return 0
+
+    if args.command is None:
+        repl.main()
+    else:
+        repl.main("reactive" if args.reactive else args.backend)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
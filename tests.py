@@ -1,10 +1,47 @@
+import io
+import os
+import sys
+import itertools
+import tempfile
+from array import array
 import unittest
 from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 from lexer.lexer import Lexer
 from lexer.token import Token
 from parser.parser import Parser
-from parser.parser import AssignmentNode, BinaryOpNode, IntegerNode, FloatNode, VariableAccessNode, InputNode, PrintNode
+from parser.cache import ParseCache
+from parser.optimizer import Optimizer
+from parser.flat import FlatStatement, flatten, unflatten
+from parser.precedence import PrecedenceParser
+from parser.stream import TokenStream
+from parser.typecheck import TypeChecker, check_script
+from parser.parser import AssignmentNode, BinaryOpNode, UnaryOpNode, IntegerNode, FloatNode, VariableAccessNode, InputNode, PrintNode
 from evaluator.evaluator import Evaluator
+from evaluator.closure import ClosureEvaluator
+from evaluator.iterative import IterativeEvaluator
+from evaluator.vectorized import evaluate_formula, np
+from evaluator.reactive import ReactiveEvaluator
+from evaluator.typed import TypedEvaluator
+from evaluator.slots import SlotEvaluator
+from evaluator.memo import MemoEvaluator
+from evaluator.budget import BudgetEvaluator, StepLimitExceeded, SizeLimitExceeded, TimeLimitExceeded
+from evaluator import bytecode
+from evaluator.bytecode import VirtualMachine, cache_path, load_program
+from evaluator import transpile
+from evaluator.transpile import PythonEvaluator, Transpiler, load_transpiled, transpile_script
+from evaluator.providers import BufferedOutput, ListOutput, ValueInput, FileInput
+from pipeline import Pipeline
+from runner import Runner, ScriptError
+from server import SnolServer
+from parallel import run_scripts
+from profiler import Profiler
+import repl
+import snapshot
+import snol
+from benchmarks.workloads import WORKLOADS, generate
+from benchmarks.suite import compare
+import asyncio
 
 class TestLexer(unittest.TestCase):
 
@@ -62,6 +99,26 @@ class TestLexer(unittest.TestCase):
         ]
         self.assertEqual(tokens, expected_tokens)
 
+    def test_keywords_and_floats(self):
+        lexer = Lexer()
+        code = 'PRINT PRINTER - 2.'
+        tokens = lexer.tokenize(code)
+        expected_tokens = [
+            Token('KEYWORD', 'PRINT'),
+            Token('VARIABLE', 'PRINTER'),
+            Token('PRED_5', '-'),
+            Token('FLOAT', 2.0),
+            Token('EOF', None)
+        ]
+        self.assertEqual(tokens, expected_tokens)
+
+    def test_unrecognized_token(self):
+        lexer = Lexer()
+        with self.assertRaisesRegex(Exception, 'Unrecognized token xé'):
+            lexer.tokenize('y = xé')
+        with self.assertRaisesRegex(Exception, 'Unrecognized token &'):
+            lexer.tokenize('a & b')
+
 class TestParser(unittest.TestCase):
 
     def test_assign(self):
@@ -109,6 +166,205 @@ class TestParser(unittest.TestCase):
         self.assertEqual(ast.op, expected_ast.op)
         self.assertEqual(ast.right.value, expected_ast.right.value)
 
+class TestTokenStream(unittest.TestCase):
+
+    def test_iter_tokens_matches_tokenize(self):
+        lexer = Lexer()
+        line = 'PRINT (x + 2.5) ** -y && !z'
+        self.assertEqual(
+            [(token.type, token.value) for token in lexer.iter_tokens(line)],
+            [(token.type, token.value) for token in lexer.tokenize(line)],
+        )
+
+    def test_same_trees_and_errors(self):
+        lines = ['x = -(1 + y) * 2 ** 3', 'PRINT x || y', 'BEG x', 'x = ) é', 'x = (1 + 2', '1 2']
+        for cache_size in (0, 4):
+            listed, _ = run_backend(Evaluator(), lines[:2] + lines[3:], cache_size=cache_size)
+            streamed, _ = run_backend(Evaluator(), lines[:2] + lines[3:], cache_size=cache_size, stream=True)
+            self.assertEqual(streamed, listed)
+        pipeline = Pipeline(stream=True)
+        streamed = flatten(pipeline.compile(lines[0]))
+        listed = flatten(Pipeline().compile(lines[0]))
+        self.assertEqual(streamed.opcodes, listed.opcodes)
+        self.assertEqual(streamed.operands, listed.operands)
+        self.assertEqual(streamed.values, listed.values)
+        self.assertIsInstance(pipeline.compile(lines[2]), InputNode)
+
+    def test_only_reads_ahead_one_token(self):
+        lexer = Lexer()
+        line = 'x = ' + ' + '.join(['1'] * 1000)
+        stream = TokenStream(lexer.iter_tokens(line))
+        self.assertIsInstance(PrecedenceParser().parse(stream), AssignmentNode)
+        self.assertLessEqual(len(stream.window), 2)
+        with self.assertRaises(IndexError):
+            stream[0]
+
+class TestParseCache(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = ParseCache(maxsize=2)
+        first = cache.parse('i = i + 1')
+        self.assertIs(cache.parse('  i =   i + 1 '), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        cache = ParseCache(maxsize=2)
+        a = cache.parse('a = 1')
+        cache.parse('b = 2')
+        cache.parse('a = 1')  # a is now the most recently used line
+        cache.parse('c = 3')
+        self.assertEqual(cache.evictions, 1)
+        self.assertIs(cache.parse('a = 1'), a)
+        cache.parse('b = 2')
+        self.assertEqual(cache.misses, 4)
+
+    def test_errors_are_not_cached(self):
+        cache = ParseCache()
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                cache.parse('x = 1 )')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 2)
+
+    def test_negative_size_rejected_by_cli(self):
+        for command in (['run', 'script.snol'], ['parallel', 'script.snol']):
+            with self.subTest(command=command[0]):
+                with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, self.assertRaises(SystemExit):
+                    snol.main(command + ['--cache-size', '-1'])
+                self.assertIn('--cache-size must be 0 or more', stderr.getvalue())
+
+class TestFlatStatement(unittest.TestCase):
+
+    def test_round_trip(self):
+        lexer = Lexer()
+        parser = Parser()
+        for line in BACKEND_SCRIPT + ['BEG x', 'PRINT -(x - 2.5) ** 2 <= !y']:
+            tree = parser.parse(lexer.tokenize(line))
+            statement = flatten(tree)
+            self.assertEqual(len(statement), len(statement.operands))
+            self.assertEqual(flatten(unflatten(statement)).opcodes, statement.opcodes)
+            self.assertEqual(flatten(unflatten(statement)).values, statement.values)
+
+    def test_signed_zero(self):
+        tree = AssignmentNode('x', BinaryOpNode(FloatNode(0.0), '+', FloatNode(-0.0)))
+        rebuilt = unflatten(flatten(tree))
+        self.assertEqual(str(rebuilt.value.left.value), '0.0')
+        self.assertEqual(str(rebuilt.value.right.value), '-0.0')
+
+    def test_compact_cache(self):
+        cache = ParseCache(compact=True)
+        tree = cache.parse('y = -(x + 1) * 2')
+        rebuilt = cache.parse('y = -(x + 1) * 2')
+        self.assertIsNot(rebuilt, tree)
+        self.assertEqual(cache.hits, 1)
+        evaluator = Evaluator()
+        evaluator.environment['x'] = 4
+        self.assertEqual(evaluator.evaluate(rebuilt), -10)
+
+    def test_nodes_have_no_dict(self):
+        tree = Parser().parse(Lexer().tokenize('x = y + 1'))
+        for node in (tree, tree.value, tree.value.left, tree.value.right, Token('EOF')):
+            self.assertFalse(hasattr(node, '__dict__'))
+
+class TestOptimizer(unittest.TestCase):
+
+    def optimize(self, code):
+        optimizer = Optimizer()
+        tree = optimizer.optimize(Parser().parse(Lexer().tokenize(code)))
+        return tree, optimizer
+
+    def test_constant_folding(self):
+        tree, optimizer = self.optimize('PRINT 2 ** 10 * (3 + 4)')
+        self.assertIsInstance(tree.value, IntegerNode)
+        self.assertEqual(tree.value.value, 7168)
+        self.assertEqual(optimizer.removed, 6)
+
+    def test_integer_division_is_kept(self):
+        tree, _ = self.optimize('x = 7 / 2 + -1')
+        self.assertEqual(tree.value.value, 2)
+
+    def test_errors_are_left_for_run_time(self):
+        for code in ['x = 1 / 0', 'x = 1 + 2.0', 'x = y + 1 * 2.0']:
+            tree, optimizer = self.optimize(code)
+            self.assertIsInstance(tree.value, BinaryOpNode)
+        tree, _ = self.optimize('x = 9 ** 99999')
+        self.assertIsInstance(tree.value, BinaryOpNode)
+
+    def test_identities_respect_types(self):
+        tree, _ = self.optimize('x = (y + 1) * 1')
+        self.assertEqual(tree.value.op, '+')
+        # y could be a float, in which case "y * 1" has to fail
+        tree, _ = self.optimize('x = y * 1')
+        self.assertEqual(tree.value.op, '*')
+        # -0.0 + 0.0 is 0.0, so float + 0.0 is left alone
+        tree, _ = self.optimize('x = (y * 2.0) + 0.0')
+        self.assertEqual(tree.value.op, '+')
+
+    def test_unary_chains(self):
+        tree, _ = self.optimize('x = -(-(-y))')
+        self.assertIsInstance(tree.value, UnaryOpNode)
+        self.assertIsInstance(tree.value.node, VariableAccessNode)
+        tree, _ = self.optimize('x = !(!(y < 2))')
+        self.assertEqual(tree.value.op, '<')
+
+    def test_cached_trees_are_not_changed(self):
+        cache = ParseCache()
+        tree = cache.parse('PRINT 1 + 2')
+        Optimizer().optimize(tree)
+        self.assertIsInstance(tree.value, BinaryOpNode)
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(Evaluator(), BACKEND_SCRIPT, optimize=True), expected)
+
+    def test_deep_and_long_expressions(self):
+        pipeline = Pipeline(backend='iterative', optimize=True)
+        pipeline.execute('y = 2')
+        chain = 'x = ' + ' + '.join(['y'] * 50000)
+        self.assertEqual(pipeline.execute(chain), 100000)
+        deep = 'x = ' + '(' * 3000 + 'y' + ' * 1)' * 3000
+        self.assertEqual(pipeline.execute(deep), 2)
+        # only the innermost y * 1 is kept, since the type of y is not known
+        self.assertEqual(pipeline.optimizer.simplified, 2999)
+
+class TestPrecedenceParser(unittest.TestCase):
+
+    def test_same_trees_as_parser(self):
+        lexer = Lexer()
+        lines = BACKEND_SCRIPT + [
+            'x = a ! b', 'PRINT !!x', 'y = -(-(a + 1)) ** 2 ** 3', 'x = (1 + 2',
+            'x = 1 + (2 * (3 - 4)) < 5 && 6 || !7', '= 4', 'x = 1 )', 'BEG x', 'PRINT',
+        ]
+        for line in lines:
+            results = []
+            for parser in (Parser(), PrecedenceParser()):
+                try:
+                    results.append(flatten(parser.parse(lexer.tokenize(line))))
+                except Exception as e:
+                    results.append(str(e))
+            expected, actual = results
+            if isinstance(expected, str):
+                self.assertEqual(actual, expected)
+            else:
+                self.assertEqual((actual.opcodes, actual.operands, actual.values),
+                                 (expected.opcodes, expected.operands, expected.values))
+
+    def test_deep_and_long_expressions(self):
+        lexer = Lexer()
+        parser = PrecedenceParser()
+        evaluator = IterativeEvaluator()
+        depth = 20000
+        deep = 'x = ' + '(' * depth + '1' + ' + 1)' * depth
+        self.assertEqual(evaluator.evaluate(parser.parse(lexer.tokenize(deep))), depth + 1)
+        negated = 'x = ' + '-' * (depth + 1) + '2'
+        self.assertEqual(evaluator.evaluate(parser.parse(lexer.tokenize(negated))), -2)
+        long = 'x = ' + ' * '.join(['1'] * depth)
+        self.assertEqual(evaluator.evaluate(parser.parse(lexer.tokenize(long))), 1)
+
+    def test_iterative_evaluator_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(IterativeEvaluator(), BACKEND_SCRIPT), expected)
+
 class TestEvaluator(unittest.TestCase):
 
     def test_evaluate_assignment(self):
@@ -135,6 +391,543 @@ class TestEvaluator(unittest.TestCase):
             evaluator.evaluate(node)
             mocked_print.assert_called_with('SNOL :> 42')
 
+# lines used to check that other backends behave exactly like the tree walker
+BACKEND_SCRIPT = [
+    'x = 7', 'y = 2', 'f = 2.5', 'PRINT x / y', 'PRINT f / 2.0', 'PRINT x % y - -x',
+    'PRINT x ** y', 'PRINT 2 ** -1', 'PRINT (x < y) + (x >= y) * 10', 'PRINT f == 2.5',
+    'PRINT x && 0 || y', 'PRINT !x', 'PRINT !(x - 7)', 'PRINT !f', 'PRINT x + f',
+    'PRINT f < x', 'PRINT q', 'PRINT x / 0', 'PRINT f / 0.0', 'z = x * 3 - y',
+    'PRINT z', 'PRINT x +', 'x = 1 +', 'PRINT x', 'x + y', 'PRINT (x + y) * (z - 1) % 5',
+]
+
+
+def run_backend(evaluator, lines, **options):
+    """Run lines through a pipeline and collect what the REPL would print."""
+    pipeline = Pipeline(evaluator, **options)
+    output = []
+    with mock.patch('builtins.print', side_effect=lambda text: output.append(text)):
+        for line in lines:
+            try:
+                pipeline.execute(line)
+            except Exception as e:
+                output.append(f'error: {e}')
+    return output, pipeline.evaluator.environment
+
+
+class TestClosureEvaluator(unittest.TestCase):
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(ClosureEvaluator(), BACKEND_SCRIPT), expected)
+
+    def test_compile_once_run_many(self):
+        evaluator = ClosureEvaluator()
+        increment = evaluator.compile(AssignmentNode('i', BinaryOpNode(VariableAccessNode('i'), '+', IntegerNode(1))))
+        evaluator.environment['i'] = 0
+        for _ in range(5):
+            increment(evaluator.environment)
+        self.assertEqual(evaluator.environment['i'], 5)
+
+    def test_closures_reused_per_tree(self):
+        evaluator = ClosureEvaluator(maxsize=2)
+        with mock.patch.object(evaluator, 'compile', wraps=evaluator.compile) as compile:
+            output, environment = run_backend(evaluator, ['i = 0'] + ['i = i + 1', 'PRINT i'] * 3, cache_size=16)
+        self.assertEqual(output[-1], 'SNOL :> [i] = 3')
+        self.assertEqual(compile.call_count, 3)
+        self.assertEqual(len(evaluator.closures), 2)
+
+class TestTypeChecker(unittest.TestCase):
+
+    def check(self, lines):
+        checker = TypeChecker()
+        parser = PrecedenceParser()
+        for line in lines:
+            checker.check(parser.parse(Lexer().tokenize(line)))
+        return checker.variables
+
+    def test_types_flow_through_script(self):
+        variables = self.check(['x = 1', 'y = x * 2 < 3', 'f = 1.5', 'g = -f ** 2.0', 'h = x ** 2', 'BEG k', 'n = k + 1'])
+        self.assertEqual(variables, {'x': int, 'y': int, 'f': float, 'g': float, 'h': int, 'k': None, 'n': int})
+
+    def test_failed_assignment_keeps_old_type(self):
+        # "x = x / y" could fail, and would leave x an int
+        self.assertEqual(self.check(['x = 1', 'BEG y', 'x = y / 2.0']), {'x': None, 'y': None})
+        self.assertEqual(self.check(['x = 1', 'x = 2.5']), {'x': float})
+        self.assertEqual(self.check(['x = 1', 'x = x ** -1']), {'x': None})
+
+    def test_check_script(self):
+        lines = ['x = 1', 'f = 2.5', 'PRINT x + f', '', 'y = q * 2', 'z = x +', 'x = 1 )', 'BEG x', 'PRINT x + f']
+        self.assertEqual(check_script(lines), [
+            (3, 'Error! Operands must be of the same type in an arithmetic operation! (int + float)'),
+            (5, 'Error! [q] is not defined!'),
+            (6, 'No evaluation method defined for NoneType'),
+            (7, 'Unknown command! Does not match any valid command on this language.'),
+        ])
+
+class TestTypedEvaluator(unittest.TestCase):
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(TypedEvaluator(), BACKEND_SCRIPT), expected)
+
+    def test_specialized_operations(self):
+        evaluator = TypedEvaluator()
+        run_backend(evaluator, ['x = 7', 'f = 7.0'])
+        for line, expected in [('x / 2', 3), ('f / 2.0', 3.5), ('x > 2 && x < 9', 1), ('!f', 0.0), ('f == 7.0', 1.0)]:
+            result = evaluator.evaluate(PrecedenceParser().parse(Lexer().tokenize(line)))
+            self.assertEqual(result, expected)
+            self.assertIs(type(result), type(expected))
+        with self.assertRaises(ZeroDivisionError):
+            evaluator.evaluate(PrecedenceParser().parse(Lexer().tokenize('x % 0')))
+
+    def test_closures_reused_per_tree_and_types(self):
+        evaluator = TypedEvaluator()
+        lines = ['x = 1', 'y = x + x', 'x = 1.5', 'y = x + x'] * 3 + ['PRINT y']
+        with mock.patch.object(evaluator, 'compile', wraps=evaluator.compile) as compile:
+            output, environment = run_backend(evaluator, lines, cache_size=16)
+        self.assertEqual(output, run_backend(Evaluator(), lines)[0])
+        # x = 1 for an undefined and a float x, x = 1.5 for an int x, y = x + x
+        # for x and y of (int, undefined), (float, int), (int, None) and
+        # (float, None), and PRINT y
+        self.assertEqual(compile.call_count, 8)
+        self.assertEqual(evaluator.checker.variables, {'x': float, 'y': None})
+
+    def test_negative_folded_exponent_is_not_int(self):
+        lines = ['x = 2', 'y = x ** -1', 'z = y + 1', 'PRINT z']
+        expected = run_backend(Evaluator(), lines)
+        for evaluator in (TypedEvaluator(), PythonEvaluator()):
+            with self.subTest(backend=type(evaluator).__name__):
+                self.assertEqual(run_backend(evaluator, lines, optimize=True), expected)
+        self.assertTrue(expected[0][-1].startswith('error:'))
+
+class TestSlotEvaluator(unittest.TestCase):
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(SlotEvaluator(), BACKEND_SCRIPT), expected)
+
+    def test_slots_and_environment(self):
+        evaluator = SlotEvaluator()
+        output, environment = run_backend(evaluator, ['PRINT a', 'b = 2', 'a = b * 3'])
+        self.assertEqual(output, ['error: Error! [a] is not defined!'])
+        self.assertEqual(evaluator.resolver.slots, {'a': 0, 'b': 1})
+        self.assertEqual(evaluator.values, [6, 2])
+        self.assertEqual(dict(environment), {'b': 2, 'a': 6})
+        environment['c'] = 1.5
+        del environment['a']
+        self.assertNotIn('a', environment)
+        self.assertEqual(run_backend(evaluator, ['PRINT c', 'PRINT a'])[0], ['SNOL :> [c] = 1.5', 'error: Error! [a] is not defined!'])
+
+    def test_input_creates_variable(self):
+        evaluator = SlotEvaluator()
+        with mock.patch('builtins.input', return_value='4'):
+            output, environment = run_backend(evaluator, ['BEG n', 'PRINT n * n'])
+        self.assertEqual(output, ['SNOL :> [n] = 16'])
+        self.assertEqual(environment, {'n': 4})
+
+    def test_closures_reused_per_tree(self):
+        evaluator = SlotEvaluator()
+        with mock.patch.object(evaluator, 'compile', wraps=evaluator.compile) as compile:
+            output, environment = run_backend(evaluator, ['i = 0'] + ['i = i + 1', 'PRINT i'] * 3, cache_size=16)
+            environment.clear()
+            output += run_backend(evaluator, ['PRINT i', 'i = 5', 'PRINT i'], cache_size=16)[0]
+        self.assertEqual(output[2:], ['SNOL :> [i] = 3', 'error: Error! [i] is not defined!', 'SNOL :> [i] = 5'])
+        self.assertEqual(compile.call_count, 5)
+
+class TestMemoEvaluator(unittest.TestCase):
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(MemoEvaluator(), BACKEND_SCRIPT, cache_size=64), expected)
+
+    def test_reuses_results_until_a_read_variable_changes(self):
+        evaluator = MemoEvaluator()
+        line = 'y = b ** 300 % m + i'
+        lines = ['b = 3', 'm = 1000', 'i = 0'] + [line, 'i = i + 1'] * 3 + ['b = 5', line]
+        with mock.patch('builtins.input', return_value='7'):
+            lines += ['BEG m', line]
+            _, environment = run_backend(evaluator, lines, cache_size=64)
+        self.assertEqual(environment['y'], 5 ** 300 % 7 + 3)
+        # the ** and the % are kept, the + is too small. After BEG m only the % is recomputed
+        self.assertEqual((evaluator.misses, evaluator.hits), (2 + 2 + 1, 2 + 1))
+        self.assertEqual(len(evaluator.memo), 2)
+
+    def test_errors_and_eviction(self):
+        evaluator = MemoEvaluator(maxsize=1)
+        lines = ['a = 2 ** 300', 'PRINT a % 0', 'PRINT a % 0', 'b = a * a', 'b = a * 3']
+        output, _ = run_backend(evaluator, lines, cache_size=64)
+        self.assertEqual(output, run_backend(Evaluator(), lines)[0])
+        self.assertEqual((evaluator.misses, evaluator.evictions, len(evaluator.memo)), (3, 2, 1))
+        evaluator.restored()
+        self.assertEqual(len(evaluator.memo), 0)
+
+    def test_bits_limit(self):
+        evaluator = MemoEvaluator(max_bits=1000)
+        lines = ['a = 2 ** 600', 'b = 3 ** 600', 'c = 2 ** 2000', 'c = 2 ** 2000']
+        _, environment = run_backend(evaluator, lines, cache_size=64)
+        self.assertEqual(environment['c'], 2 ** 2000)
+        # 3 ** 600 pushes 2 ** 600 out and 2 ** 2000 is never kept
+        self.assertEqual((evaluator.misses, evaluator.hits, evaluator.evictions), (4, 0, 1))
+        self.assertEqual(evaluator.bits, (3 ** 600).bit_length())
+        self.assertEqual(len(evaluator.memo), 1)
+        with self.assertRaises(ValueError):
+            MemoEvaluator(max_bits=0)
+
+class TestBudgetEvaluator(unittest.TestCase):
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        evaluator = BudgetEvaluator(max_steps=100, max_int_bits=64, time_limit=1.0)
+        self.assertEqual(run_backend(evaluator, BACKEND_SCRIPT), expected)
+
+    def test_step_limit(self):
+        evaluator = BudgetEvaluator(max_steps=10)
+        output, environment = run_backend(evaluator, ['x = ' + ' + '.join(['1'] * 5), 'y = ' + ' + '.join(['1'] * 6)])
+        self.assertEqual(output, ['error: Error! Statement needs more than 10 steps!'])
+        self.assertEqual(environment, {'x': 5})
+        # the count starts over for every statement
+        self.assertEqual(run_backend(evaluator, ['x = x + 1'] * 3)[1], {'x': 8})
+
+    def test_size_limit(self):
+        evaluator = BudgetEvaluator(max_int_bits=64)
+        pipeline = Pipeline(evaluator)
+        with self.assertRaises(SizeLimitExceeded):
+            pipeline.execute('x = 9 ** (9 ** 9)')
+        with self.assertRaisesRegex(SizeLimitExceeded, 'Result of \\* would have'):
+            pipeline.execute('x = 4294967296 * 4294967296')
+        self.assertEqual(pipeline.execute('x = 2 ** 62 * 1 % 7'), 2 ** 62 % 7)
+        # floats and negative powers are not ints
+        self.assertEqual(pipeline.execute('x = 9.0 ** 99.0'), 9.0 ** 99)
+        self.assertEqual(pipeline.execute('x = 9 ** -99'), 9 ** -99)
+
+    def test_time_limit(self):
+        evaluator = BudgetEvaluator(time_limit=0.0)
+        with mock.patch('evaluator.budget.CLOCK_INTERVAL', 1), self.assertRaises(TimeLimitExceeded):
+            Pipeline(evaluator).execute('x = ' + ' + '.join(['1'] * 20))
+        self.assertIsNone(evaluator.steps)
+        self.assertNotIn('x', evaluator.environment)
+        self.assertFalse(issubclass(StepLimitExceeded, TimeLimitExceeded))
+
+    def test_cli_options(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, self.assertRaises(SystemExit):
+            snol.main(['run', 'script.snol', '--backend', 'vm', '--max-steps', '10'])
+        self.assertIn('need the tree backend', stderr.getvalue())
+
+        # 0 is no limit, for run the same as for serve
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'script.snol')
+            with open(path, 'w') as file:
+                file.write('x = 2\nPRINT x * 21\n')
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                status = snol.main(['run', path, '--quiet', '--max-steps', '0', '--backend', 'vm', '--max-int-bits', '0'])
+        self.assertEqual((status, stdout.getvalue()), (0, 'SNOL :> [x] = 42\n'))
+
+class TestVirtualMachine(unittest.TestCase):
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(VirtualMachine(), BACKEND_SCRIPT), expected)
+
+    def test_signed_zero_constants(self):
+        output, _ = run_backend(VirtualMachine(), ['a = 0.0', 'b = -0.0', 'PRINT b', 'PRINT a'], optimize=True)
+        self.assertEqual(output, ['SNOL :> [b] = -0.0', 'SNOL :> [a] = 0.0'])
+
+    def test_compiled_script_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'script.snol')
+            with open(path, 'w') as file:
+                file.write('x = 2\nPRINT x * 21\nPRINT y\n')
+
+            runner = Runner(Pipeline(backend='vm'))
+            with mock.patch('builtins.print') as mocked_print:
+                stats = runner.run_file(path)
+                mocked_print.assert_any_call('SNOL :> [x] = 42')
+                mocked_print.assert_called_with('SNOL :> Error! [y] is not defined!')
+            self.assertEqual((stats.lines, stats.statements, stats.errors), (3, 3, 1))
+            self.assertTrue(os.path.exists(cache_path(path)))
+
+            # an unchanged script is loaded without being lexed or parsed again
+            with mock.patch('evaluator.bytecode.compile_script') as compile_script:
+                program = load_program(path)
+                compile_script.assert_not_called()
+            self.assertEqual(len(program.statements), 3)
+
+            # an edited script is compiled again
+            with open(path, 'a') as file:
+                file.write('PRINT x\n')
+            self.assertEqual(len(load_program(path).statements), 4)
+
+    def test_optimized_scripts_cached_apart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'script.snol')
+            with open(path, 'w') as file:
+                file.write('PRINT 2 * 21\n')
+            plain = load_program(path)
+            optimized = load_program(path, Optimizer())
+            self.assertNotEqual(optimized.statements, plain.statements)
+            self.assertIn(42, optimized.consts)
+            # each load finds the other kind in the .snolc file and compiles again
+            for optimizer in (None, Optimizer()):
+                with mock.patch('evaluator.bytecode.compile_script', wraps=bytecode.compile_script) as compile_script:
+                    load_program(path, optimizer)
+                    compile_script.assert_called_once()
+
+class TestPythonEvaluator(unittest.TestCase):
+
+    def run_script(self, backend, lines, on_error='continue', optimize_script=False):
+        output = ListOutput()
+        pipeline = Pipeline(backend=backend, output=output, input=ValueInput(['4', 'x', '2.5']))
+        runner = Runner(pipeline, on_error=on_error, optimize_script=optimize_script)
+        try:
+            stats = runner.run(lines)
+            result = (stats.lines, stats.statements, stats.errors)
+        except ScriptError as e:
+            result = str(e)
+        return output.lines, pipeline.evaluator.environment, result
+
+    def test_matches_tree_walker(self):
+        expected = run_backend(Evaluator(), BACKEND_SCRIPT)
+        self.assertEqual(run_backend(PythonEvaluator(), BACKEND_SCRIPT), expected)
+        self.assertEqual(run_backend(PythonEvaluator(), BACKEND_SCRIPT * 2, cache_size=64), run_backend(Evaluator(), BACKEND_SCRIPT * 2))
+
+    def test_evaluate_returns_statement_value(self):
+        def results(backend):
+            pipeline = Pipeline(backend=backend, cache_size=8, output=ListOutput(), input=ValueInput(['4']))
+            values = []
+            for line in BACKEND_SCRIPT + ['BEG n', 'n', 'n ** 2']:
+                try:
+                    value = pipeline.execute(line)
+                    values.append((value, type(value)))
+                except Exception as e:
+                    values.append(str(e))
+            return values
+
+        self.assertEqual(results('python'), results('tree'))
+        self.assertEqual(Pipeline(backend='python').execute('x = 3'), 3)
+
+    def test_whole_script_matches_tree_walker(self):
+        lines = BACKEND_SCRIPT + ['BEG n', 'PRINT n / 3', 'BEG n', 'BEG n', 'PRINT n / 3', 'x = z', 'x = x / 2', 'EXIT!', 'PRINT x']
+        for on_error in ('continue', 'stop'):
+            for optimize_script in (False, True):
+                with self.subTest(on_error=on_error, optimize_script=optimize_script):
+                    self.assertEqual(
+                        self.run_script('python', lines, on_error, optimize_script),
+                        self.run_script('tree', lines, on_error, optimize_script),
+                    )
+
+    def test_deep_expressions_and_large_literals(self):
+        lines = [
+            'x = ' + ' + '.join(['1'] * 5000), 'y = ' + '(' * 100 + 'x' + ' * 2)' * 100,
+            'z = ' + ' - '.join(['u'] * 100), 'w = ' + '9' * 400 + '.0', 'PRINT -w * 0.0',
+            'b = 1' + '0' * 1000 + ' % 7',
+        ]
+        self.assertEqual(self.run_script('python', lines), self.run_script('iterative', lines))
+
+    def test_only_statements_that_may_fail_are_guarded(self):
+        transpiler = Transpiler()
+        lines = ['i = 0', 'i = i + 1', 'f = i / 2 * 3 % 5 > 1 && !i', 'g = i / j', 'h = i ** 2']
+        for line_number, line in enumerate(lines, 1):
+            transpiler.add(line_number, Parser().parse(Lexer().tokenize(line)))
+        source = transpiler.source()
+        self.assertNotIn('_error(1,', source)
+        self.assertNotIn('_error(2,', source)
+        self.assertIn('\n        v_f = (1 if ((1 if (((v_i // 2) * 3) % 5) > 1 else 0) != 0) & ((1 if v_i == 0 else 0) != 0) else 0)\n', source)
+        self.assertIn("_error(4, _translate(_e, ('i', 'j'), locals()))", source)
+        self.assertIn('_error(5,', source)
+
+    def test_chunks(self):
+        lines = ['i = 0', 'BEG i', 'i = i + 1', 'PRINT i', 'j = i * 2', 'PRINT j / 0', 'PRINT j', 'k = q']
+        expected = self.run_script('tree', lines)
+        with mock.patch.object(Transpiler.__init__, '__defaults__', (None, 2)):
+            self.assertEqual(self.run_script('python', lines), expected)
+
+    def test_transpiled_script_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'script.snol')
+            with open(path, 'w') as file:
+                file.write('x = 2\nPRINT x * 21\n\nPRINT y\n')
+
+            runner = Runner(Pipeline(backend='python'))
+            with mock.patch('builtins.print') as mocked_print:
+                stats = runner.run_file(path)
+                mocked_print.assert_any_call('SNOL :> [x] = 42')
+                mocked_print.assert_called_with('SNOL :> Error! [y] is not defined!')
+            self.assertEqual((stats.lines, stats.statements, stats.errors), (4, 3, 1))
+            self.assertTrue(os.path.exists(transpile.cache_path(path)))
+
+            # an unchanged script is loaded without being transpiled again
+            with mock.patch('evaluator.transpile.transpile_script') as transpile_script:
+                program = load_transpiled(path)
+                transpile_script.assert_not_called()
+            self.assertEqual(list(program.line_numbers), [1, 2, 4])
+
+            # an edited script is transpiled again
+            with open(path, 'a') as file:
+                file.write('PRINT x\n')
+            self.assertEqual(list(load_transpiled(path).line_numbers), [1, 2, 4, 5])
+
+            # code from another Python version is never loaded
+            with open(transpile.cache_path(path), 'rb') as file:
+                data = file.read()
+            with mock.patch('importlib.util.MAGIC_NUMBER', b'????'):
+                self.assertIsNone(transpile.PythonProgram.loads(data, transpile.hash_file(path)))
+
+            # nor is code that was transpiled with a different optimized setting
+            self.assertIsNone(transpile.PythonProgram.loads(data, transpile.hash_file(path), optimized=True))
+            with mock.patch('evaluator.transpile.transpile_script', wraps=transpile.transpile_script) as transpiling:
+                load_transpiled(path, Optimizer())
+                transpiling.assert_called_once()
+
+class TestReactiveEvaluator(unittest.TestCase):
+
+    def test_dependents_recomputed(self):
+        output, environment = run_backend(ReactiveEvaluator(), [
+            'price = 10', 'qty = 3', 'total = price * qty', 'taxed = total + total / 10',
+            'price = 20', 'PRINT taxed',
+        ])
+        self.assertEqual(output, ['SNOL :> [taxed] = 66'])
+        self.assertEqual(environment['total'], 60)
+
+    def test_only_affected_recomputed(self):
+        evaluator = ReactiveEvaluator()
+        run_backend(evaluator, ['a = 1', 'b = 1'] + [f'x{i} = b + {i}' for i in range(100)] + ['y = a + 1', 'z = y * a'])
+        evaluator.recomputed = 0
+        run_backend(evaluator, ['a = 5'])
+        self.assertEqual(evaluator.recomputed, 2)
+        self.assertEqual(evaluator.environment['z'], 30)
+
+    def test_input_updates_dependents(self):
+        evaluator = ReactiveEvaluator()
+        run_backend(evaluator, ['x = 1', 'y = x * 2'])
+        with mock.patch('builtins.input', return_value='21'):
+            run_backend(evaluator, ['BEG x'])
+        self.assertEqual(evaluator.environment['y'], 42)
+
+    def test_self_reference_and_cycles(self):
+        output, environment = run_backend(ReactiveEvaluator(), [
+            'i = 1', 'j = i * 10', 'i = i + 1', 'i = j', 'PRINT i', 'PRINT j',
+        ])
+        self.assertEqual(output, [
+            'error: Error! Circular dependency between [i] and [j]!',
+            'SNOL :> [i] = 2',
+            'SNOL :> [j] = 20',
+        ])
+
+    def test_failed_update(self):
+        output, environment = run_backend(ReactiveEvaluator(), [
+            'x = 1', 'y = x + 1', 'z = y + 1', 'x = 1.5', 'PRINT z', 'x = 2', 'PRINT z',
+        ])
+        self.assertEqual(output, [
+            'error: Error! [y] could not be updated: Error! Operands must be of the same type in an arithmetic operation!',
+            'error: Error! [z] is not defined!',
+            'SNOL :> [z] = 4',
+        ])
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class TestVectorizedEvaluator(unittest.TestCase):
+
+    def test_matches_row_by_row(self):
+        columns = {'a': np.array([7, -7, 3, 0]), 'b': np.array([2, 2, -4, 5])}
+        formulas = ['x = a / b', 'x = a % b', 'x = a ** 2 - b', 'x = (a < b) + (a == 0) * 10',
+                    'x = a && b || !a', 'x = -a * 3 / 2']
+        lexer = Lexer()
+        parser = PrecedenceParser()
+        for formula in formulas:
+            result = evaluate_formula(formula, columns)
+            self.assertEqual(result.dtype.kind, 'i')
+            for row in range(4):
+                evaluator = Evaluator()
+                evaluator.environment.update({name: int(column[row]) for name, column in columns.items()})
+                expected = evaluator.evaluate(parser.parse(lexer.tokenize(formula)))
+                self.assertEqual(result[row], expected, f'{formula} on row {row}')
+
+    def test_float_columns(self):
+        result = evaluate_formula('x = p / 2.0 >= 1.0', {'p': np.array([1.0, 2.0, 3.0])})
+        self.assertEqual(result.dtype.kind, 'f')
+        self.assertEqual(result.tolist(), [0.0, 1.0, 1.0])
+
+    def test_errors(self):
+        columns = {'i': np.array([1, 2]), 'f': np.array([1.5, 0.0])}
+        with self.assertRaisesRegex(Exception, 'same type'):
+            evaluate_formula('x = i + f', columns)
+        with self.assertRaisesRegex(Exception, 'same type'):
+            evaluate_formula('x = i * 2.0', columns)
+        with self.assertRaises(ZeroDivisionError):
+            evaluate_formula('x = i / (i - 1)', columns)
+        with self.assertRaises(ZeroDivisionError):
+            evaluate_formula('x = 1.0 / f', columns)
+
+    def test_unsigned_columns(self):
+        columns = {'u': np.array([3, 10], dtype=np.uint64), 'i': np.array([-5, 2], dtype=np.int64)}
+        for formula, expected in [('x = u + i', [-2, 12]), ('x = u - 4', [-1, 6]), ('x = u / i', [-1, 5])]:
+            result = evaluate_formula(formula, columns)
+            self.assertEqual(result.dtype, np.int64, formula)
+            self.assertEqual(result.tolist(), expected, formula)
+        with self.assertRaisesRegex(Exception, 'too big for int64'):
+            evaluate_formula('x = u', {'u': np.array([2 ** 63], dtype=np.uint64)})
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+
+    async def start(self, **options):
+        snol_server = SnolServer(**options)
+        server = await snol_server.start(port=0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        return snol_server, server.sockets[0].getsockname()[1]
+
+    async def talk(self, port, commands):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(''.join(line + '\n' for line in commands).encode())
+        await writer.drain()
+        replies = (await reader.read()).decode()
+        writer.close()
+        return replies.splitlines()
+
+    async def test_pipelined_session(self):
+        _, port = await self.start()
+        replies = await self.talk(port, ['x = 2', 'PRINT x * 21', 'BEG y', '1.5', 'PRINT y', 'PRINT z', 'EXIT!'])
+        self.assertEqual(replies[1:], [
+            'SNOL :> [x] = 42',
+            'SNOL :> Please enter a value for [y]',
+            'Input: SNOL :> [y] = 1.5',
+            'SNOL :> Error! [z] is not defined!',
+            'Evaluator is now terminated...',
+        ])
+
+    async def test_sessions_are_independent(self):
+        _, port = await self.start()
+        first, second = await asyncio.gather(
+            self.talk(port, ['x = 1', 'PRINT x', 'EXIT!']),
+            self.talk(port, ['PRINT x', 'EXIT!']),
+        )
+        self.assertIn('SNOL :> [x] = 1', first)
+        self.assertIn('SNOL :> Error! [x] is not defined!', second)
+
+    async def test_budget(self):
+        _, port = await self.start(max_steps=50)
+        replies = await self.talk(port, ['x = 9 ** (9 ** 9)', 'x = ' + ' + '.join(['1'] * 50), 'x = 2 ** 10', 'PRINT x', 'EXIT!'])
+        self.assertEqual(replies[1:], [
+            'SNOL :> Error! Result of ** would have more than 65536 bits!',
+            'SNOL :> Error! Statement needs more than 50 steps!',
+            'SNOL :> [x] = 1024',
+            'Evaluator is now terminated...',
+        ])
+
+    async def test_session_limit_and_idle_timeout(self):
+        snol_server, port = await self.start(max_sessions=1, idle_timeout=0.2)
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        await reader.readline()  # welcome
+        replies = await self.talk(port, [])
+        self.assertEqual(replies, ['SNOL :> Too many sessions are open, try again later'])
+        self.assertIn(b'idle', await reader.read())
+        writer.close()
+        self.assertEqual(snol_server.total_sessions, 1)
+
+    async def test_line_too_long(self):
+        _, port = await self.start(max_line_length=64)
+        replies = await self.talk(port, ['x = 1', 'x = ' + ' + '.join(['1'] * 100), 'PRINT x'])
+        self.assertEqual(replies[1:], ['SNOL :> Error! Line is longer than 64 bytes, session closed'])
+
 class TestIntegration(unittest.TestCase):
 
     def test_lexer_parser_evaluator(self):
@@ -161,5 +954,487 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(result, 7.7)
         self.assertEqual(evaluator.environment['y'], 7.7)
 
+class TestScriptOptimizer(unittest.TestCase):
+
+    def run_script(self, lines, on_error='continue', backend='tree', optimize_script=True):
+        output = ListOutput()
+        runner = Runner(Pipeline(backend=backend, output=output), on_error=on_error, optimize_script=optimize_script)
+        try:
+            runner.run(lines)
+        except ScriptError as e:
+            output.write(str(e))
+        return output.lines, runner.pipeline.evaluator.environment, runner.script_optimizer
+
+    def test_matches_plain_run(self):
+        lines = [
+            'x = 4', 'y = 2', 't = x * y + 1', 't = x * y + 3', 'z = (x * y + 3) * 2',
+            'PRINT -(x * y + 3)', 'z = z', 'x + y', 'PRINT z', 'y = 7', 'PRINT x * y + 3',
+        ]
+        output, environment, optimizer = self.run_script(lines)
+        self.assertEqual((output, environment), self.run_script(lines, optimize_script=False)[:2])
+        self.assertEqual(optimizer.removed, [3, 7, 8])
+        self.assertEqual((optimizer.dead_stores, optimizer.redundant, optimizer.unused, optimizer.reused), (1, 1, 1, 2))
+        self.assertIn('removed lines 3, 7, 8', str(optimizer))
+
+    def test_statements_that_may_fail_are_kept(self):
+        lines = [
+            'a = 1 / 0', 'a = q', 'a = 1 + 2.0', 'a = 2 ** 3', 'a = 1', 'BEG b', 'b = 1',
+            'c = 1', 'c = 2 * b', 'd = 1', 'd = 2', 'x = 1 +', 'PRINT a + c + d',
+        ]
+        with mock.patch('builtins.input', return_value='x'):
+            output, environment, optimizer = self.run_script(lines)
+            self.assertEqual((output, environment), self.run_script(lines, optimize_script=False)[:2])
+        # every store to a is kept, since the ones after it may fail, and
+        # c = 1 is dead since b = 1 makes c = 2 * b certain
+        self.assertEqual(optimizer.removed, [8, 10])
+
+    def test_fail_fast_keeps_stores_before_errors(self):
+        output, environment, optimizer = self.run_script(['a = 1', 'PRINT q', 'a = 2'], on_error='stop')
+        self.assertEqual(output, ['Error on line 2: Error! [q] is not defined!'])
+        self.assertEqual(environment, {'a': 1})
+        self.assertEqual(optimizer.removed, [])
+
+    def test_deep_expressions(self):
+        expression = ' + '.join(['y'] * 20000)
+        output, environment, optimizer = self.run_script(['y = 1', f'x = {expression}', f'PRINT {expression}'], backend='iterative')
+        self.assertEqual(output, ['SNOL :> [y] = 20000'])
+        self.assertEqual(optimizer.reused, 1)
+
+    def test_rejected_for_reactive_and_budgets(self):
+        # z = x * 2 would become z = y and follow y, and the dead y = x * x
+        # is the statement that should exceed the budget
+        for pipeline in (Pipeline(backend='reactive'), Pipeline(BudgetEvaluator(max_int_bits=5000))):
+            with self.subTest(evaluator=type(pipeline.evaluator).__name__):
+                with self.assertRaises(ValueError):
+                    Runner(pipeline, optimize_script=True)
+        for options in (['--backend', 'reactive'], ['--max-int-bits', '5000']):
+            with self.subTest(options=options):
+                with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, self.assertRaises(SystemExit):
+                    snol.main(['run', 'script.snol', '--optimize-script'] + options)
+                self.assertIn("--optimize-script can't be used", stderr.getvalue())
+
+class TestTiers(unittest.TestCase):
+
+    def test_cli_options(self):
+        for options, message in [
+            (['--tier-threshold', '-1'], 'must be 0 or more'),
+            (['--tier-threshold', '5', '--backend', 'vm'], 'needs the tree backend'),
+            (['--tier-threshold', '5', '--max-steps', '100'], 'needs the tree backend'),
+        ]:
+            with self.subTest(options=options):
+                with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, self.assertRaises(SystemExit):
+                    snol.main(['run', 'script.snol'] + options)
+                self.assertIn(message, stderr.getvalue())
+
+    def test_hot_lines_promoted(self):
+        lines = ['i = 0', 'x = 5'] + ['i = i + 1', 'PRINT i / x'] * 5 + ['PRINT q', 'PRINT q', 'PRINT q']
+        expected = run_backend(Evaluator(), lines)
+        self.assertEqual(run_backend(Evaluator(), lines, tier_threshold=3), expected)
+
+    def test_counters(self):
+        pipeline = Pipeline(cache_size=16, tier_threshold=3)
+        with mock.patch('builtins.print') as mocked_print:
+            Runner(pipeline).run(['i = 0'] + ['i  =  i + 1', 'i = i + 1'] * 3 + ['PRINT q'] * 4 + ['PRINT i'])
+            mocked_print.assert_called_with('SNOL :> [i] = 6')
+            mocked_print.assert_any_call('SNOL :> Error! [q] is not defined!')
+        tiers = pipeline.tiers
+        self.assertEqual(tiers.promotions, 2)
+        # "i  =  i + 1" and "i = i + 1" are the same line once normalized
+        self.assertEqual(tiers.compiled_runs, 3 + 1)
+        self.assertEqual(list(tiers.compiled), ['i = i + 1', 'PRINT q'])
+        # lines that ran once were never compiled
+        self.assertEqual(tiers.runs['i = 0'][0], 1)
+
+    def test_tree_backend_only(self):
+        with self.assertRaises(ValueError):
+            Pipeline(backend='closure', tier_threshold=3)
+
+class TestRunner(unittest.TestCase):
+
+    def test_run_script(self):
+        runner = Runner()
+        lines = ['x = 5\n', '\n', 'y = x * 2\n', 'PRINT y\n']
+        with mock.patch('builtins.print') as mocked_print:
+            stats = runner.run(lines)
+            mocked_print.assert_called_once_with('SNOL :> [y] = 10')
+        self.assertEqual(stats.lines, 4)
+        self.assertEqual(stats.statements, 3)
+        self.assertEqual(stats.errors, 0)
+
+    def test_continue_on_error(self):
+        runner = Runner()
+        with mock.patch('builtins.print') as mocked_print:
+            stats = runner.run(['PRINT z', 'z = 1', 'PRINT z'])
+            mocked_print.assert_any_call('SNOL :> Error! [z] is not defined!')
+            mocked_print.assert_called_with('SNOL :> [z] = 1')
+        self.assertEqual(stats.errors, 1)
+
+    def test_fail_fast(self):
+        runner = Runner(on_error='stop')
+        with self.assertRaises(ScriptError) as context:
+            runner.run(['x = 1', 'y = x + 1.5', 'x = 2'])
+        self.assertEqual(context.exception.line_number, 2)
+        self.assertEqual(runner.pipeline.evaluator.environment['x'], 1)
+
+    def test_exit_stops_script(self):
+        runner = Runner()
+        stats = runner.run(['x = 1', 'EXIT!', 'x = 2'])
+        self.assertEqual(stats.statements, 1)
+        self.assertEqual(runner.pipeline.evaluator.environment['x'], 1)
+
+class TestProviders(unittest.TestCase):
+
+    def test_output_flushed_before_prompt(self):
+        for backend in ['tree', 'closure', 'vm', 'python']:
+            with self.subTest(backend=backend):
+                stream = io.StringIO()
+                pipeline = Pipeline(backend=backend, output=BufferedOutput(stream))
+                with mock.patch('builtins.input', side_effect=lambda prompt: stream.write('<prompt>\n') and '4'):
+                    Runner(pipeline).run(['x = 1', 'PRINT x', 'BEG n', 'PRINT n'])
+                self.assertEqual(stream.getvalue(), 'SNOL :> [x] = 1\n<prompt>\nSNOL :> [n] = 4\n')
+
+    def test_every_backend_uses_providers(self):
+        lines = BACKEND_SCRIPT + ['BEG n', 'PRINT n + 1', 'BEG n', 'PRINT n']
+        with mock.patch('builtins.input', side_effect=['41', 'x']):
+            expected = run_backend(Evaluator(), lines)
+        for backend in ['tree', 'iterative', 'closure', 'typed', 'slots', 'memo', 'vm', 'reactive', 'python']:
+            with self.subTest(backend=backend):
+                output = ListOutput()
+                pipeline = Pipeline(backend=backend, output=output, input=ValueInput(['41', 'x']))
+                with mock.patch('builtins.print') as mocked_print, mock.patch('builtins.input') as mocked_input:
+                    for line in lines:
+                        try:
+                            pipeline.execute(line)
+                        except Exception as e:
+                            output.write(f'error: {e}')
+                    mocked_print.assert_not_called()
+                    mocked_input.assert_not_called()
+                self.assertEqual(output.lines, expected[0])
+
+    def test_buffered_output(self):
+        file = mock.Mock()
+        output = BufferedOutput(file, max_lines=2)
+        output.write('a')
+        file.write.assert_not_called()
+        output.write('b')
+        output.write('c')
+        file.write.assert_called_once_with('a\nb\n')
+        output.flush()
+        file.write.assert_called_with('c\n')
+        output.flush()
+        self.assertEqual(file.write.call_count, 2)
+
+    def test_value_input(self):
+        values = ValueInput([' 4 ', 'x', 2.5, '-3.'])
+        self.assertEqual(values.read('prompt'), 4)
+        with self.assertRaisesRegex(Exception, 'ERROR: Invalid input x'):
+            values.read('prompt')
+        self.assertEqual([values.read('prompt'), values.read('prompt')], [2.5, -3.0])
+        with self.assertRaisesRegex(Exception, 'No input left'):
+            values.read('prompt')
+
+    def test_value_input_is_lazy(self):
+        values = ValueInput(str(n) for n in itertools.count())
+        self.assertEqual([values.read('prompt') for _ in range(3)], [0, 1, 2])
+        output = ListOutput()
+        runner = Runner(Pipeline(output=output, input=ValueInput(itertools.count(5))))
+        runner.run(['BEG a', 'BEG b', 'PRINT a * b'])
+        self.assertEqual(output.lines, ['SNOL :> [a] = 30'])
+
+    def test_runner_keeps_errors_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'values.txt')
+            with open(path, 'w') as file:
+                file.write('3\n4.5 7\n')
+            output = ListOutput()
+            runner = Runner(Pipeline(output=output, input=FileInput(path)))
+            runner.run(['BEG a', 'BEG b', 'PRINT a * 2', 'PRINT q', 'BEG c', 'PRINT c', 'BEG d'])
+        self.assertEqual(output.lines, [
+            'SNOL :> [a] = 6',
+            'SNOL :> Error! [q] is not defined!',
+            'SNOL :> [c] = 7',
+            'SNOL :> Error! No input left for BEG!',
+        ])
+        self.assertEqual(runner.pipeline.evaluator.environment, {'a': 3, 'b': 4.5, 'c': 7})
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'session.snap')
+
+    def test_round_trip(self):
+        pipeline = Pipeline(cache_size=16)
+        Runner(pipeline).run(['a = 1', 'b = -2.5', 'c = 2 ** 100', 'd = -9223372036854775808', 'e = 0.0 - 1.5 ** 99.0', 'i = a + 1'])
+        self.assertEqual(snapshot.save(self.path, pipeline.evaluator, pipeline.cache), (6, 6))
+
+        restored = Pipeline(cache_size=16)
+        restored.evaluator.environment['z'] = 1
+        self.assertEqual(snapshot.load(self.path, restored.evaluator, restored.cache), (6, 6))
+        environment = restored.evaluator.environment
+        self.assertEqual(list(environment.items()), list(pipeline.evaluator.environment.items()))
+        self.assertEqual([type(value) for value in environment.values()], [int, float, int, int, float, int])
+        # the cached lines are not parsed again
+        restored.execute('i = a + 1')
+        self.assertEqual((restored.cache.hits, restored.cache.misses), (1, 0))
+
+    def test_cache_size_and_compact(self):
+        pipeline = Pipeline(cache_size=8)
+        Runner(pipeline).run([f'x{n} = {n}' for n in range(8)])
+        snapshot.save(self.path, pipeline.evaluator, pipeline.cache)
+        cache = ParseCache(3, compact=True)
+        evaluator = Evaluator()
+        self.assertEqual(snapshot.load(self.path, evaluator, cache), (8, 3))
+        self.assertEqual(list(cache.trees), ['x5 = 5', 'x6 = 6', 'x7 = 7'])
+        self.assertEqual(evaluator.evaluate(cache.parse('x7 = 7')), 7)
+
+    def test_backends_forget_old_state(self):
+        pipeline = Pipeline(backend='typed')
+        Runner(pipeline).run(['x = 5.0'])
+        snapshot.save(self.path, pipeline.evaluator)
+        typed = Pipeline(backend='typed')
+        Runner(typed).run(['x = 5'])
+        snapshot.load(self.path, typed.evaluator)
+        self.assertEqual(typed.execute('y = x / 2.0'), 2.5)
+
+        reactive = ReactiveEvaluator()
+        run_backend(reactive, ['a = 1', 'b = a * 2'])
+        snapshot.load(self.path, reactive)
+        self.assertEqual(run_backend(reactive, ['a = 3', 'PRINT x'])[1], {'x': 5.0, 'a': 3})
+
+        slots = SlotEvaluator()
+        snapshot.load(self.path, slots)
+        self.assertEqual(run_backend(slots, ['PRINT x * 2.0'])[0], ['SNOL :> [x] = 10.0'])
+
+    def test_errors(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'x = 1\n')
+        with self.assertRaisesRegex(Exception, 'is not a SNOL snapshot'):
+            snapshot.load(self.path, Evaluator())
+        evaluator = Evaluator()
+        evaluator.environment.update(x=1, y=2.0)
+        snapshot.save(self.path, evaluator)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        with open(self.path, 'wb') as file:
+            file.write(data[:-12])
+        with self.assertRaisesRegex(Exception, 'is damaged'):
+            snapshot.load(self.path, evaluator)
+        self.assertEqual(evaluator.environment, {'x': 1, 'y': 2.0})
+
+    def test_damaged_kinds(self):
+        evaluator = Evaluator()
+        evaluator.environment.update(x=1, y=2.0)
+        snapshot.save(self.path, evaluator)
+        with open(self.path, 'rb') as file:
+            data = bytearray(file.read())
+        # y is marked as an int, but the only int has been taken by x
+        kinds = snapshot.HEADER.size + snapshot.SIZE.size + len('x\ny') + snapshot.SIZE.size
+        self.assertEqual(data[kinds:kinds + 2], bytes([snapshot.INT, snapshot.FLOAT]))
+        data[kinds + 1] = snapshot.INT
+        with open(self.path, 'wb') as file:
+            file.write(data)
+        with self.assertRaisesRegex(Exception, 'is damaged'):
+            snapshot.load(self.path, evaluator)
+        self.assertEqual(evaluator.environment, {'x': 1, 'y': 2.0})
+
+    def test_damaged_statement_changes_nothing(self):
+        saved = ParseCache(16, compact=True)
+        saved.parse('b = a + 2')
+        flat = saved.trees['b = a + 2']
+        saved.trees['b = a + 2'] = FlatStatement(flat.opcodes[:-1] + array('B', [99]), flat.operands, flat.values)
+        evaluator = Evaluator()
+        evaluator.environment['a'] = 1
+        snapshot.save(self.path, evaluator, saved)
+
+        evaluator.environment = {'z': 3}
+        cache = ParseCache(16)
+        with self.assertRaisesRegex(Exception, 'is damaged'):
+            snapshot.load(self.path, evaluator, cache)
+        self.assertEqual(evaluator.environment, {'z': 3})
+        self.assertEqual(len(cache), 0)
+
+class TestParallel(unittest.TestCase):
+
+    def write_script(self, directory, name, lines):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_results_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [self.write_script(directory, f'{i}.snol', [f'x = {i}', 'PRINT x']) for i in range(6)]
+            results = list(run_scripts(paths, workers=2))
+        self.assertEqual([result.path for result in results], paths)
+        self.assertEqual([result.output for result in results], [f'SNOL :> [x] = {i}\n' for i in range(6)])
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_errors_and_fail_fast(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_script(directory, 'bad.snol', ['PRINT z', 'z = 1', 'PRINT z'])
+            (result,) = run_scripts([path], workers=1)
+            self.assertEqual(result.errors, 1)
+            self.assertEqual(result.output, 'SNOL :> Error! [z] is not defined!\nSNOL :> [z] = 1\n')
+            (result,) = run_scripts([path], workers=1, on_error='stop')
+            self.assertEqual(result.output, '')
+            self.assertIn('line 1', result.error)
+
+    def test_time_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_script(directory, 'slow.snol', ['x = 1', 'PRINT x', 'PRINT 9 ** 99999999'])
+            (result,) = run_scripts([path], workers=1, time_limit=0.2)
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.output, 'SNOL :> [x] = 1\n')
+
+    def test_script_options_and_input(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [self.write_script(directory, f'{i}.snol', ['BEG n', 'PRINT n * 2', 'x = 9 ** 99', 'PRINT x / x']) for i in range(2)]
+            values = self.write_script(directory, 'values', ['21'])
+            results = list(run_scripts(paths, workers=1, cache_size=16, input_path=values, max_int_bits=64))
+            # every script reads the input file from its start
+            self.assertEqual([result.output for result in results], [
+                'SNOL :> [n] = 42\nSNOL :> Error! Result of ** would have more than 64 bits!\nSNOL :> Error! [x] is not defined!\n'
+            ] * 2)
+            (result,) = run_scripts(paths[:1], workers=1)
+            self.assertEqual(result.output.splitlines()[0], 'SNOL :> Error! No input left for BEG!')
+
+    def test_cli_options(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, self.assertRaises(SystemExit):
+            snol.main(['parallel', 'a.snol', '--workers', '-1'])
+        self.assertIn('--workers must be at least 1', stderr.getvalue())
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, self.assertRaises(SystemExit):
+            snol.main(['parallel', 'a.snol', '--backend', 'vm', '--max-steps', '10'])
+        self.assertIn('need the tree backend', stderr.getvalue())
+
+class TestProfiler(unittest.TestCase):
+
+    def test_counts(self):
+        pipeline = Pipeline(optimize=True)
+        profiler = Profiler()
+        profiler.attach(pipeline)
+        with mock.patch('builtins.print'):
+            Runner(pipeline).run(['x = 1', 'y = x + 2 * x', 'PRINT -y', 'PRINT z'])
+        report = profiler.as_dict()
+        self.assertEqual(report['stage']['lex']['calls'], 4)
+        self.assertEqual(report['stage']['parse']['calls'], 4)
+        self.assertEqual(report['stage']['optimize']['calls'], 4)
+        self.assertEqual(report['stage']['evaluate']['calls'], 4)
+        self.assertEqual(report['node']['VariableAccessNode']['calls'], 4)
+        self.assertEqual(report['node']['BinaryOpNode']['calls'], 2)
+        self.assertEqual(report['operator']['*']['calls'], 1)
+        self.assertEqual(report['operator']['unary -']['calls'], 1)
+
+    def test_detach_restores_pipeline(self):
+        pipeline = Pipeline()
+        profiler = Profiler()
+        profiler.attach(pipeline)
+        profiler.detach()
+        self.assertFalse(profiler.enabled)
+        self.assertNotIn('evaluate', vars(pipeline.evaluator))
+        self.assertNotIn('tokenize', vars(pipeline.lexer))
+        pipeline.execute('x = 1 + 2')
+        self.assertEqual(profiler.counters, {})
+
+    def test_unknown_meta_commands(self):
+        for line in (':', ':  ', ':nope', ':stats print'):
+            with self.subTest(line=line), mock.patch('builtins.print') as mocked_print:
+                repl.meta_command(line, Pipeline(), Profiler())
+                mocked_print.assert_called_once_with(f'SNOL :> Unknown command {line}')
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_workloads_are_seeded(self):
+        for name in WORKLOADS:
+            self.assertEqual(generate(name, 20, seed=1), generate(name, 20, seed=1))
+            self.assertNotEqual(generate(name, 20, seed=1), generate(name, 20, seed=2))
+
+    def test_workloads_run(self):
+        for name in WORKLOADS:
+            output, _ = run_backend(Evaluator(), generate(name, 50))
+            # only the mixed workload has lines that fail, all with type errors
+            if name == 'mixed':
+                self.assertTrue(output)
+                self.assertTrue(all('same type' in line for line in output))
+            else:
+                self.assertEqual(output, [])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': {'arithmetic': {'lex': 1.0, 'parse': 1.0}, 'gone': {'lex': 1.0}}}
+        current = {'results': {'arithmetic': {'lex': 1.05, 'parse': 1.5}, 'new': {'lex': 9.0}}}
+        rows, regressions = compare(baseline, current, threshold=0.1)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(regressions, [('arithmetic', 'parse', 1.5)])
+
+class TestThreadSafety(unittest.TestCase):
+
+    def setUp(self):
+        # switch threads as often as possible, so that shared state gets mixed up if there is any
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def test_shared_lexer_and_parsers(self):
+        lexer = Lexer()
+
+        def parse_all(parser, k):
+            lines = [f'x = {k}', f'y = x * {k} + (x - 1) / 2', 'PRINT y', 'w = ' + ' + '.join(['x'] * (k + 1)), f'BEG v{k}']
+            trees = []
+            for _ in range(100):
+                for line in lines:
+                    statement = flatten(parser.parse(lexer.tokenize(line)))
+                    trees.append((statement.opcodes, statement.operands, statement.values))
+            return trees
+
+        for parser in (Parser(), PrecedenceParser()):
+            with self.subTest(parser=type(parser).__name__):
+                expected = [parse_all(parser, k) for k in range(16)]
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    self.assertEqual(list(pool.map(lambda k: parse_all(parser, k), range(16))), expected)
+                # the shared parser itself is never moved through any tokens
+                self.assertEqual(parser.tokens, [])
+        self.assertNotIn('tokens', vars(lexer))
+
+    def test_pipelines_share_a_cache(self):
+        # fewer lines fit in the cache than the threads use, so most lines are parsed again
+        cache = ParseCache(16)
+
+        def work(k):
+            lines = [
+                f'x = {k}', f'y = x * {k} + (x - 1) / 2', 'PRINT y', f'z = -(y % {k + 3}) ** 2 < {k} || !x',
+                'PRINT z', 'PRINT x + 1.5', 'w = ' + ' + '.join(['x'] * (k + 1)), 'PRINT w',
+            ]
+            output = ListOutput()
+            pipeline = Pipeline(cache=cache, output=output)
+            for _ in range(10):
+                for line in lines:
+                    try:
+                        pipeline.execute(line)
+                    except Exception as e:
+                        output.write(f'error: {e}')
+            return output.lines, pipeline.evaluator.environment
+
+        expected = [work(k) for k in range(32)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertEqual(list(pool.map(work, range(32))), expected)
+        self.assertLessEqual(len(cache), 16)
+        # every lookup is counted, by the serial run and by the threads
+        self.assertEqual(cache.hits + cache.misses, 2 * 32 * 10 * 8)
+
+    def test_one_program_many_environments(self):
+        program = transpile_script(['BEG n', 'i = 0', 't = 0'] + ['i = i + 1', 't = t + i * n % 7', 'PRINT t / 2'] * 100)
+
+        def work(n):
+            output = ListOutput()
+            environment = {}
+            program.run(environment, output, ValueInput([n]), lambda line_number, e: output.write(f'{line_number}: {e}'))
+            return output.lines, environment
+
+        expected = [work(n) for n in range(32)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertEqual(list(pool.map(work, range(32))), expected)
+
 if __name__ == "__main__":
     unittest.main()